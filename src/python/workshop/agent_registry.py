@@ -0,0 +1,116 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from pathlib import Path
+from typing import Optional
+
+from azure.ai.agents.aio import AgentsClient
+from azure.ai.agents.models import Agent, AsyncToolSet
+from azure.core.exceptions import ResourceNotFoundError
+
+from upload_manifest import load_json, save_json
+
+logger = logging.getLogger(__name__)
+
+SECONDS_PER_DAY = 24 * 60 * 60
+
+
+def agent_fingerprint(
+    model: str, name: str, instructions: str, temperature: Optional[float], toolset: AsyncToolSet
+) -> str:
+    """Hash everything that defines an agent, so an agent is only reused when it would be created identically."""
+    definition = {
+        "model": model,
+        "name": name,
+        "instructions": instructions,
+        "temperature": temperature,
+        "tools": [tool.as_dict() for tool in toolset.definitions],
+        "tool_resources": toolset.resources.as_dict(),
+    }
+    return hashlib.sha256(json.dumps(definition, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class AgentRegistry:
+    """Persisted map from agent fingerprints to agents already created in a project.
+
+    A start with the same instructions, model, temperature and tools reuses the agent with a single lookup
+    instead of creating a new one. Agents are kept per project endpoint. Agents no longer in use are deleted by
+    ``collect_garbage``: all but the most recently used few, and any that have been idle too long.
+    """
+
+    def __init__(self, path: Path, endpoint: str) -> None:
+        self.path = path
+        self.endpoint = endpoint
+        self._data: Optional[dict] = None
+        self._lock = asyncio.Lock()
+
+    def _agents(self) -> dict:
+        if self._data is None:
+            self._data = load_json(self.path)
+        return self._data.setdefault(self.endpoint, {})
+
+    def _save(self) -> None:
+        try:
+            save_json(self.path, self._data)
+        except OSError as e:
+            logger.debug("Unable to save the agent registry: %s", e)
+
+    def agent_ids(self) -> set[str]:
+        return {entry["agent_id"] for entry in self._agents().values()}
+
+    async def _update(self, fingerprint: str, entry: Optional[dict]) -> None:
+        async with self._lock:
+            if entry is None:
+                self._agents().pop(fingerprint, None)
+            else:
+                self._agents()[fingerprint] = entry
+            await asyncio.to_thread(self._save)
+
+    async def get_agent(self, agents_client: AgentsClient, fingerprint: str) -> Optional[Agent]:
+        """Return the registered agent for the fingerprint, or None if there is none or it no longer exists."""
+        entry = self._agents().get(fingerprint)
+        if entry is None:
+            return None
+        try:
+            agent = await agents_client.get_agent(entry["agent_id"])
+        except ResourceNotFoundError:
+            await self._update(fingerprint, None)
+            return None
+        await self._update(fingerprint, {**entry, "last_used_at": time.time()})
+        return agent
+
+    async def register(self, fingerprint: str, agent: Agent) -> None:
+        now = time.time()
+        await self._update(
+            fingerprint, {"agent_id": agent.id, "name": agent.name, "created_at": now, "last_used_at": now}
+        )
+
+    async def collect_garbage(
+        self, agents_client: AgentsClient, keep: int, max_idle_days: float, in_use: frozenset[str] = frozenset()
+    ) -> list[str]:
+        """Delete registered agents beyond the ``keep`` most recently used, or idle longer than ``max_idle_days``.
+
+        Agents in ``in_use`` are never deleted. Returns the IDs of the agents deleted.
+        """
+        idle_cutoff = time.time() - max_idle_days * SECONDS_PER_DAY
+        by_last_use = sorted(self._agents().items(), key=lambda item: item[1]["last_used_at"], reverse=True)
+        stale = [
+            (fingerprint, entry)
+            for index, (fingerprint, entry) in enumerate(by_last_use)
+            if (index >= keep or entry["last_used_at"] < idle_cutoff) and entry["agent_id"] not in in_use
+        ]
+
+        deleted = []
+        for fingerprint, entry in stale:
+            try:
+                await agents_client.delete_agent(entry["agent_id"])
+            except ResourceNotFoundError:
+                pass
+            except Exception as e:
+                logger.error("Unable to delete stale agent %s: %s", entry["agent_id"], e)
+                continue
+            await self._update(fingerprint, None)
+            deleted.append(entry["agent_id"])
+        return deleted
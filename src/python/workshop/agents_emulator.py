@@ -0,0 +1,697 @@
+"""
+A local stand-in for the Foundry Agent Service, for offline end-to-end and load testing.
+
+EmulatedAgentsClient implements the subset of ``azure.ai.agents.aio.AgentsClient`` the workshop uses: agents, threads,
+messages, files, vector stores and streamed runs. Runs stream the same server-sent events the service sends, so the
+real SDK stream, ``StreamEventHandler`` and auto function calls all run unchanged. Replies come from a script of
+regex rules, and request latency, time to first token and the token rate are configurable.
+
+Set AGENTS_EMULATOR=true to make main.py use it.
+"""
+
+import asyncio
+import json
+import re
+import time
+import uuid
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, AsyncIterator, Optional
+
+from azure.ai.agents.models import (
+    Agent,
+    AgentThread,
+    AsyncAgentEventHandler,
+    AsyncAgentRunStream,
+    AsyncFunctionTool,
+    AsyncToolSet,
+    BaseAsyncAgentEventHandler,
+    FileInfo,
+    FileListResponse,
+    SubmitToolOutputsAction,
+    ThreadMessage,
+    ThreadRun,
+    TruncationObject,
+    VectorStore,
+)
+from azure.core.exceptions import ResourceNotFoundError
+
+# Words and the whitespace before them, a rough stand-in for model tokens.
+TOKEN_PATTERN = re.compile(r"\s*\S+|\s+")
+FILE_CHUNK_BYTES = 64 * 1024
+
+
+@dataclass
+class ScriptedFunctionCall:
+    """A function call the emulated model makes before replying."""
+
+    name: str
+    arguments: dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class ScriptedTurn:
+    """How the emulated model answers a prompt matching ``pattern``.
+
+    ``{tool_output}`` in the reply is replaced with the output of the first function call.
+    """
+
+    pattern: str
+    reply: str
+    function_calls: list[ScriptedFunctionCall] = field(default_factory=list)
+
+    def matches(self, prompt: str) -> bool:
+        return re.search(self.pattern, prompt, re.IGNORECASE) is not None
+
+
+SALES_QUERY_FUNCTION = "async_fetch_sales_data_using_sqlite_query"
+
+DEFAULT_SCRIPT = [
+    ScriptedTurn(
+        pattern=r"shipping",
+        function_calls=[
+            ScriptedFunctionCall(
+                SALES_QUERY_FUNCTION,
+                {
+                    "sqlite_query": "SELECT region, SUM(shipping_cost) AS total_shipping_cost FROM sales_data "
+                    "GROUP BY region ORDER BY total_shipping_cost DESC"
+                },
+            )
+        ],
+        reply="Here are the total shipping costs by region:\n\n{tool_output}\n\nShipping costs track revenue closely, "
+        "so the largest regions also carry the largest shipping bills.",
+    ),
+    ScriptedTurn(
+        pattern=r"product|sell",
+        function_calls=[
+            ScriptedFunctionCall(
+                SALES_QUERY_FUNCTION,
+                {
+                    "sqlite_query": "SELECT product_type, SUM(revenue) AS total_revenue FROM sales_data "
+                    "GROUP BY product_type ORDER BY total_revenue DESC LIMIT 10"
+                },
+            )
+        ],
+        reply="These are the top-selling products by revenue:\n\n{tool_output}\n\nLet me know if you would like the "
+        "results broken down by region or year.",
+    ),
+    ScriptedTurn(
+        pattern=r"sales|revenue|region",
+        function_calls=[
+            ScriptedFunctionCall(
+                SALES_QUERY_FUNCTION,
+                {
+                    "sqlite_query": "SELECT region, SUM(revenue) AS total_revenue FROM sales_data "
+                    "GROUP BY region ORDER BY total_revenue DESC"
+                },
+            )
+        ],
+        reply="Here is the revenue by region:\n\n{tool_output}\n\nI can also show this as a chart or compare it with "
+        "the previous year.",
+    ),
+    ScriptedTurn(
+        pattern=r".",
+        reply="I am the Contoso sales agent. I can answer questions about Contoso sales data, such as sales by "
+        "region, top-selling products and shipping costs.",
+    ),
+]
+
+
+def load_script(script_file: Path) -> list[ScriptedTurn]:
+    """Load a script from a JSON list of {"pattern", "reply", "function_calls": [{"name", "arguments"}]}."""
+    turns = json.loads(script_file.read_text(encoding="utf-8"))
+    return [
+        ScriptedTurn(
+            pattern=turn["pattern"],
+            reply=turn["reply"],
+            function_calls=[
+                ScriptedFunctionCall(call["name"], call.get("arguments", {})) for call in turn.get("function_calls", [])
+            ],
+        )
+        for turn in turns
+    ]
+
+
+def count_tokens(text: str) -> int:
+    return len(TOKEN_PATTERN.findall(text))
+
+
+def new_id(prefix: str) -> str:
+    return f"{prefix}_{uuid.uuid4().hex[:24]}"
+
+
+def sse_event(event: str, data: Any) -> bytes:
+    payload = data if isinstance(data, str) else json.dumps(data)
+    return f"event: {event}\ndata: {payload}\n\n".encode("utf-8")
+
+
+@dataclass
+class EmulatorStats:
+    """Counters across every run the emulator has streamed."""
+
+    runs: int = 0
+    function_calls: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+
+class EmulatedAgentsClient:
+    """Offline implementation of the AgentsClient API used by the workshop."""
+
+    def __init__(
+        self,
+        script: Optional[list[ScriptedTurn]] = None,
+        request_latency_seconds: float = 0.05,
+        first_token_latency_seconds: float = 0.5,
+        tokens_per_second: float = 50.0,
+        tokens_per_delta: int = 1,
+        upload_bytes_per_second: float = 0.0,
+        vector_store_indexing_seconds: float = 0.0,
+        prompt_tokens_per_second: float = 0.0,
+    ) -> None:
+        self.script = script or DEFAULT_SCRIPT
+        self.request_latency_seconds = request_latency_seconds
+        self.first_token_latency_seconds = first_token_latency_seconds
+        self.tokens_per_second = tokens_per_second
+        self.tokens_per_delta = max(tokens_per_delta, 1)
+        # Upload bandwidth (0 for unlimited) and the time a vector store takes to index its files.
+        self.upload_bytes_per_second = upload_bytes_per_second
+        self.vector_store_indexing_seconds = vector_store_indexing_seconds
+        # Prompt processing speed (0 for instant), so longer prompts take longer to the first token.
+        self.prompt_tokens_per_second = prompt_tokens_per_second
+        self.stats = EmulatorStats()
+
+        self._agents: dict[str, dict[str, Any]] = {}
+        self._threads: dict[str, dict[str, Any]] = {}
+        self._messages: dict[str, list[dict[str, Any]]] = {}
+        self._runs: dict[str, dict[str, Any]] = {}
+        self._files: dict[str, tuple[dict[str, Any], bytes]] = {}
+        self._vector_stores: dict[str, dict[str, Any]] = {}
+        self._function_tool: AsyncFunctionTool = AsyncFunctionTool(set())
+        self._function_tool_max_retry = 10
+
+        self.threads = _ThreadsOperations(self)
+        self.messages = _MessagesOperations(self)
+        self.files = _FilesOperations(self)
+        self.vector_stores = _VectorStoresOperations(self)
+        self.runs = _RunsOperations(self)
+
+    async def __aenter__(self) -> "EmulatedAgentsClient":
+        return self
+
+    async def __aexit__(self, *exc_details: Any) -> None:
+        await self.close()
+
+    async def close(self) -> None:
+        pass
+
+    async def _request(self) -> None:
+        """Stand in for the round trip of a non-streaming request."""
+        if self.request_latency_seconds:
+            await asyncio.sleep(self.request_latency_seconds)
+
+    def _not_found(self, kind: str, resource_id: str) -> ResourceNotFoundError:
+        return ResourceNotFoundError(f"No {kind} found with ID: {resource_id}")
+
+    async def create_agent(
+        self,
+        model: str,
+        name: Optional[str] = None,
+        instructions: Optional[str] = None,
+        toolset: Optional[AsyncToolSet] = None,
+        temperature: Optional[float] = None,
+        top_p: Optional[float] = None,
+        **kwargs: Any,
+    ) -> Agent:
+        await self._request()
+        agent = {
+            "id": new_id("asst"),
+            "object": "assistant",
+            "created_at": int(time.time()),
+            "name": name,
+            "model": model,
+            "instructions": instructions or "",
+            "tools": [definition.as_dict() for definition in toolset.definitions] if toolset else [],
+            "temperature": temperature,
+            "top_p": top_p,
+            "metadata": kwargs.get("metadata") or {},
+        }
+        self._agents[agent["id"]] = agent
+        return Agent(agent)
+
+    async def get_agent(self, agent_id: str, **kwargs: Any) -> Agent:
+        await self._request()
+        if agent_id not in self._agents:
+            raise self._not_found("agent", agent_id)
+        return Agent(self._agents[agent_id])
+
+    async def delete_agent(self, agent_id: str, **kwargs: Any) -> None:
+        await self._request()
+        self._agents.pop(agent_id, None)
+
+    def enable_auto_function_calls(self, tools: Any, max_retry: int = 10) -> None:
+        """Execute function calls locally during runs.stream, as AgentsClient does."""
+        if isinstance(tools, AsyncFunctionTool):
+            self._function_tool = tools
+        elif isinstance(tools, AsyncToolSet):
+            self._function_tool = tools.get_tool(AsyncFunctionTool)
+        else:
+            self._function_tool = AsyncFunctionTool(tools)
+        self._function_tool_max_retry = max_retry
+
+
+class _ThreadsOperations:
+    def __init__(self, client: EmulatedAgentsClient) -> None:
+        self._client = client
+
+    async def create(self, **kwargs: Any) -> AgentThread:
+        await self._client._request()
+        thread = {
+            "id": new_id("thread"),
+            "object": "thread",
+            "created_at": int(time.time()),
+            "metadata": kwargs.get("metadata") or {},
+        }
+        self._client._threads[thread["id"]] = thread
+        self._client._messages[thread["id"]] = []
+        return AgentThread(thread)
+
+    async def get(self, thread_id: str, **kwargs: Any) -> AgentThread:
+        await self._client._request()
+        if thread_id not in self._client._threads:
+            raise self._client._not_found("thread", thread_id)
+        return AgentThread(self._client._threads[thread_id])
+
+    async def delete(self, thread_id: str, **kwargs: Any) -> None:
+        await self._client._request()
+        self._client._threads.pop(thread_id, None)
+        self._client._messages.pop(thread_id, None)
+
+
+def _message(thread_id: str, role: str, text: str, **extra: Any) -> dict[str, Any]:
+    return {
+        "id": new_id("msg"),
+        "object": "thread.message",
+        "created_at": int(time.time()),
+        "thread_id": thread_id,
+        "status": "completed",
+        "role": role,
+        "content": [{"type": "text", "text": {"value": text, "annotations": []}}],
+        "attachments": [],
+        "metadata": {},
+        **extra,
+    }
+
+
+class _MessagesOperations:
+    def __init__(self, client: EmulatedAgentsClient) -> None:
+        self._client = client
+
+    async def create(self, thread_id: str, role: str, content: str, **kwargs: Any) -> ThreadMessage:
+        await self._client._request()
+        if thread_id not in self._client._messages:
+            raise self._client._not_found("thread", thread_id)
+        message = _message(thread_id, str(role), content)
+        self._client._messages[thread_id].append(message)
+        return ThreadMessage(message)
+
+    async def list(self, thread_id: str, **kwargs: Any) -> AsyncIterator[ThreadMessage]:
+        """Yield the thread's messages, newest first like the service."""
+        await self._client._request()
+        for message in reversed(self._client._messages.get(thread_id, [])):
+            yield ThreadMessage(message)
+
+
+class _FilesOperations:
+    def __init__(self, client: EmulatedAgentsClient) -> None:
+        self._client = client
+
+    async def upload(self, *, file_path: str, purpose: str = "assistants", **kwargs: Any) -> FileInfo:
+        await self._client._request()
+        content = await asyncio.to_thread(Path(file_path).read_bytes)
+        if self._client.upload_bytes_per_second:
+            await asyncio.sleep(len(content) / self._client.upload_bytes_per_second)
+        file_info = {
+            "object": "file",
+            "id": new_id("assistant"),
+            "bytes": len(content),
+            "filename": Path(file_path).name,
+            "created_at": int(time.time()),
+            "purpose": str(purpose),
+            "status": "processed",
+        }
+        self._client._files[file_info["id"]] = (file_info, content)
+        return FileInfo(file_info)
+
+    async def upload_and_poll(self, *, file_path: str, purpose: str = "assistants", **kwargs: Any) -> FileInfo:
+        return await self.upload(file_path=file_path, purpose=purpose)
+
+    async def get(self, file_id: str, **kwargs: Any) -> FileInfo:
+        await self._client._request()
+        if file_id not in self._client._files:
+            raise self._client._not_found("file", file_id)
+        return FileInfo(self._client._files[file_id][0])
+
+    async def list(self, **kwargs: Any) -> FileListResponse:
+        await self._client._request()
+        return FileListResponse({"object": "list", "data": [info for info, _ in self._client._files.values()]})
+
+    async def delete(self, file_id: str, **kwargs: Any) -> None:
+        await self._client._request()
+        self._client._files.pop(file_id, None)
+
+    async def get_content(self, file_id: str, **kwargs: Any) -> AsyncIterator[bytes]:
+        await self._client._request()
+        if file_id not in self._client._files:
+            raise self._client._not_found("file", file_id)
+        content = self._client._files[file_id][1]
+
+        async def chunks() -> AsyncIterator[bytes]:
+            for start in range(0, len(content), FILE_CHUNK_BYTES):
+                yield content[start : start + FILE_CHUNK_BYTES]
+
+        return chunks()
+
+
+class _VectorStoresOperations:
+    def __init__(self, client: EmulatedAgentsClient) -> None:
+        self._client = client
+
+    async def create_and_poll(
+        self, file_ids: Optional[list[str]] = None, name: Optional[str] = None, **kwargs: Any
+    ) -> VectorStore:
+        await self._client._request()
+        file_ids = file_ids or []
+        for file_id in file_ids:
+            if file_id not in self._client._files:
+                raise self._client._not_found("file", file_id)
+        if file_ids and self._client.vector_store_indexing_seconds:
+            await asyncio.sleep(self._client.vector_store_indexing_seconds)
+        now = int(time.time())
+        vector_store = {
+            "id": new_id("vs"),
+            "object": "vector_store",
+            "created_at": now,
+            "name": name,
+            "usage_bytes": sum(self._client._files[file_id][0]["bytes"] for file_id in file_ids),
+            "file_counts": {
+                "in_progress": 0,
+                "completed": len(file_ids),
+                "failed": 0,
+                "cancelled": 0,
+                "total": len(file_ids),
+            },
+            "status": "completed",
+            "last_active_at": now,
+            "metadata": kwargs.get("metadata") or {},
+        }
+        self._client._vector_stores[vector_store["id"]] = vector_store
+        return VectorStore(vector_store)
+
+    async def create(self, file_ids: Optional[list[str]] = None, name: Optional[str] = None, **kwargs: Any):
+        return await self.create_and_poll(file_ids=file_ids, name=name, **kwargs)
+
+    async def get(self, vector_store_id: str, **kwargs: Any) -> VectorStore:
+        await self._client._request()
+        if vector_store_id not in self._client._vector_stores:
+            raise self._client._not_found("vector store", vector_store_id)
+        return VectorStore(self._client._vector_stores[vector_store_id])
+
+    async def delete(self, vector_store_id: str, **kwargs: Any) -> None:
+        await self._client._request()
+        self._client._vector_stores.pop(vector_store_id, None)
+
+
+class _RunsOperations:
+    """Streamed runs. Each run emits the service's SSE events: lifecycle, function-call steps and message deltas."""
+
+    def __init__(self, client: EmulatedAgentsClient) -> None:
+        self._client = client
+        # Script state of runs still in progress, by run ID.
+        self._run_state: dict[str, dict[str, Any]] = {}
+
+    async def stream(
+        self,
+        thread_id: str,
+        agent_id: str,
+        event_handler: Optional[BaseAsyncAgentEventHandler] = None,
+        max_completion_tokens: Optional[int] = None,
+        max_prompt_tokens: Optional[int] = None,
+        temperature: Optional[float] = None,
+        top_p: Optional[float] = None,
+        instructions: Optional[str] = None,
+        truncation_strategy: Optional[TruncationObject] = None,
+        **kwargs: Any,
+    ) -> AsyncAgentRunStream:
+        client = self._client
+        await client._request()
+        if thread_id not in client._threads:
+            raise client._not_found("thread", thread_id)
+        if agent_id not in client._agents:
+            raise client._not_found("agent", agent_id)
+        agent = client._agents[agent_id]
+
+        messages = client._messages[thread_id]
+        prompt = next((message for message in reversed(messages) if message["role"] == "user"), None)
+        prompt_text = prompt["content"][0]["text"]["value"] if prompt else ""
+        turn = next(turn for turn in client.script + DEFAULT_SCRIPT[-1:] if turn.matches(prompt_text))
+
+        # Only call functions the agent was actually given.
+        agent_functions = {tool["function"]["name"] for tool in agent["tools"] if tool.get("type") == "function"}
+        function_calls = [call for call in turn.function_calls if call.name in agent_functions]
+
+        run = {
+            "id": new_id("run"),
+            "object": "thread.run",
+            "thread_id": thread_id,
+            "assistant_id": agent_id,
+            "status": "queued",
+            "model": agent["model"],
+            "instructions": instructions or agent["instructions"],
+            "tools": agent["tools"],
+            "created_at": int(time.time()),
+            "temperature": temperature if temperature is not None else agent["temperature"],
+            "top_p": top_p if top_p is not None else agent["top_p"],
+            "max_completion_tokens": max_completion_tokens,
+            "max_prompt_tokens": max_prompt_tokens,
+            "metadata": {},
+            "parallel_tool_calls": True,
+            "truncation_strategy": truncation_strategy.as_dict() if truncation_strategy else {"type": "auto"},
+        }
+        client._runs[run["id"]] = run
+        client.stats.runs += 1
+
+        # The prompt holds the instructions and the thread's messages, or only the last few when truncated.
+        if truncation_strategy and truncation_strategy.type == "last_messages":
+            messages = messages[-truncation_strategy.last_messages :]
+        state = {
+            "turn": turn,
+            "function_calls": function_calls,
+            "prompt_tokens": count_tokens(run["instructions"])
+            + sum(count_tokens(message["content"][0]["text"]["value"]) for message in messages),
+        }
+        self._run_state[run["id"]] = state
+
+        return AsyncAgentRunStream(
+            self._run_events(run, state), self._handle_submit_tool_outputs, event_handler or AsyncAgentEventHandler()
+        )
+
+    async def get(self, thread_id: str, run_id: str, **kwargs: Any) -> ThreadRun:
+        await self._client._request()
+        if run_id not in self._client._runs:
+            raise self._client._not_found("run", run_id)
+        return ThreadRun(self._client._runs[run_id])
+
+    async def cancel(self, thread_id: str, run_id: str, **kwargs: Any) -> ThreadRun:
+        await self._client._request()
+        run = self._client._runs[run_id]
+        run.update(status="cancelled", cancelled_at=int(time.time()), required_action=None)
+        self._run_state.pop(run_id, None)
+        return ThreadRun(run)
+
+    def _step(self, run: dict[str, Any], step_type: str, step_details: dict[str, Any]) -> dict[str, Any]:
+        return {
+            "id": new_id("step"),
+            "object": "thread.run.step",
+            "type": step_type,
+            "assistant_id": run["assistant_id"],
+            "thread_id": run["thread_id"],
+            "run_id": run["id"],
+            "status": "in_progress",
+            "step_details": step_details,
+            "created_at": int(time.time()),
+            "metadata": {},
+        }
+
+    def _first_token_delay(self, state: dict[str, Any]) -> float:
+        client = self._client
+        if not client.prompt_tokens_per_second:
+            return client.first_token_latency_seconds
+        return client.first_token_latency_seconds + state["prompt_tokens"] / client.prompt_tokens_per_second
+
+    async def _run_events(self, run: dict[str, Any], state: dict[str, Any]) -> AsyncIterator[bytes]:
+        """Stream the run up to the function calls, or to completion if there are none."""
+        yield sse_event("thread.run.created", run)
+        yield sse_event("thread.run.queued", run)
+        run.update(status="in_progress", started_at=int(time.time()))
+        yield sse_event("thread.run.in_progress", run)
+
+        if not state["function_calls"]:
+            async for event in self._reply_events(run, state, tool_output=""):
+                yield event
+            return
+
+        # The model "thinks" before deciding on the function calls.
+        await asyncio.sleep(self._first_token_delay(state))
+        tool_calls = [
+            {"id": new_id("call"), "type": "function", "function": {"name": call.name, "arguments": arguments}}
+            for call, arguments in ((call, json.dumps(call.arguments)) for call in state["function_calls"])
+        ]
+        step = self._step(run, "tool_calls", {"type": "tool_calls", "tool_calls": tool_calls})
+        state["tool_step"] = step
+        state["completion_tokens"] = sum(count_tokens(call["function"]["arguments"]) for call in tool_calls)
+        self._client.stats.function_calls += len(tool_calls)
+        yield sse_event("thread.run.step.created", step)
+        yield sse_event("thread.run.step.in_progress", step)
+
+        run.update(
+            status="requires_action",
+            required_action={"type": "submit_tool_outputs", "submit_tool_outputs": {"tool_calls": tool_calls}},
+        )
+        yield sse_event("thread.run.requires_action", run)
+
+    async def _handle_submit_tool_outputs(
+        self, run: ThreadRun, event_handler: BaseAsyncAgentEventHandler, submit_with_error: bool
+    ) -> Any:
+        """Execute the run's function calls locally and continue the stream, as AgentsClient does."""
+        tool_outputs: Any = []
+        if not isinstance(run.required_action, SubmitToolOutputsAction):
+            return tool_outputs
+        tool_calls = run.required_action.submit_tool_outputs.tool_calls
+        function_tool = self._client._function_tool
+        if not tool_calls or not function_tool.definitions:
+            return tool_outputs
+
+        toolset = AsyncToolSet()
+        toolset.add(function_tool)
+        tool_outputs = await toolset.execute_tool_calls(tool_calls)
+
+        has_errors = any("error" in _json_object(output.get("output")) for output in tool_outputs)
+        if has_errors and not submit_with_error:
+            cancelled = await self.cancel(thread_id=run.thread_id, run_id=run.id)
+            cancelled_event = sse_event("thread.run.cancelled", cancelled.as_dict())
+            event_handler.initialize(_once(cancelled_event), self._handle_submit_tool_outputs)
+            return tool_outputs
+
+        if tool_outputs:
+            await self.submit_tool_outputs_stream(
+                thread_id=run.thread_id, run_id=run.id, tool_outputs=tool_outputs, event_handler=event_handler
+            )
+        return tool_outputs
+
+    async def submit_tool_outputs_stream(
+        self,
+        thread_id: str,
+        run_id: str,
+        tool_outputs: list[dict[str, Any]],
+        event_handler: BaseAsyncAgentEventHandler,
+        **kwargs: Any,
+    ) -> None:
+        await self._client._request()
+        run = self._client._runs[run_id]
+        state = self._run_state[run_id]
+        event_handler.initialize(self._continue_events(run, state, tool_outputs), self._handle_submit_tool_outputs)
+
+    async def _continue_events(
+        self, run: dict[str, Any], state: dict[str, Any], tool_outputs: list[dict[str, Any]]
+    ) -> AsyncIterator[bytes]:
+        """Stream the rest of the run once the function outputs have been submitted."""
+        outputs = {output["tool_call_id"]: output["output"] for output in tool_outputs}
+        step = state["tool_step"]
+        for tool_call in step["step_details"]["tool_calls"]:
+            tool_call["function"]["output"] = outputs.get(tool_call["id"])
+        step.update(status="completed", completed_at=int(time.time()))
+        yield sse_event("thread.run.step.completed", step)
+
+        run.update(status="in_progress", required_action=None)
+        yield sse_event("thread.run.in_progress", run)
+
+        # The model reads the function outputs as part of its prompt.
+        state["prompt_tokens"] += sum(count_tokens(str(output)) for output in outputs.values())
+        tool_output = str(tool_outputs[0]["output"]) if tool_outputs else ""
+        async for event in self._reply_events(run, state, tool_output):
+            yield event
+
+    async def _reply_events(self, run: dict[str, Any], state: dict[str, Any], tool_output: str) -> AsyncIterator[bytes]:
+        """Stream the scripted reply as message deltas at the configured token rate, then complete the run."""
+        client = self._client
+        text = state["turn"].reply.replace("{tool_output}", tool_output)
+        message = _message(
+            run["thread_id"], "assistant", "", status="in_progress", assistant_id=run["assistant_id"], run_id=run["id"]
+        )
+        step_details = {"type": "message_creation", "message_creation": {"message_id": message["id"]}}
+        step = self._step(run, "message_creation", step_details)
+        yield sse_event("thread.run.step.created", step)
+        yield sse_event("thread.run.step.in_progress", step)
+        yield sse_event("thread.message.created", message)
+        yield sse_event("thread.message.in_progress", message)
+
+        await asyncio.sleep(self._first_token_delay(state))
+        tokens = TOKEN_PATTERN.findall(text)
+        delay = client.tokens_per_delta / client.tokens_per_second if client.tokens_per_second else 0.0
+        for start in range(0, len(tokens), client.tokens_per_delta):
+            if start and delay:
+                await asyncio.sleep(delay)
+            delta = {
+                "id": message["id"],
+                "object": "thread.message.delta",
+                "delta": {
+                    "role": "assistant",
+                    "content": [
+                        {
+                            "index": 0,
+                            "type": "text",
+                            "text": {"value": "".join(tokens[start : start + client.tokens_per_delta])},
+                        }
+                    ],
+                },
+            }
+            yield sse_event("thread.message.delta", delta)
+
+        now = int(time.time())
+        message.update(status="completed", completed_at=now)
+        message["content"][0]["text"]["value"] = text
+        client._messages.setdefault(run["thread_id"], []).append(message)
+        yield sse_event("thread.message.completed", message)
+
+        step.update(status="completed", completed_at=now)
+        yield sse_event("thread.run.step.completed", step)
+
+        prompt_tokens = state["prompt_tokens"]
+        completion_tokens = state.get("completion_tokens", 0) + len(tokens)
+        client.stats.prompt_tokens += prompt_tokens
+        client.stats.completion_tokens += completion_tokens
+        run.update(
+            status="completed",
+            completed_at=now,
+            usage={
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        )
+        self._run_state.pop(run["id"], None)
+        yield sse_event("thread.run.completed", run)
+        yield sse_event("done", "[DONE]")
+
+
+def _json_object(output: Any) -> dict[str, Any]:
+    try:
+        parsed = json.loads(output) if isinstance(output, str) else {}
+    except json.JSONDecodeError:
+        return {}
+    return parsed if isinstance(parsed, dict) else {}
+
+
+async def _once(data: bytes) -> AsyncIterator[bytes]:
+    yield data
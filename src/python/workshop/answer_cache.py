@@ -0,0 +1,157 @@
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional, Sequence
+
+from query_cache import DatabaseStamp
+
+NON_WORD_PATTERN = re.compile(r"[^\w]+")
+NUMBER_PATTERN = re.compile(r"\d+(?:\.\d+)?")
+NGRAM_SIZE = 3
+# Words that carry no meaning in a question about the data, dropped before prompts are compared.
+FILLER_WORDS = frozenset(
+    "a an the what which were was are is me show please can could would you give tell i to list display get find "
+    "of do does".split()
+)
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Fold case, punctuation and filler words, so "What are the top-selling products?" is "top selling products"."""
+    return " ".join(word for word in NON_WORD_PATTERN.sub(" ", prompt.lower()).split() if word not in FILLER_WORDS)
+
+
+def character_ngrams(text: str, size: int = NGRAM_SIZE) -> frozenset[str]:
+    padded = f" {text} "
+    return frozenset(padded[i : i + size] for i in range(max(len(padded) - size + 1, 1)))
+
+
+@dataclass
+class CachedAnswer:
+    """An agent's streamed answer to a prompt, with how long the run that produced it took."""
+
+    prompt: str
+    ngrams: frozenset[str]
+    numbers: frozenset[str]
+    agent_fingerprint: str
+    deltas: list[str]
+    run_seconds: float
+    cached_at: float
+
+    @property
+    def text(self) -> str:
+        return "".join(self.deltas)
+
+
+@dataclass
+class AnswerCacheHit:
+    answer: CachedAnswer
+    similarity: float
+
+
+class AnswerCache:
+    """Bounded LRU cache of agent answers, matched on prompts that are the same once normalized.
+
+    Normalizing folds case, punctuation and filler words, so "What were the sales by region?" matches "sales by
+    region". With a ``similarity_threshold`` below 1.0, prompts also match when the Jaccard similarity of their
+    character trigrams reaches it and they mention the same numbers, so "top 5 products" never gets the answer to
+    "top 10 products". Near matches can still be different questions: "total revenue by month for winter sports" and
+    "... for water sports" score 0.84. Answers only match prompts for the same agent definition, and the whole cache is
+    dropped whenever a database file's mtime or size changes.
+    """
+
+    def __init__(
+        self,
+        db_path: Path | Sequence[Path],
+        max_entries: int = 256,
+        ttl_seconds: float = 3600.0,
+        similarity_threshold: float = 1.0,
+    ) -> None:
+        self.db_stamp = DatabaseStamp(db_path)
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.hits = 0
+        self.misses = 0
+        self.seconds_saved = 0.0
+        self._entries: OrderedDict[tuple[str, str], CachedAnswer] = OrderedDict()
+
+    def _check_db_stamp(self) -> None:
+        """Invalidate all entries if a database file has changed since they were cached."""
+        if self.db_stamp.changed():
+            self._entries.clear()
+
+    @staticmethod
+    def similarity(a: frozenset[str], b: frozenset[str]) -> float:
+        if not a or not b:
+            return 0.0
+        return len(a & b) / len(a | b)
+
+    def get(self, prompt: str, agent_fingerprint: str) -> Optional[AnswerCacheHit]:
+        """Return the cached answer to the most similar prompt for the agent, or None on a miss."""
+        self._check_db_stamp()
+        normalized = normalize_prompt(prompt)
+        if not normalized:
+            self.misses += 1
+            return None
+        now = time.monotonic()
+        for key in [key for key, entry in self._entries.items() if now - entry.cached_at > self.ttl_seconds]:
+            del self._entries[key]
+
+        best: Optional[AnswerCacheHit] = None
+        exact = self._entries.get((agent_fingerprint, normalized))
+        if exact is not None:
+            best = AnswerCacheHit(exact, 1.0)
+        elif self.similarity_threshold < 1.0:
+            ngrams = character_ngrams(normalized)
+            numbers = frozenset(NUMBER_PATTERN.findall(normalized))
+            for (fingerprint, _), entry in self._entries.items():
+                if fingerprint != agent_fingerprint or entry.numbers != numbers:
+                    continue
+                score = self.similarity(ngrams, entry.ngrams)
+                if score >= self.similarity_threshold and (best is None or score > best.similarity):
+                    best = AnswerCacheHit(entry, score)
+
+        if best is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end((agent_fingerprint, best.answer.prompt))
+        self.hits += 1
+        self.seconds_saved += best.answer.run_seconds
+        return best
+
+    def put(self, prompt: str, agent_fingerprint: str, deltas: list[str], run_seconds: float) -> None:
+        """Cache an answer, evicting the least recently used entry when full."""
+        normalized = normalize_prompt(prompt)
+        if self.max_entries <= 0 or not deltas or not normalized:
+            return
+        self._check_db_stamp()
+        key = (agent_fingerprint, normalized)
+        self._entries[key] = CachedAnswer(
+            prompt=normalized,
+            ngrams=character_ngrams(normalized),
+            numbers=frozenset(NUMBER_PATTERN.findall(normalized)),
+            agent_fingerprint=agent_fingerprint,
+            deltas=list(deltas),
+            run_seconds=run_seconds,
+            cached_at=time.monotonic(),
+        )
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Drop all cached entries."""
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        """Return the hit/miss counters, current size and run time saved by hits."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self._entries),
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "seconds_saved": self.seconds_saved,
+        }
@@ -0,0 +1,99 @@
+"""
+Load test the workshop client end to end against the local Agents service emulator.
+
+Each session creates its own thread and posts prompts one after another through main.post_message, so the real
+runs.stream, StreamEventHandler, auto function calls and SQLite tool all run, with no network. Sessions run
+concurrently. Reports message latency percentiles and throughput.
+
+Usage:
+    python benchmarks/benchmark_agent_emulator.py --sessions 1 8 32 --messages 4 --tokens-per-second 200
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+# Select the emulator before main.py creates its client. The endpoint is never contacted.
+os.environ["AGENTS_EMULATOR"] = "true"
+os.environ.setdefault("PROJECT_ENDPOINT", "http://localhost")
+
+from azure.ai.agents.models import AsyncToolSet
+
+import main
+from config import Config
+
+PROMPTS = [
+    "What were the sales by region?",
+    "What are the top-selling products?",
+    "Show the total shipping costs by region",
+    "Hello, what can you do?",
+]
+
+
+async def run_session(agent_id: str, messages: int, latencies: list[float]) -> None:
+    thread = await main.agents_client.threads.create()
+    agent = await main.agents_client.get_agent(agent_id)
+    for index in range(messages):
+        start = time.perf_counter()
+        await main.post_message(thread_id=thread.id, content=PROMPTS[index % len(PROMPTS)], agent=agent, thread=thread)
+        latencies.append(time.perf_counter() - start)
+    await main.agents_client.threads.delete(thread.id)
+
+
+async def run_load(agent_id: str, sessions: int, messages: int) -> tuple[list[float], float]:
+    latencies: list[float] = []
+    start = time.perf_counter()
+    # The handler prints every token; keep that out of the timings.
+    with contextlib.redirect_stdout(io.StringIO()):
+        await asyncio.gather(*(run_session(agent_id, messages, latencies) for _ in range(sessions)))
+    return latencies, time.perf_counter() - start
+
+
+async def run() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--messages", type=int, default=4, help="messages posted by each session")
+    parser.add_argument("--request-latency", type=float, default=Config.AGENTS_EMULATOR_REQUEST_LATENCY_SECONDS)
+    parser.add_argument("--first-token-latency", type=float, default=Config.AGENTS_EMULATOR_FIRST_TOKEN_SECONDS)
+    parser.add_argument("--tokens-per-second", type=float, default=Config.AGENTS_EMULATOR_TOKENS_PER_SECOND)
+    args = parser.parse_args()
+
+    client = main.agents_client
+    # Every question must run on the emulator, rather than replaying an earlier answer from the answer cache.
+    main.answer_cache = None
+    client.request_latency_seconds = args.request_latency
+    client.first_token_latency_seconds = args.first_token_latency
+    client.tokens_per_second = args.tokens_per_second
+
+    await main.sales_data.connect()
+    toolset = AsyncToolSet()
+    toolset.add(main.functions)
+    agent = await client.create_agent(
+        model="emulated", name=Config.AGENT_NAME, instructions="Answer questions about Contoso sales.", toolset=toolset
+    )
+    client.enable_auto_function_calls(tools=toolset)
+
+    print(f"{'sessions':>9} {'messages':>9} {'msg/s':>8} {'tokens/s':>9} {'p50 s':>7} {'p95 s':>7} {'max s':>7}")
+    for sessions in args.sessions:
+        tokens_before = client.stats.completion_tokens
+        latencies, elapsed = await run_load(agent.id, sessions, args.messages)
+        tokens = client.stats.completion_tokens - tokens_before
+        percentiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+        print(
+            f"{sessions:>9} {len(latencies):>9} {len(latencies) / elapsed:>8.1f} {tokens / elapsed:>9.0f} "
+            f"{percentiles[49]:>7.2f} {percentiles[94]:>7.2f} {max(latencies):>7.2f}"
+        )
+
+    await client.delete_agent(agent.id)
+    await main.sales_data.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(run())
@@ -0,0 +1,135 @@
+"""
+Measure the answer cache on a workload of repeated analyst questions, against the local Agents service emulator.
+
+Questions are drawn from groups of paraphrases, the popular ones far more often than the rest, and posted through
+main.post_message with the answer cache off and then on. Halfway through the second pass the database file is
+touched, which must drop every cached answer. Reports the hit rate, latency per question and the run time saved.
+
+Usage:
+    python benchmarks/benchmark_answer_cache.py --questions 200 --seed 7
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+# Run against the emulator. The endpoint is never contacted.
+os.environ["AGENTS_EMULATOR"] = "true"
+os.environ.setdefault("PROJECT_ENDPOINT", "http://localhost")
+os.environ.setdefault("MODEL_DEPLOYMENT_NAME", "emulated")
+
+from azure.ai.agents.models import Agent, AsyncToolSet
+
+import main
+from answer_cache import AnswerCache
+from config import Config
+from stream_event_handler import StreamEventHandler
+from token_renderer import NullSink, TokenRenderer
+
+# The same question in different words, most popular first.
+QUESTION_GROUPS = [
+    ["What were the sales by region?", "Show me the sales by region", "sales by region", "Sales by region please"],
+    ["What are the top-selling products?", "top selling products", "Show the top-selling products"],
+    ["Show the total shipping costs by region", "total shipping cost by region", "Shipping costs by region?"],
+    ["What were the sales by region in 2023?", "sales by region for 2023"],
+    ["What were the sales by region in 2024?", "Show me 2024 sales by region"],
+    ["Which products sell the most in Europe?", "top selling products in Europe"],
+    ["What is the revenue by region?", "revenue by region"],
+    ["Hello, what can you do?", "hello"],
+]
+
+
+def workload(questions: int, seed: int) -> list[str]:
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) for rank in range(len(QUESTION_GROUPS))]
+    groups = rng.choices(QUESTION_GROUPS, weights=weights, k=questions)
+    return [rng.choice(group) for group in groups]
+
+
+async def run_pass(agent: Agent, prompts: list[str], db_path: Path, touch_at: Optional[int]) -> list[float]:
+    latencies = []
+    thread = await main.agents_client.threads.create()
+    for index, prompt in enumerate(prompts):
+        if index == touch_at:
+            os.utime(db_path)
+        handler = StreamEventHandler(
+            functions=main.functions,
+            agent_client=main.agents_client,
+            utilities=main.utilities,
+            renderer=TokenRenderer(NullSink()),
+            dispatcher=main.tool_dispatcher,
+        )
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            await main.post_message(
+                thread_id=thread.id, content=prompt, agent=agent, thread=thread, event_handler=handler
+            )
+        latencies.append(time.perf_counter() - start)
+    await main.agents_client.threads.delete(thread.id)
+    return latencies
+
+
+def summarize(label: str, latencies: list[float], cache: Optional[AnswerCache]) -> None:
+    stats = cache.stats() if cache else None
+    hit_rate = f"{stats['hit_rate']:.0%}" if stats else "-"
+    saved = f"{stats['seconds_saved']:.1f}" if stats else "-"
+    print(
+        f"{label:<8} {statistics.mean(latencies):>9.2f} {statistics.median(latencies):>9.2f} "
+        f"{sum(latencies):>9.1f} {hit_rate:>9} {saved:>9}"
+    )
+
+
+async def run() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--similarity", type=float, default=Config.ANSWER_CACHE_SIMILARITY)
+    parser.add_argument("--first-token-latency", type=float, default=Config.AGENTS_EMULATOR_FIRST_TOKEN_SECONDS)
+    parser.add_argument("--tokens-per-second", type=float, default=Config.AGENTS_EMULATOR_TOKENS_PER_SECOND)
+    args = parser.parse_args()
+
+    client = main.agents_client
+    client.first_token_latency_seconds = args.first_token_latency
+    client.tokens_per_second = args.tokens_per_second
+    # Tokens arrive in runs of five, so the workload takes minutes rather than hours at the default rate.
+    client.tokens_per_delta = 5
+    prompts = workload(args.questions, args.seed)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        # Touch a copy, so the real database file is left alone.
+        db_path = Path(temp_dir) / "contoso-sales.db"
+        shutil.copyfile(main.sales_data.db_path, db_path)
+        main.sales_data.db_path = db_path
+        await main.sales_data.connect()
+        toolset = AsyncToolSet()
+        toolset.add(main.functions)
+        agent = await client.create_agent(model=Config.API_DEPLOYMENT_NAME, instructions="", toolset=toolset)
+
+        print(
+            f"{args.questions} questions from {len(QUESTION_GROUPS)} groups of paraphrases, similarity threshold "
+            f"{args.similarity:g}, database touched after question {args.questions // 2}"
+        )
+        print(f"{'cache':<8} {'mean s':>9} {'p50 s':>9} {'total s':>9} {'hit rate':>9} {'saved s':>9}")
+        try:
+            main.answer_cache = None
+            summarize("off", await run_pass(agent, prompts, db_path, None), None)
+            cache = AnswerCache(db_path, similarity_threshold=args.similarity)
+            main.answer_cache = cache
+            summarize("on", await run_pass(agent, prompts, db_path, args.questions // 2), cache)
+        finally:
+            await main.sales_data.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(run())
@@ -0,0 +1,102 @@
+"""
+Compare aggregate_sales on the columnar engine with the same aggregates run as SQLite queries.
+
+Builds a generated sales_data table, then times each aggregate as the GROUP BY query aggregate_sales falls back to,
+run through SalesData.run_query with the query cache off, and on the columnar copy. Checks both return the same
+result, and reports how long the columns take to read from the table and to memory-map from a saved copy.
+
+The app only uses the columnar copy with Config.COLUMNAR_ENGINE set to "memory" or "mmap"; it is off by default.
+
+Usage:
+    python benchmarks/benchmark_columnar.py --rows 1000000 --repeat 5
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("PROJECT_ENDPOINT", "http://localhost")
+os.environ.setdefault("MODEL_DEPLOYMENT_NAME", "benchmark")
+
+from benchmark_tool_dispatcher import build_database
+
+from config import Config
+from sales_columns import SalesColumns
+from sales_data import SalesData
+from utilities import Utilities
+
+# (label, metric, group_by, filters, top_n)
+AGGREGATES = [
+    ("grand total", "revenue", [], {}, 10),
+    ("by region", "revenue", ["region"], {}, 10),
+    ("by product type", "number_of_orders", ["product_type"], {}, 10),
+    ("region x year", "shipping_cost", ["region", "year"], {}, 0),
+    ("1 region, by month", "revenue", ["month"], {"region": "EUROPE"}, 0),
+    ("2 years, type x month", "count", ["product_type", "month"], {"year": [2023, 2024]}, 5),
+]
+
+
+def timed_ms(seconds: list[float]) -> str:
+    return f"{statistics.median(seconds) * 1000:>9.1f}"
+
+
+async def run() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db_path = Path(temp_dir) / "sales.db"
+        print(f"Building a sales_data table with {args.rows:,} rows...")
+        build_database(db_path, args.rows)
+        # Time the SQL path itself: no cached results, and no columnar copy for aggregate_sales to use.
+        Config.COLUMNAR_ENGINE = "off"
+        sales_data = SalesData(Utilities(), db_path)
+        sales_data.query_cache.max_entries = 0
+        await sales_data.connect()
+
+        stat = db_path.stat()
+        identity = {"path": str(db_path.resolve()), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        start = time.perf_counter()
+        columnar = SalesColumns.load(db_path)
+        load_seconds = time.perf_counter() - start
+        columnar.save(Path(temp_dir) / "columns", identity)
+        start = time.perf_counter()
+        mapped = SalesColumns.map(Path(temp_dir) / "columns", identity)
+        map_seconds = time.perf_counter() - start
+        print(f"Read into columns in {load_seconds:.2f} s, memory-mapped from the saved copy in {map_seconds:.3f} s")
+
+        print(f"{'aggregate':<22} {'SQL ms':>9} {'memory ms':>9} {'mmap ms':>9} {'speedup':>9} {'match':>6}")
+        try:
+            for label, metric, group_by, filters, top_n in AGGREGATES:
+                query = sales_data._aggregate_query(metric, group_by, filters, top_n)
+                sql_seconds, memory_seconds, mmap_seconds = [], [], []
+                for _ in range(args.repeat):
+                    start = time.perf_counter()
+                    query_result = await sales_data.run_query(query)
+                    sql_seconds.append(time.perf_counter() - start)
+                    for engine, seconds in ((columnar, memory_seconds), (mapped, mmap_seconds)):
+                        start = time.perf_counter()
+                        columns, rows, _ = engine.aggregate(metric, group_by, filters, top_n)
+                        seconds.append(time.perf_counter() - start)
+
+                match = "yes" if json.loads(query_result.json)["data"] == rows else "NO"
+                speedup = statistics.median(sql_seconds) / statistics.median(memory_seconds)
+                print(
+                    f"{label:<22} {timed_ms(sql_seconds)} {timed_ms(memory_seconds)} {timed_ms(mmap_seconds)} "
+                    f"{speedup:>8.0f}x {match:>6}"
+                )
+        finally:
+            await sales_data.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(run())
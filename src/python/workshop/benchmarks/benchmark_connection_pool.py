@@ -0,0 +1,81 @@
+"""
+Measure SalesData query throughput as the connection pool grows.
+
+Runs the same batch of aggregate queries concurrently against the sales database once per pool size and reports
+queries per second. The query cache is disabled so every call reaches SQLite.
+
+Usage:
+    python benchmarks/benchmark_connection_pool.py --db ../../shared/database/contoso-sales.db --sizes 1 2 4 8
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+# The benchmark never talks to the agent service, but config.py requires the variable.
+os.environ.setdefault("PROJECT_ENDPOINT", "http://localhost")
+
+from config import Config
+from sales_data import SalesData
+from utilities import Utilities
+
+QUERIES = [
+    "SELECT region, SUM(revenue) AS total_revenue FROM sales_data GROUP BY region",
+    "SELECT product_type, SUM(revenue) AS total_revenue FROM sales_data GROUP BY product_type "
+    "ORDER BY total_revenue DESC LIMIT 30",
+    "SELECT region, SUM(shipping_cost) AS total_shipping FROM sales_data GROUP BY region",
+    "SELECT year, month, SUM(number_of_orders) AS orders FROM sales_data GROUP BY year, month LIMIT 30",
+    "SELECT main_category, AVG(discount) AS avg_discount FROM sales_data GROUP BY main_category",
+]
+
+
+async def run_batch(db_path: Path, pool_size: int, total_queries: int, concurrency: int) -> float:
+    """Run the query batch and return queries per second."""
+    Config.SQLITE_POOL_SIZE = pool_size
+    sales_data = SalesData(Utilities(), db_path=db_path)
+    sales_data.query_cache.max_entries = 0
+    await sales_data.connect()
+
+    queue: asyncio.Queue[str] = asyncio.Queue()
+    for index in range(total_queries):
+        queue.put_nowait(QUERIES[index % len(QUERIES)])
+
+    async def worker() -> None:
+        while not queue.empty():
+            await sales_data.async_fetch_sales_data_using_sqlite_query(queue.get_nowait())
+
+    start = time.perf_counter()
+    # The tool prints every query it runs; keep that out of the timings.
+    with contextlib.redirect_stdout(io.StringIO()):
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    await sales_data.close()
+    return total_queries / elapsed
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", type=Path, default=Utilities().shared_files_path / "database/contoso-sales.db")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+
+    print(f"Database: {args.db}")
+    print(f"{'pool size':>10} {'queries/s':>12} {'speedup':>9}")
+    baseline = None
+    for size in args.sizes:
+        throughput = await run_batch(args.db, size, args.queries, args.concurrency)
+        baseline = baseline or throughput
+        print(f"{size:>10} {throughput:>12.1f} {throughput / baseline:>8.2f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
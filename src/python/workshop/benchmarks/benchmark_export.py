@@ -0,0 +1,118 @@
+"""
+Measure export_sales_query on a large result: time, throughput and peak memory.
+
+Builds a generated sales_data table and exports every row with export_sales_query, in each format available, and the
+way the export would be written without streaming: every row fetched at once into a pandas DataFrame, then written
+with to_csv. Each export runs once for its time and once more under tracemalloc for the peak Python memory it
+allocated. pyarrow allocates outside the Python heap, so Parquet's peak only counts the rows on their way in.
+
+Usage:
+    python benchmarks/benchmark_export.py --rows 1000000
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Awaitable, Callable
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("PROJECT_ENDPOINT", "http://localhost")
+os.environ.setdefault("MODEL_DEPLOYMENT_NAME", "benchmark")
+
+from benchmark_tool_dispatcher import build_database
+
+from result_export import EXPORT_FORMATS, export_format_error
+from sales_data import SalesData
+from utilities import Utilities
+
+QUERY = "SELECT * FROM sales_data"
+
+
+class ExportUtilities(Utilities):
+    """Utilities whose shared files folder is a temporary directory, so exports never land in the repository."""
+
+    def __init__(self, shared_files_path: Path) -> None:
+        super().__init__()
+        self._shared_files_path = shared_files_path
+
+    @property
+    def shared_files_path(self) -> Path:
+        return self._shared_files_path
+
+
+def export_all_at_once(db_path: Path, out_path: Path) -> None:
+    with sqlite3.connect(db_path) as conn:
+        cursor = conn.execute(QUERY)
+        frame = pd.DataFrame(cursor.fetchall(), columns=[description[0] for description in cursor.description])
+    frame.to_csv(out_path, index=False)
+
+
+async def measure(export: Callable[[], Awaitable[Path]]) -> tuple[float, int, int]:
+    """Return the seconds taken, the bytes written and the peak Python memory of a second run."""
+    start = time.perf_counter()
+    path = await export()
+    seconds = time.perf_counter() - start
+    size = path.stat().st_size
+    path.unlink()
+    tracemalloc.start()
+    (await export()).unlink()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return seconds, size, peak
+
+
+async def run() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db_path = Path(temp_dir) / "sales.db"
+        print(f"Building a sales_data table with {args.rows:,} rows...")
+        build_database(db_path, args.rows)
+        sales_data = SalesData(ExportUtilities(Path(temp_dir)), db_path)
+        await sales_data.connect()
+
+        async def export_tool(export_format: str) -> Path:
+            with contextlib.redirect_stdout(io.StringIO()):
+                result = json.loads(await sales_data.export_sales_query(QUERY, export_format))
+            if "path" not in result:
+                raise RuntimeError(result)
+            return Path(result["path"])
+
+        async def export_baseline() -> Path:
+            out_path = Path(temp_dir) / "all_at_once.csv"
+            await asyncio.to_thread(export_all_at_once, db_path, out_path)
+            return out_path
+
+        cases = [("fetch all + to_csv", export_baseline)]
+        for export_format in EXPORT_FORMATS:
+            if export_format_error(export_format):
+                print(f"Skipping {export_format}: {export_format_error(export_format)}")
+                continue
+            cases.append((f"export {export_format}", lambda export_format=export_format: export_tool(export_format)))
+
+        print(f"{'export':<20} {'seconds':>8} {'MB':>8} {'rows/s':>10} {'peak MB':>8}")
+        try:
+            for label, export in cases:
+                seconds, size, peak = await measure(export)
+                print(
+                    f"{label:<20} {seconds:>8.2f} {size / 1e6:>8.1f} {args.rows / seconds:>10,.0f} {peak / 1e6:>8.1f}"
+                )
+        finally:
+            await sales_data.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(run())
@@ -0,0 +1,79 @@
+"""
+Compare the native split-JSON encoder with the pandas DataFrame.to_json path it replaces.
+
+Generates sales_data-shaped rows, encodes them both ways for each result size, checks the outputs are identical and
+reports the time taken by each.
+
+Usage:
+    python benchmarks/benchmark_result_encoder.py --sizes 10 1000 100000 1000000
+"""
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from result_encoder import encode_split_json
+
+COLUMNS = ["main_category", "product_type", "revenue", "shipping_cost", "number_of_orders", "year", "region"]
+CATEGORIES = ["APPAREL", "CAMPING & HIKING", "CLIMBING", "FOOTWEAR", "TRAVEL", "WATER SPORTS", "WINTER SPORTS"]
+PRODUCT_TYPES = ["JACKETS & VESTS", "BACKPACKING TENTS", "HARNESSES", "TRAIL SHOES", "CARRY-ONS", "KAYAKS", "SKIS"]
+REGIONS = ["AFRICA", "ASIA-PACIFIC", "EUROPE", "MIDDLE EAST", "NORTH AMERICA", "LATIN AMERICA"]
+
+
+def make_rows(count: int, seed: int = 42) -> list[tuple]:
+    rng = random.Random(seed)
+    rows = []
+    for _ in range(count):
+        revenue = float(rng.randint(5, 1200) * rng.randint(1, 20))
+        rows.append(
+            (
+                rng.choice(CATEGORIES),
+                rng.choice(PRODUCT_TYPES),
+                revenue,
+                revenue * rng.randint(10, 20) / 100.0,
+                rng.randint(1, 20),
+                rng.choice([2021, 2022, 2023, 2024]),
+                rng.choice(REGIONS),
+            )
+        )
+    return rows
+
+
+def time_call(func, repeat: int) -> tuple[float, str]:
+    best = float("inf")
+    result = ""
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1_000, 10_000, 100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} {'pandas ms':>12} {'native ms':>12} {'speedup':>9} {'identical':>10}")
+    for size in args.sizes:
+        rows = make_rows(size)
+        repeat = args.repeat if size < 1_000_000 else 1
+        pandas_time, pandas_json = time_call(
+            lambda rows=rows: pd.DataFrame(rows, columns=COLUMNS).to_json(index=False, orient="split"), repeat
+        )
+        native_time, native_json = time_call(lambda rows=rows: encode_split_json(COLUMNS, rows), repeat)
+        print(
+            f"{size:>10} {pandas_time * 1000:>12.2f} {native_time * 1000:>12.2f} "
+            f"{pandas_time / native_time:>8.2f}x {pandas_json == native_json!s:>10}"
+        )
+
+
+if __name__ == "__main__":
+    main()
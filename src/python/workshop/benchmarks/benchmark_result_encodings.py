@@ -0,0 +1,82 @@
+"""
+Compare the size of query results in each result encoding, over a corpus of queries.
+
+Runs every query in the workload against the database, then encodes its rows in each encoding, at full precision and
+rounded to --decimals, within the same MAX_QUERY_RESULT_BYTES budget SalesData uses. Reports the total bytes and an
+estimate of the prompt tokens for each, and how many rows fit in the budget.
+
+Tokens are estimated by splitting the text the way BPE tokenizers roughly do: runs of letters, groups of up to three
+digits, and each other character. Utilities.estimate_tokens, a fixed number of bytes per token, would rank the
+encodings exactly as the byte counts do.
+
+Usage:
+    python benchmarks/benchmark_result_encodings.py --db ../../shared/database/contoso-sales.db --decimals 2
+"""
+
+import argparse
+import os
+import re
+import sqlite3
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+# config.py requires the variable, but nothing here talks to the agent service.
+os.environ.setdefault("PROJECT_ENDPOINT", "http://localhost")
+
+from config import Config
+from result_encoder import ENCODINGS, encode_result_within
+from utilities import Utilities
+from workload_log import read_workload
+
+CANNED_WORKLOAD = Path(__file__).resolve().parent / "workloads/canned_queries.jsonl"
+TOKEN_PATTERN = re.compile(r"[A-Za-z]+|\d{1,3}|[^\sA-Za-z\d]")
+
+
+def estimate_tokens(text: str) -> int:
+    return len(TOKEN_PATTERN.findall(text))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", type=Path, default=Utilities().shared_files_path / "database/contoso-sales.db")
+    parser.add_argument("--workload", type=Path, default=CANNED_WORKLOAD)
+    parser.add_argument("--decimals", type=int, default=2, help="the rounding compared with full precision")
+    args = parser.parse_args()
+
+    results = []
+    with sqlite3.connect(f"file:{args.db}?mode=ro", uri=True) as conn:
+        for record in read_workload(args.workload):
+            try:
+                cursor = conn.execute(record.query)
+            except sqlite3.Error as e:
+                print(f"Skipped {record.query!r}: {e}")
+                continue
+            columns = [description[0] for description in cursor.description]
+            results.append((columns, cursor.fetchmany(Config.MAX_QUERY_ROWS)))
+
+    print(
+        f"{len(results)} queries, {sum(len(rows) for _, rows in results):,} rows, "
+        f"{Config.MAX_QUERY_RESULT_BYTES:,} byte budget per result"
+    )
+    print(f"{'encoding':<16} {'decimals':>8} {'bytes':>9} {'tokens':>9} {'vs split':>9} {'rows':>7}")
+    baseline_tokens = None
+    for encoding in ENCODINGS:
+        for decimals in (None, args.decimals):
+            total_bytes = total_tokens = total_rows = 0
+            for columns, rows in results:
+                encoded, rows_encoded = encode_result_within(
+                    columns, rows, Config.MAX_QUERY_RESULT_BYTES, encoding, decimals
+                )
+                total_bytes += len(encoded.encode("utf-8"))
+                total_tokens += estimate_tokens(encoded)
+                total_rows += rows_encoded
+            baseline_tokens = baseline_tokens or total_tokens
+            print(
+                f"{encoding:<16} {'full' if decimals is None else decimals:>8} {total_bytes:>9,} {total_tokens:>9,} "
+                f"{total_tokens / baseline_tokens:>9.0%} {total_rows:>7,}"
+            )
+
+
+if __name__ == "__main__":
+    main()
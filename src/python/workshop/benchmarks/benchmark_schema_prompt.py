@@ -0,0 +1,107 @@
+"""
+Measure the size of the schema written into the agent instructions as the product catalogue grows.
+
+Builds a sales_data table with the given number of distinct product types for each catalogue size, then renders the
+schema twice: listing every distinct value (the previous behaviour), and with the cardinality-aware summary that lists
+the most common values and leaves the rest to the lookup_distinct_values tool. Tokens are estimated at 4 bytes per
+token and also shown as a share of Config.MAX_PROMPT_TOKENS, which every run's instructions count against.
+
+Usage:
+    python benchmarks/benchmark_schema_prompt.py --product-types 66 1000 10000 100000
+"""
+
+import argparse
+import asyncio
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+# The benchmark never talks to the agent service, but config.py requires the variable.
+os.environ.setdefault("PROJECT_ENDPOINT", "http://localhost")
+
+from config import Config
+from sales_data import SalesData
+from utilities import Utilities
+
+REGIONS = ["AFRICA", "ASIA-PACIFIC", "EUROPE", "LATIN AMERICA", "MIDDLE EAST", "NORTH AMERICA"]
+CATEGORIES = ["APPAREL", "CAMPING & HIKING", "CLIMBING", "FOOTWEAR", "TRAVEL", "WATER SPORTS", "WINTER SPORTS"]
+CREATE_SALES_DATA = """
+CREATE TABLE sales_data (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, main_category TEXT, product_type TEXT, revenue REAL, shipping_cost REAL,
+    number_of_orders INTEGER, year INTEGER, month INTEGER, discount INTEGER, region TEXT, month_date TEXT
+)
+"""
+
+
+def build_database(path: Path, product_types: int) -> None:
+    """Write a sales_data table with two rows per product type, skewed so some types sell far more than others."""
+    rows = max(product_types * 2, 10_000)
+    with sqlite3.connect(path) as conn:
+        conn.execute(CREATE_SALES_DATA)
+        conn.executemany(
+            "INSERT INTO sales_data (main_category, product_type, revenue, shipping_cost, number_of_orders, year, "
+            "month, discount, region, month_date) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                (
+                    CATEGORIES[i % len(CATEGORIES)],
+                    # Squaring the index makes low-numbered product types the most common.
+                    f"PRODUCT TYPE {(i * i) % product_types if i % 2 else i % product_types:06d}",
+                    100.0 + i % 997,
+                    5.0,
+                    1 + i % 9,
+                    2021 + i % 4,
+                    1 + i % 12,
+                    i % 20,
+                    REGIONS[i % len(REGIONS)],
+                    f"{2021 + i % 4}-{1 + i % 12:02d}-01",
+                )
+                for i in range(rows)
+            ),
+        )
+
+
+async def render_schema(db_path: Path, enum_max_values: int) -> tuple[str, float]:
+    Config.SCHEMA_ENUM_MAX_VALUES = enum_max_values
+    sales_data = SalesData(Utilities(), db_path)
+    await sales_data.connect()
+    try:
+        start = time.perf_counter()
+        schema = await sales_data.get_database_info()
+        return schema, time.perf_counter() - start
+    finally:
+        await sales_data.close()
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--product-types", type=int, nargs="+", default=[66, 1000, 10_000, 100_000])
+    args = parser.parse_args()
+
+    Config.SCHEMA_SNAPSHOT_CACHE = False
+    summary_max_values = Config.SCHEMA_ENUM_MAX_VALUES
+    utilities = Utilities()
+
+    print(
+        f"{'product types':>14} {'listed tokens':>14} {'% of max':>9} {'summary tokens':>15} {'% of max':>9} "
+        f"{'ms':>7}"
+    )
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for product_types in args.product_types:
+            db_path = Path(temp_dir) / f"sales-{product_types}.db"
+            build_database(db_path, product_types)
+            listed, _ = await render_schema(db_path, enum_max_values=sys.maxsize)
+            summary, seconds = await render_schema(db_path, enum_max_values=summary_max_values)
+            listed_tokens = utilities.estimate_tokens(listed)
+            summary_tokens = utilities.estimate_tokens(summary)
+            print(
+                f"{product_types:>14,} {listed_tokens:>14,} {listed_tokens / Config.MAX_PROMPT_TOKENS:>9.0%} "
+                f"{summary_tokens:>15,} {summary_tokens / Config.MAX_PROMPT_TOKENS:>9.0%} {seconds * 1000:>7.1f}"
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,125 @@
+"""
+Load test server.py with many concurrent WebSocket sessions against the local Agents service emulator.
+
+The server runs in this process on a free port, backed by the emulator, so the whole path from the WebSocket through
+runs.stream, auto function calls and SQLite is exercised with no network. For each session count, every client sends
+its prompts one after another and waits for each reply to finish.
+
+Reports message latency, time to first delta, and the CPU the process used. Sessions per core is the session count
+divided by the cores kept busy, so it estimates how many such sessions one core can serve. The clients share the
+process, so their CPU is included and the estimate is conservative.
+
+Usage:
+    python benchmarks/benchmark_server.py --sessions 1 16 64 --messages 3 --tokens-per-second 50
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+# Serve from the emulator. The endpoint is never contacted.
+os.environ["AGENTS_EMULATOR"] = "true"
+os.environ.setdefault("PROJECT_ENDPOINT", "http://localhost")
+os.environ.setdefault("MODEL_DEPLOYMENT_NAME", "emulated")
+
+import aiohttp
+from aiohttp import web
+
+import main
+import server
+from config import Config
+
+PROMPTS = [
+    "What were the sales by region?",
+    "What are the top-selling products?",
+    "Show the total shipping costs by region",
+]
+
+
+def percentile(values: list[float], percent: int) -> float:
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[percent - 1]
+
+
+async def run_client(
+    http: aiohttp.ClientSession, url: str, messages: int, latencies: list[float], first_deltas: list[float]
+) -> None:
+    async with http.ws_connect(url) as ws:
+        for index in range(messages):
+            start = time.perf_counter()
+            first_delta = None
+            await ws.send_str(PROMPTS[index % len(PROMPTS)])
+            async for msg in ws:
+                frame = msg.json()
+                if frame["type"] == "delta" and first_delta is None:
+                    first_delta = time.perf_counter() - start
+                elif frame["type"] == "done":
+                    break
+            latencies.append(time.perf_counter() - start)
+            if first_delta is not None:
+                first_deltas.append(first_delta)
+
+
+async def run_level(url: str, sessions: int, messages: int) -> None:
+    latencies: list[float] = []
+    first_deltas: list[float] = []
+    cpu_start = time.process_time()
+    start = time.perf_counter()
+    # The SQLite tool prints every query it runs; keep that out of the table.
+    with contextlib.redirect_stdout(io.StringIO()):
+        async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=0)) as http:
+            clients = (run_client(http, url, messages, latencies, first_deltas) for _ in range(sessions))
+            await asyncio.gather(*clients)
+    elapsed = time.perf_counter() - start
+    cores_busy = (time.process_time() - cpu_start) / elapsed
+
+    print(
+        f"{sessions:>9} {len(latencies) / elapsed:>8.1f} {percentile(latencies, 50):>7.2f} "
+        f"{percentile(latencies, 95):>7.2f} {percentile(first_deltas, 50):>9.2f} {cores_busy:>11.2f} "
+        f"{sessions / cores_busy if cores_busy else float('inf'):>14.0f}"
+    )
+
+
+async def run() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 16, 64])
+    parser.add_argument("--messages", type=int, default=3, help="messages sent by each session")
+    parser.add_argument("--first-token-latency", type=float, default=Config.AGENTS_EMULATOR_FIRST_TOKEN_SECONDS)
+    parser.add_argument("--tokens-per-second", type=float, default=Config.AGENTS_EMULATOR_TOKENS_PER_SECOND)
+    args = parser.parse_args()
+
+    Config.SERVER_MAX_SESSIONS = max(Config.SERVER_MAX_SESSIONS, max(args.sessions))
+    main.agents_client.first_token_latency_seconds = args.first_token_latency
+    main.agents_client.tokens_per_second = args.tokens_per_second
+    # Every question must run on the emulator, rather than replaying an earlier answer from the answer cache.
+    main.answer_cache = None
+    main.INSTRUCTIONS_FILE = "instructions/function_calling.txt"
+    main.toolset.add(main.functions)
+
+    runner = web.AppRunner(server.create_app(), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    url = f"http://127.0.0.1:{runner.addresses[0][1]}/ws"
+
+    print(
+        f"{'sessions':>9} {'msg/s':>8} {'p50 s':>7} {'p95 s':>7} {'TTFD p50':>9} {'cores busy':>11} "
+        f"{'sessions/core':>14}"
+    )
+    try:
+        for sessions in args.sessions:
+            await run_level(url, sessions, args.messages)
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(run())
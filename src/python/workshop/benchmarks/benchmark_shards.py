@@ -0,0 +1,126 @@
+"""
+Compare aggregate queries over sales data split into per-year shard files with the same queries on one database.
+
+Builds a generated sales_data table and splits it into one shard file per year. Times each query through
+SalesData.run_query, with the query cache off, on the single database, on the shards through the unified views, and
+on the shards fanned out to the worker processes with the partial aggregates merged. Checks that all three return the
+same result. The fan-out only pays off with at least as many CPUs as shards.
+
+Usage:
+    python benchmarks/benchmark_shards.py --rows 1000000 --repeat 5
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from contextlib import closing
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("PROJECT_ENDPOINT", "http://localhost")
+os.environ.setdefault("MODEL_DEPLOYMENT_NAME", "benchmark")
+
+from benchmark_tool_dispatcher import build_database
+
+from config import Config
+from sales_data import SalesData
+from utilities import Utilities
+
+QUERIES = [
+    ("grand total", "SELECT ROUND(SUM(revenue), 2) AS revenue, COUNT(*) AS sales FROM sales_data"),
+    ("by region", "SELECT region, SUM(revenue) AS revenue FROM sales_data GROUP BY region ORDER BY revenue DESC"),
+    (
+        "avg by product type",
+        "SELECT product_type, AVG(number_of_orders) AS orders FROM sales_data GROUP BY product_type "
+        "ORDER BY orders DESC, product_type LIMIT 10",
+    ),
+    (
+        "region x month, filtered",
+        "SELECT region, month, MAX(revenue) AS top, MIN(discount) AS discount FROM sales_data "
+        "WHERE discount > 5 GROUP BY region, month ORDER BY region, month",
+    ),
+    (
+        "having",
+        "SELECT product_type, COUNT(*) AS sales FROM sales_data GROUP BY product_type "
+        "HAVING SUM(revenue) > 1000 ORDER BY sales DESC, product_type LIMIT 5",
+    ),
+]
+
+
+def split_by_year(db_path: Path, shard_dir: Path) -> list[Path]:
+    shard_dir.mkdir()
+    with closing(sqlite3.connect(db_path)) as conn:
+        years = [year for (year,) in conn.execute("SELECT DISTINCT year FROM sales_data ORDER BY year")]
+        schema = conn.execute("SELECT sql FROM sqlite_master WHERE name = 'sales_data'").fetchone()[0]
+        paths = []
+        for year in years:
+            path = shard_dir / f"sales-{year}.db"
+            conn.execute("ATTACH DATABASE ? AS shard", (str(path),))
+            conn.execute(schema.replace("sales_data", "shard.sales_data", 1))
+            conn.execute("INSERT INTO shard.sales_data SELECT * FROM sales_data WHERE year = ?", (year,))
+            conn.commit()
+            conn.execute("DETACH DATABASE shard")
+            paths.append(path)
+    return paths
+
+
+async def time_queries(sales_data: SalesData, repeat: int) -> list[tuple[list[float], object]]:
+    results = []
+    for _, query in QUERIES:
+        seconds = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            query_result = await sales_data.run_query(query)
+            seconds.append(time.perf_counter() - start)
+        results.append((seconds, json.loads(query_result.json)["data"]))
+    return results
+
+
+def timed_ms(seconds: list[float]) -> str:
+    return f"{statistics.median(seconds) * 1000:>9.1f}"
+
+
+async def run() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db_path = Path(temp_dir) / "sales.db"
+        print(f"Building a sales_data table with {args.rows:,} rows...")
+        build_database(db_path, args.rows)
+        shard_paths = split_by_year(db_path, Path(temp_dir) / "shards")
+        print(f"Split into {len(shard_paths)} shards, {Config.SHARD_WORKERS} worker processes, {os.cpu_count()} CPUs")
+
+        timings = {}
+        runs = (("single", None, False), ("views", shard_paths, False), ("fan-out", shard_paths, True))
+        for label, paths, fanout in runs:
+            Config.SHARD_FANOUT = fanout
+            sales_data = SalesData(Utilities(), db_path if paths is None else None, shard_paths=paths or [])
+            sales_data.query_cache.max_entries = 0
+            await sales_data.connect()
+            try:
+                # The first query starts the worker processes.
+                await sales_data.run_query(QUERIES[0][1])
+                timings[label] = await time_queries(sales_data, args.repeat)
+            finally:
+                await sales_data.close()
+
+        print(f"{'query':<26} {'single ms':>9} {'views ms':>9} {'fan-out':>9} {'match':>6}")
+        for index, (label, _) in enumerate(QUERIES):
+            (single, expected), (views, view_rows), (fanned_out, fanned_out_rows) = (
+                timings[name][index] for name in ("single", "views", "fan-out")
+            )
+            match = "yes" if expected == view_rows == fanned_out_rows else "NO"
+            print(f"{label:<26} {timed_ms(single)} {timed_ms(views)} {timed_ms(fanned_out)} {match:>6}")
+
+
+if __name__ == "__main__":
+    asyncio.run(run())
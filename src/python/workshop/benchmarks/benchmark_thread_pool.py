@@ -0,0 +1,131 @@
+"""
+Measure time to first token for new sessions with and without the pre-warmed thread pool, against the local Agents
+service emulator.
+
+New sessions arrive at a fixed interval. Each one gets a thread, posts a message and records when the first token of
+the reply arrives, measured from the moment the session started. Without the pool every session first waits for
+threads.create and, when it ends, for threads.delete; with the pool the thread is handed out ready-made and deleted
+later in a batch.
+
+Usage:
+    python benchmarks/benchmark_thread_pool.py --sessions 20 --arrival-interval 0.25 --request-latency 0.2
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+# Run against the emulator. The endpoint is never contacted.
+os.environ["AGENTS_EMULATOR"] = "true"
+os.environ.setdefault("PROJECT_ENDPOINT", "http://localhost")
+os.environ.setdefault("MODEL_DEPLOYMENT_NAME", "emulated")
+
+from azure.ai.agents.models import Agent
+
+import main
+from config import Config
+from stream_event_handler import StreamEventHandler
+from thread_pool import ThreadPool
+from token_renderer import TokenRenderer, TokenSink
+
+PROMPT = "What were the sales by region?"
+
+
+class FirstTokenSink(TokenSink):
+    """Record when the first token arrives and discard the rest."""
+
+    def __init__(self) -> None:
+        self.first_token_at: Optional[float] = None
+
+    async def write(self, text: str) -> None:
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+
+
+def percentile(values: list[float], percent: int) -> float:
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[percent - 1]
+
+
+async def run_session(agent: Agent, pool: Optional[ThreadPool], first_tokens: list[float]) -> None:
+    start = time.perf_counter()
+    thread = await pool.acquire() if pool else await main.agents_client.threads.create()
+    sink = FirstTokenSink()
+    handler = StreamEventHandler(
+        functions=main.functions,
+        agent_client=main.agents_client,
+        utilities=main.utilities,
+        renderer=TokenRenderer(sink, window_seconds=0),
+    )
+    await main.post_message(thread_id=thread.id, content=PROMPT, agent=agent, thread=thread, event_handler=handler)
+    if sink.first_token_at is not None:
+        first_tokens.append(sink.first_token_at - start)
+    if pool:
+        pool.release(thread)
+    else:
+        await main.agents_client.threads.delete(thread.id)
+
+
+async def run_case(label: str, agent: Agent, pool: Optional[ThreadPool], sessions: int, interval: float) -> None:
+    first_tokens: list[float] = []
+    if pool:
+        await pool.start()
+    with contextlib.redirect_stdout(io.StringIO()):
+        tasks = []
+        for _ in range(sessions):
+            tasks.append(asyncio.create_task(run_session(agent, pool, first_tokens)))
+            await asyncio.sleep(interval)
+        await asyncio.gather(*tasks)
+    pool_hits = "-"
+    if pool:
+        pool_hits = f"{pool.hits}/{pool.hits + pool.misses}"
+        await pool.close()
+    print(
+        f"{label:<12} {percentile(first_tokens, 50) * 1000:>9.0f} {percentile(first_tokens, 95) * 1000:>9.0f} "
+        f"{max(first_tokens) * 1000:>9.0f} {pool_hits:>10}"
+    )
+
+
+async def run() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--arrival-interval", type=float, default=0.25, help="seconds between new sessions")
+    parser.add_argument("--pool-size", type=int, default=Config.THREAD_POOL_SIZE)
+    parser.add_argument("--request-latency", type=float, default=0.2, help="emulated latency of each service call")
+    parser.add_argument("--first-token-latency", type=float, default=Config.AGENTS_EMULATOR_FIRST_TOKEN_SECONDS)
+    args = parser.parse_args()
+
+    client = main.agents_client
+    # Every question must run on the emulator, rather than replaying an earlier answer from the answer cache.
+    main.answer_cache = None
+    client.request_latency_seconds = args.request_latency
+    client.first_token_latency_seconds = args.first_token_latency
+    main.toolset.add(main.functions)
+    await main.sales_data.connect()
+    agent = await client.create_agent(model=Config.API_DEPLOYMENT_NAME, instructions="", toolset=main.toolset)
+    client.enable_auto_function_calls(tools=main.toolset)
+
+    print(
+        f"{args.sessions} sessions, one every {args.arrival_interval:g} s, "
+        f"{args.request_latency * 1000:g} ms per service call, pool of {args.pool_size}"
+    )
+    print(f"{'threads':<12} {'TTFT p50':>9} {'TTFT p95':>9} {'TTFT max':>9} {'pool hits':>10}")
+    try:
+        await run_case("created", agent, None, args.sessions, args.arrival_interval)
+        pool = ThreadPool(client, size=args.pool_size)
+        await run_case("pooled", agent, pool, args.sessions, args.arrival_interval)
+    finally:
+        await main.sales_data.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(run())
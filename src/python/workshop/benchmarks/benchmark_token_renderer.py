@@ -0,0 +1,156 @@
+"""
+Measure StreamEventHandler overhead per 10k streamed tokens.
+
+Feeds parsed message deltas to StreamEventHandler, writing to a stdout replaced by /dev/null, and compares printing
+every delta (the previous behaviour) with the coalescing token renderer. Writes and flushes to stdout are counted
+because each one is a system call, and far more expensive on a real terminal or pipe than on /dev/null. For scale,
+the time the SDK spends parsing the same events from the stream is reported too.
+
+Usage:
+    python benchmarks/benchmark_token_renderer.py --tokens 10000 --max-chars 512
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+from typing import AsyncIterator, TextIO
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+# The benchmark never talks to the agent service, but config.py requires the variable.
+os.environ.setdefault("PROJECT_ENDPOINT", "http://localhost")
+
+from azure.ai.agents.models import AsyncAgentEventHandler, AsyncFunctionTool, MessageDeltaChunk
+
+from agents_emulator import EmulatedAgentsClient, sse_event
+from stream_event_handler import StreamEventHandler
+from token_renderer import NullSink, TerminalSink, TokenRenderer
+from utilities import Utilities
+
+
+class CountingStream:
+    """A text stream over /dev/null that counts writes and flushes."""
+
+    def __init__(self, stream: TextIO) -> None:
+        self.stream = stream
+        self.writes = 0
+        self.flushes = 0
+
+    def write(self, text: str) -> int:
+        self.writes += 1
+        return self.stream.write(text)
+
+    def flush(self) -> None:
+        self.flushes += 1
+        self.stream.flush()
+
+
+class PerTokenEventHandler(StreamEventHandler):
+    """The previous behaviour: one coloured print and flush per delta."""
+
+    async def on_message_delta(self, delta: MessageDeltaChunk) -> None:
+        self.util.log_token_blue(delta.text)
+
+
+def build_deltas(tokens: int) -> list[dict]:
+    words = "Revenue in Europe grew fastest while North America stayed the largest region overall".split()
+    return [
+        {
+            "id": "msg_benchmark",
+            "object": "thread.message.delta",
+            "delta": {"content": [{"index": 0, "type": "text", "text": {"value": f" {words[i % len(words)]}"}}]},
+        }
+        for i in range(tokens)
+    ]
+
+
+async def run_handler(handler: StreamEventHandler, chunks: list[MessageDeltaChunk]) -> float:
+    start = time.perf_counter()
+    for chunk in chunks:
+        await handler.on_message_delta(chunk)
+    await handler.on_done()
+    return time.perf_counter() - start
+
+
+async def run_sdk_parsing(deltas: list[dict]) -> float:
+    """Time the SDK parsing the deltas from a server-sent event stream, with a handler that does nothing."""
+    events = [sse_event("thread.message.delta", delta) for delta in deltas] + [sse_event("done", "[DONE]")]
+
+    async def response() -> AsyncIterator[bytes]:
+        for event in events:
+            yield event
+
+    async def no_tool_outputs(*args: object) -> None:
+        return None
+
+    handler = AsyncAgentEventHandler()
+    handler.initialize(response(), no_tool_outputs)
+    start = time.perf_counter()
+    await handler.until_done()
+    return time.perf_counter() - start
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tokens", type=int, default=10_000)
+    parser.add_argument("--window", type=float, default=0.05, help="renderer window in seconds")
+    parser.add_argument("--max-chars", type=int, default=512, help="renderer buffer size in characters")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    deltas = build_deltas(args.tokens)
+    chunks = [MessageDeltaChunk(delta) for delta in deltas]
+    handler_args = {
+        "functions": AsyncFunctionTool(set()),
+        "agent_client": EmulatedAgentsClient(),
+        "utilities": Utilities(),
+    }
+    scale = 10_000 / args.tokens
+
+    def per_token() -> AsyncAgentEventHandler:
+        return PerTokenEventHandler(**handler_args)
+
+    def coalesced_terminal() -> AsyncAgentEventHandler:
+        renderer = TokenRenderer(TerminalSink(), window_seconds=args.window, max_chars=args.max_chars)
+        return StreamEventHandler(**handler_args, renderer=renderer)
+
+    def coalesced_null() -> AsyncAgentEventHandler:
+        renderer = TokenRenderer(NullSink(), window_seconds=args.window, max_chars=args.max_chars)
+        return StreamEventHandler(**handler_args, renderer=renderer)
+
+    cases = {
+        "per-token print": per_token,
+        "coalesced terminal": coalesced_terminal,
+        "coalesced null sink": coalesced_null,
+    }
+
+    results = {}
+    real_stdout = sys.stdout
+    with open(os.devnull, "w", encoding="utf-8") as devnull:
+        for name, make_handler in cases.items():
+            best = float("inf")
+            for _ in range(args.repeat):
+                counter = CountingStream(devnull)
+                sys.stdout = counter
+                try:
+                    best = min(best, await run_handler(make_handler(), chunks))
+                finally:
+                    sys.stdout = real_stdout
+            results[name] = (best, counter.writes, counter.flushes)
+
+    parse_seconds = await run_sdk_parsing(deltas)
+
+    print(f"{args.tokens:,} tokens, best of {args.repeat}, figures per 10k tokens")
+    print(f"{'handler':<22} {'ms':>9} {'us/token':>9} {'writes':>8} {'flushes':>8}")
+    for name, (seconds, writes, flushes) in results.items():
+        print(
+            f"{name:<22} {seconds * 1000 * scale:>9.1f} {seconds * 1e6 / args.tokens:>9.2f} "
+            f"{writes * scale:>8.0f} {flushes * scale:>8.0f}"
+        )
+    print(f"\nSDK event parsing for comparison: {parse_seconds * 1000 * scale:.1f} ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,186 @@
+"""
+Compare run times when the model makes several SQL function calls in one run step, against the local Agents service
+emulator.
+
+Every run asks for a per-region breakdown, one async_fetch_sales_data_using_sqlite_query call per region in a single
+step, on a generated sales_data table large enough that each query takes a while. The calls run one at a time, through
+the client's auto function calls (every call at once, with no timeout), and through the tool dispatcher (at most
+--concurrency at once, each with its own timeout). With --slow-call, each step also carries a query that runs past
+--tool-timeout, to show the other calls still complete. Queries differ between runs, so the query cache never hits.
+
+Queries on one machine only overlap as far as its cores allow. --query-latency adds a fixed wait before each query,
+standing in for the round trip to a database server, which overlaps however many cores there are.
+
+Usage:
+    python benchmarks/benchmark_tool_dispatcher.py --rows 1000000 --runs 5 --concurrency 4
+"""
+
+import argparse
+import asyncio
+import contextlib
+import functools
+import io
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+# Run against the emulator. The endpoint is never contacted.
+os.environ["AGENTS_EMULATOR"] = "true"
+os.environ.setdefault("PROJECT_ENDPOINT", "http://localhost")
+os.environ.setdefault("MODEL_DEPLOYMENT_NAME", "emulated")
+
+from azure.ai.agents.models import Agent, AsyncFunctionTool, AsyncToolSet
+
+import main
+from agents_emulator import SALES_QUERY_FUNCTION, ScriptedFunctionCall, ScriptedTurn
+from config import Config
+from sales_data import SalesData
+from stream_event_handler import StreamEventHandler
+from token_renderer import NullSink, TokenRenderer
+from tool_dispatcher import ToolDispatcher
+
+REGIONS = ["AFRICA", "ASIA-PACIFIC", "EUROPE", "LATIN AMERICA", "MIDDLE EAST", "NORTH AMERICA"]
+REGION_QUERY = (
+    "SELECT product_type, SUM(revenue) AS total_revenue, SUM(number_of_orders) AS orders FROM sales_data "
+    "WHERE region = '{region}' AND year >= {year} GROUP BY product_type ORDER BY total_revenue DESC LIMIT 5"
+)
+# Counts far past anything it could finish, until the tool timeout or the query timeout stops it.
+SLOW_QUERY = (
+    "WITH RECURSIVE counter(n) AS (SELECT {year} UNION ALL SELECT n + 1 FROM counter WHERE n < 10000000000) "
+    "SELECT COUNT(*) FROM counter"
+)
+
+
+def build_database(path: Path, rows: int) -> None:
+    with sqlite3.connect(path) as conn:
+        conn.execute(
+            "CREATE TABLE sales_data (id INTEGER PRIMARY KEY, main_category TEXT, product_type TEXT, revenue REAL, "
+            "shipping_cost REAL, number_of_orders INTEGER, year INTEGER, month INTEGER, discount INTEGER, "
+            "region TEXT, month_date TEXT)"
+        )
+        conn.executemany(
+            "INSERT INTO sales_data VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                (
+                    i,
+                    "CAMPING & HIKING",
+                    f"PRODUCT TYPE {i % 97:02d}",
+                    100.0 + i % 997,
+                    5.0,
+                    1 + i % 9,
+                    2021 + i % 4,
+                    1 + i % 12,
+                    i % 20,
+                    REGIONS[i % len(REGIONS)],
+                    f"{2021 + i % 4}-{1 + i % 12:02d}-01",
+                )
+                for i in range(rows)
+            ),
+        )
+
+
+def with_latency(sales_data: SalesData, latency_seconds: float):
+    """The sales query tool, waiting latency_seconds before each query. The wrapper keeps its name and signature."""
+    tool = sales_data.async_fetch_sales_data_using_sqlite_query
+
+    @functools.wraps(tool)
+    async def async_fetch_sales_data_using_sqlite_query(sqlite_query: str) -> str:
+        await asyncio.sleep(latency_seconds)
+        return await tool(sqlite_query)
+
+    return async_fetch_sales_data_using_sqlite_query
+
+
+def script(run: int, slow_call: bool) -> list[ScriptedTurn]:
+    """One turn whose step calls the sales query once per region, with a different year filter on every run."""
+    year = 2000 - run
+    calls = [
+        ScriptedFunctionCall(SALES_QUERY_FUNCTION, {"sqlite_query": REGION_QUERY.format(region=region, year=year)})
+        for region in REGIONS
+    ]
+    if slow_call:
+        calls.append(ScriptedFunctionCall(SALES_QUERY_FUNCTION, {"sqlite_query": SLOW_QUERY.format(year=year)}))
+    return [ScriptedTurn(".*", "Revenue by region: {tool_output}", calls)]
+
+
+async def run_case(
+    label: str, agent: Agent, functions: AsyncFunctionTool, dispatcher: Optional[ToolDispatcher], args, offset: int
+) -> None:
+    client = main.agents_client
+    run_seconds = []
+    for run in range(args.runs):
+        client.script = script(offset + run, args.slow_call)
+        thread = await client.threads.create()
+        handler = StreamEventHandler(
+            functions=functions,
+            agent_client=client,
+            utilities=main.utilities,
+            renderer=TokenRenderer(NullSink()),
+            dispatcher=dispatcher,
+        )
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            await main.post_message(
+                thread_id=thread.id, content="Revenue by region", agent=agent, thread=thread, event_handler=handler
+            )
+        run_seconds.append(time.perf_counter() - start)
+        await client.threads.delete(thread.id)
+    timeouts = str(dispatcher.timeouts) if dispatcher else "-"
+    print(f"{label:<14} {statistics.median(run_seconds):>9.2f} {max(run_seconds):>9.2f} {timeouts:>9}")
+
+
+async def run() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=Config.TOOL_CALL_CONCURRENCY)
+    parser.add_argument("--tool-timeout", type=float, default=Config.TOOL_CALL_TIMEOUT_SECONDS)
+    parser.add_argument("--query-latency", type=float, default=0.2, help="seconds of emulated database round trip")
+    parser.add_argument("--slow-call", action="store_true", help="add a query to each step that runs past the timeout")
+    args = parser.parse_args()
+
+    client = main.agents_client
+    # Every question must run on the emulator, rather than replaying an earlier answer from the answer cache.
+    main.answer_cache = None
+    client.request_latency_seconds = 0.02
+    client.first_token_latency_seconds = 0.05
+    client.tokens_per_second = 0
+    # The pool must have a connection for every call the dispatcher lets through.
+    Config.SQLITE_POOL_SIZE = max(Config.SQLITE_POOL_SIZE, args.concurrency, len(REGIONS) + 1)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db_path = Path(temp_dir) / "sales.db"
+        print(f"Building a sales_data table with {args.rows:,} rows...")
+        build_database(db_path, args.rows)
+        sales_data = SalesData(main.utilities, db_path)
+        await sales_data.connect()
+        functions = AsyncFunctionTool({with_latency(sales_data, args.query_latency)})
+        toolset = AsyncToolSet()
+        toolset.add(functions)
+        agent = await client.create_agent(model=Config.API_DEPLOYMENT_NAME, instructions="", toolset=toolset)
+        client.enable_auto_function_calls(tools=toolset)
+
+        calls = len(REGIONS) + (1 if args.slow_call else 0)
+        print(
+            f"{args.runs} runs of {calls} function calls in one step, {args.query_latency * 1000:g} ms database round "
+            f"trip, tool timeout {args.tool_timeout:g} s, {os.cpu_count()} CPUs"
+        )
+        print(f"{'function calls':<14} {'run p50 s':>9} {'run max s':>9} {'timeouts':>9}")
+        try:
+            sequential = ToolDispatcher(functions, max_concurrency=1, timeout_seconds=args.tool_timeout)
+            await run_case("one at a time", agent, functions, sequential, args, offset=0)
+            await run_case("auto", agent, functions, None, args, offset=args.runs)
+            dispatcher = ToolDispatcher(functions, max_concurrency=args.concurrency, timeout_seconds=args.tool_timeout)
+            await run_case("dispatcher", agent, functions, dispatcher, args, offset=args.runs * 2)
+        finally:
+            await sales_data.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(run())
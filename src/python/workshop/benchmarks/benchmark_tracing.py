@@ -0,0 +1,71 @@
+"""
+Measure the overhead tracing adds to a traced tool call, with tracing off and with each exporter.
+
+Calls a trivial coroutine wrapped in @traced with a nested span, the same shape as a sales data tool and its SQL span,
+so the time measured is almost all tracing. With tracing off, the wrapper checks for an exporter and calls straight
+through.
+
+Usage:
+    python benchmarks/benchmark_tracing.py --calls 100000
+"""
+
+import argparse
+import asyncio
+import io
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+# The benchmark never talks to the agent service, but config.py requires the variable.
+os.environ.setdefault("PROJECT_ENDPOINT", "http://localhost")
+
+from tracing import ConsoleExporter, JsonLinesExporter, SpanExporter, traced, tracer
+
+
+@traced("tool")
+async def tool(query: str) -> str:
+    with tracer.span("sql", query=query) as span:
+        span.set_attribute("rows", 1)
+        return query
+
+
+async def untraced_tool(query: str) -> str:
+    return query
+
+
+async def time_calls(func, calls: int) -> float:
+    start = time.perf_counter()
+    for _ in range(calls):
+        await func("SELECT 1")
+    return time.perf_counter() - start
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=100_000)
+    args = parser.parse_args()
+
+    baseline = await time_calls(untraced_tool, args.calls)
+    print(f"{args.calls:,} calls, 2 spans each")
+    print(f"{'tracing':<10} {'us per call':>12} {'overhead us':>12}")
+    print(f"{'none':<10} {baseline / args.calls * 1e6:>12.2f} {'-':>12}")
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        exporters: list[tuple[str, SpanExporter | None]] = [
+            ("off", None),
+            ("jsonl", JsonLinesExporter(Path(temp_dir) / "traces.jsonl")),
+            ("console", ConsoleExporter(io.StringIO())),
+        ]
+        for label, exporter in exporters:
+            tracer.exporter = exporter
+            seconds = await time_calls(tool, args.calls)
+            tracer.shutdown()
+            tracer.exporter = None
+            print(f"{label:<10} {seconds / args.calls * 1e6:>12.2f} {(seconds - baseline) / args.calls * 1e6:>12.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,111 @@
+"""
+Compare prompt tokens and run time across a long conversation with and without adaptive thread truncation, against
+the local Agents service emulator.
+
+The same conversation is run on a new thread with each policy. Sending the whole thread makes prompt tokens grow with
+every turn. With adaptive truncation, a run over the target shrinks the window of last messages the next run is sent.
+The emulator counts one prompt token per word and processes the prompt at --prompt-tokens-per-second before the first
+token, so prompt size shows up in run time.
+
+Usage:
+    python benchmarks/benchmark_truncation.py --turns 30 --target-prompt-tokens 2000
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+# Run against the emulator. The endpoint is never contacted.
+os.environ["AGENTS_EMULATOR"] = "true"
+os.environ.setdefault("PROJECT_ENDPOINT", "http://localhost")
+os.environ.setdefault("MODEL_DEPLOYMENT_NAME", "emulated")
+
+from azure.ai.agents.models import Agent
+
+import main
+from agents_emulator import ScriptedTurn
+from config import Config
+from run_telemetry import AdaptiveTruncation, RunRecord, RunTelemetry
+from stream_event_handler import StreamEventHandler
+from token_renderer import NullSink, TokenRenderer
+
+REPLY_WORDS = "Revenue in Europe grew fastest while North America stayed the largest region overall".split()
+
+
+async def run_conversation(agent: Agent, turns: int, target_prompt_tokens: int, min_messages: int) -> list[RunRecord]:
+    main.run_telemetry = RunTelemetry()
+    main.truncation_policy = AdaptiveTruncation(
+        main.run_telemetry, target_prompt_tokens=target_prompt_tokens, target_run_seconds=0, min_messages=min_messages
+    )
+    records = []
+    thread = await main.agents_client.threads.create()
+    for turn in range(turns):
+        handler = StreamEventHandler(
+            functions=main.functions,
+            agent_client=main.agents_client,
+            utilities=main.utilities,
+            renderer=TokenRenderer(NullSink()),
+        )
+        with contextlib.redirect_stdout(io.StringIO()):
+            await main.post_message(
+                thread_id=thread.id,
+                content=f"Question {turn}: how did revenue change by region?",
+                agent=agent,
+                thread=thread,
+                event_handler=handler,
+            )
+        records.append(main.run_telemetry.runs(thread.id)[-1])
+    return records
+
+
+def summarize(label: str, records: list[RunRecord]) -> None:
+    prompts = [record.prompt_tokens for record in records]
+    run_seconds = [record.run_seconds for record in records]
+    print(
+        f"{label:<10} {prompts[len(prompts) // 2]:>11,} {prompts[-1]:>12,} {sum(prompts):>13,} "
+        f"{sum(run_seconds) / len(run_seconds):>11.2f} {run_seconds[-1]:>11.2f}"
+    )
+
+
+async def run() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=30)
+    parser.add_argument("--reply-words", type=int, default=150, help="words in each reply")
+    parser.add_argument("--instruction-words", type=int, default=500)
+    parser.add_argument("--target-prompt-tokens", type=int, default=2000)
+    parser.add_argument("--min-messages", type=int, default=Config.TRUNCATION_MIN_MESSAGES)
+    parser.add_argument("--prompt-tokens-per-second", type=float, default=5000)
+    args = parser.parse_args()
+
+    client = main.agents_client
+    # Every question must run on the emulator, rather than replaying an earlier answer from the answer cache.
+    main.answer_cache = None
+    client.request_latency_seconds = 0
+    client.first_token_latency_seconds = 0.05
+    client.tokens_per_second = 0
+    client.prompt_tokens_per_second = args.prompt_tokens_per_second
+    reply = " ".join(REPLY_WORDS[i % len(REPLY_WORDS)] for i in range(args.reply_words))
+    client.script = [ScriptedTurn(".*", reply)]
+    agent = await client.create_agent(
+        model=Config.API_DEPLOYMENT_NAME, instructions=" ".join(["instruction"] * args.instruction_words)
+    )
+
+    print(
+        f"{args.turns} turns, {args.reply_words}-word replies, {args.instruction_words}-word instructions, "
+        f"target {args.target_prompt_tokens:,} prompt tokens"
+    )
+    print(
+        f"{'thread':<10} {'mid prompt':>11} {'last prompt':>12} {'total prompt':>13} {'mean run s':>11} "
+        f"{'last run s':>11}"
+    )
+    summarize("whole", await run_conversation(agent, args.turns, 0, args.min_messages))
+    summarize("adaptive", await run_conversation(agent, args.turns, args.target_prompt_tokens, args.min_messages))
+
+
+if __name__ == "__main__":
+    asyncio.run(run())
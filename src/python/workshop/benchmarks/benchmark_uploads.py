@@ -0,0 +1,102 @@
+"""
+Time creating the file search vector store on a cold start and a warm start, against the local Agents service emulator.
+
+The emulator charges for upload bandwidth and vector store indexing, so the timings reflect what each start has to
+send. Compares:
+
+    sequential       the previous behaviour: upload every file one at a time, then create the vector store
+    cold start       empty upload manifest: files upload concurrently, then the vector store is created
+    warm start       a new process with the manifest from the cold start: the vector store is reused
+    one file changed one file's content changes: only it is uploaded and a new vector store is created
+
+The tents data sheet is used along with generated files to make up the file set.
+
+Usage:
+    python benchmarks/benchmark_uploads.py --files 4 --file-size-mb 2 --upload-mb-per-second 10
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+# The benchmark never talks to the agent service, but config.py requires the variable.
+os.environ.setdefault("PROJECT_ENDPOINT", "http://localhost")
+
+from agents_emulator import EmulatedAgentsClient
+from config import Config
+from utilities import Utilities
+
+VECTOR_STORE_NAME = "Contoso Product Information Vector Store"
+
+
+async def sequential(client: EmulatedAgentsClient, utilities: Utilities, files: list[str]) -> None:
+    file_ids = []
+    for file in files:
+        file_info = await client.files.upload(file_path=str(utilities.shared_files_path / file), purpose="assistants")
+        file_ids.append(file_info.id)
+    await client.vector_stores.create_and_poll(file_ids=file_ids, name=VECTOR_STORE_NAME)
+
+
+async def timed(label: str, client: EmulatedAgentsClient, run) -> None:
+    uploads_before = len(client._files)
+    stores_before = len(client._vector_stores)
+    start = time.perf_counter()
+    # Keep the upload progress messages out of the table.
+    with contextlib.redirect_stdout(io.StringIO()):
+        await run()
+    elapsed = time.perf_counter() - start
+    print(
+        f"{label:<17} {elapsed:>8.2f} {len(client._files) - uploads_before:>8} "
+        f"{len(client._vector_stores) - stores_before:>14}"
+    )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=4, help="generated files added to the data sheet")
+    parser.add_argument("--file-size-mb", type=float, default=2.0)
+    parser.add_argument("--upload-mb-per-second", type=float, default=10.0)
+    parser.add_argument("--indexing-seconds", type=float, default=2.0, help="emulated vector store indexing time")
+    parser.add_argument("--request-latency", type=float, default=Config.AGENTS_EMULATOR_REQUEST_LATENCY_SECONDS)
+    args = parser.parse_args()
+
+    client = EmulatedAgentsClient(
+        request_latency_seconds=args.request_latency,
+        upload_bytes_per_second=args.upload_mb_per_second * 1024 * 1024,
+        vector_store_indexing_seconds=args.indexing_seconds,
+    )
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        Config.UPLOAD_MANIFEST_FILE = str(Path(temp_dir) / "upload_manifest.json")
+        files = [Config.TENTS_DATA_SHEET_FILE]
+        for index in range(args.files):
+            path = Path(temp_dir) / f"product-notes-{index}.bin"
+            path.write_bytes(os.urandom(int(args.file_size_mb * 1024 * 1024)))
+            # An absolute path stays as it is when joined to the shared folder.
+            files.append(str(path))
+
+        print(
+            f"{len(files)} files, {args.upload_mb_per_second:g} MB/s upload, "
+            f"{args.indexing_seconds:g} s indexing, {args.request_latency * 1000:g} ms per request"
+        )
+        print(f"{'start':<17} {'seconds':>8} {'uploads':>8} {'vector stores':>14}")
+
+        await timed("sequential", client, lambda: sequential(client, Utilities(), files))
+        await timed("cold start", client, lambda: Utilities().create_vector_store(client, files, VECTOR_STORE_NAME))
+        await timed("warm start", client, lambda: Utilities().create_vector_store(client, files, VECTOR_STORE_NAME))
+
+        Path(files[-1]).write_bytes(os.urandom(int(args.file_size_mb * 1024 * 1024)))
+        await timed(
+            "one file changed", client, lambda: Utilities().create_vector_store(client, files, VECTOR_STORE_NAME)
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
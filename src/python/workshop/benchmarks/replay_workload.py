@@ -0,0 +1,168 @@
+"""
+Replay a captured SQL workload against a sales database and report query latency.
+
+The workload is a JSON Lines file written by SalesData when WORKLOAD_LOG is set, or the canned corpus shipped in
+benchmarks/workloads. Every query goes through SalesData.run_query, so the pool, plan guard, row budgets and
+encoder are all measured. The query cache is disabled unless --cache is given.
+
+Save a baseline from a known-good build, then compare later builds with it. The run exits with status 1 when a
+latency percentile or the throughput regresses by more than --max-regression.
+
+Usage:
+    python benchmarks/replay_workload.py --db ../../shared/database/contoso-sales.db --save-baseline baseline.json
+    python benchmarks/replay_workload.py --db new-build.db --workload queries.jsonl --concurrency 8 \\
+        --baseline baseline.json
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import statistics
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+# The replay never talks to the agent service, but config.py requires the variable.
+os.environ.setdefault("PROJECT_ENDPOINT", "http://localhost")
+
+from config import Config
+from sales_data import SalesData
+from utilities import Utilities
+from workload_log import read_workload
+
+CANNED_WORKLOAD = Path(__file__).resolve().parent / "workloads/canned_queries.jsonl"
+PERCENTILES = {"p50": 50, "p95": 95, "p99": 99}
+
+
+def percentile(sorted_values: list[float], percent: int) -> float:
+    if len(sorted_values) == 1:
+        return sorted_values[0]
+    return statistics.quantiles(sorted_values, n=100, method="inclusive")[percent - 1]
+
+
+async def replay(
+    sales_data: SalesData, queries: list[str], concurrency: int
+) -> tuple[list[tuple[str, float, str]], float]:
+    """Run the queries with the given concurrency. Returns (query, latency ms, outcome) per query and the duration."""
+    queue: asyncio.Queue[str] = asyncio.Queue()
+    for query in queries:
+        queue.put_nowait(query)
+    timings: list[tuple[str, float, str]] = []
+
+    async def worker() -> None:
+        while not queue.empty():
+            query = queue.get_nowait()
+            start = time.perf_counter()
+            result = await sales_data.run_query(query)
+            timings.append((query, (time.perf_counter() - start) * 1000, result.outcome))
+
+    start = time.perf_counter()
+    # run_query prints cache hits and plan warnings; keep that out of the timings.
+    with contextlib.redirect_stdout(io.StringIO()):
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return timings, time.perf_counter() - start
+
+
+def summarize(timings: list[tuple[str, float, str]], elapsed: float) -> dict:
+    latencies = sorted(latency for _, latency, _ in timings)
+    by_query: dict[str, list[float]] = {}
+    for query, latency, _ in timings:
+        by_query.setdefault(query, []).append(latency)
+    return {
+        "queries": len(timings),
+        "throughput_qps": len(timings) / elapsed,
+        **{name: percentile(latencies, percent) for name, percent in PERCENTILES.items()},
+        "outcomes": dict(Counter(outcome for _, _, outcome in timings)),
+        "query_p50": {query: statistics.median(values) for query, values in by_query.items()},
+    }
+
+
+def print_summary(summary: dict) -> None:
+    print(f"Queries:    {summary['queries']}")
+    print(f"Outcomes:   {', '.join(f'{outcome} {count}' for outcome, count in sorted(summary['outcomes'].items()))}")
+    print(f"Throughput: {summary['throughput_qps']:.1f} queries/s")
+    print("Latency:    " + ", ".join(f"{name} {summary[name]:.2f} ms" for name in PERCENTILES))
+    print("Slowest queries by median latency:")
+    slowest = sorted(summary["query_p50"].items(), key=lambda item: item[1], reverse=True)[:5]
+    for query, latency in slowest:
+        print(f"  {latency:9.2f} ms  {query[:100]}")
+
+
+def compare(summary: dict, baseline: dict, max_regression: float) -> bool:
+    """Print the change against the baseline and return whether anything regressed past the threshold."""
+    print(f"\nAgainst the baseline (regression threshold {max_regression:.0%}):")
+    regressed = False
+    for name in PERCENTILES:
+        change = summary[name] / baseline[name] - 1 if baseline[name] else 0.0
+        flag = change > max_regression
+        regressed |= flag
+        marker = "  REGRESSED" if flag else ""
+        print(f"  {name:<11} {baseline[name]:9.2f} -> {summary[name]:9.2f} ms  {change:+7.1%}{marker}")
+
+    change = summary["throughput_qps"] / baseline["throughput_qps"] - 1
+    flag = change < -max_regression
+    regressed |= flag
+    marker = "  REGRESSED" if flag else ""
+    print(
+        f"  {'throughput':<11} {baseline['throughput_qps']:9.1f} -> {summary['throughput_qps']:9.1f} q/s "
+        f"{change:+7.1%}{marker}"
+    )
+
+    # Individual queries only flag; small per-query medians are too noisy to fail the run on.
+    for query, latency in summary["query_p50"].items():
+        before = baseline.get("query_p50", {}).get(query)
+        if before and latency / before - 1 > max_regression:
+            print(f"  query p50   {before:9.2f} -> {latency:9.2f} ms  {latency / before - 1:+7.1%}  {query[:80]}")
+    return regressed
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", type=Path, default=Utilities().shared_files_path / "database/contoso-sales.db")
+    parser.add_argument("--workload", type=Path, default=CANNED_WORKLOAD)
+    parser.add_argument("--concurrency", type=int, default=Config.SQLITE_POOL_SIZE)
+    parser.add_argument("--repeat", type=int, default=3, help="replay the workload this many times")
+    parser.add_argument("--warmup", type=int, default=1, help="untimed replays first, to warm the page cache")
+    parser.add_argument("--cache", action="store_true", help="keep the query cache enabled")
+    parser.add_argument("--baseline", type=Path, help="compare with this baseline")
+    parser.add_argument("--save-baseline", type=Path, help="write the results as a baseline")
+    parser.add_argument("--max-regression", type=float, default=0.2)
+    args = parser.parse_args()
+
+    queries = [record.query for record in read_workload(args.workload)]
+    if not queries:
+        raise SystemExit(f"No queries in {args.workload}")
+
+    sales_data = SalesData(Utilities(), db_path=args.db)
+    if not args.cache:
+        sales_data.query_cache.max_entries = 0
+    await sales_data.connect()
+    try:
+        if args.warmup:
+            await replay(sales_data, queries * args.warmup, args.concurrency)
+        timings, elapsed = await replay(sales_data, queries * args.repeat, args.concurrency)
+    finally:
+        await sales_data.close()
+
+    print(f"Database: {args.db}")
+    print(f"Workload: {args.workload} ({len(queries)} queries x {args.repeat}, concurrency {args.concurrency})")
+    summary = summarize(timings, elapsed)
+    print_summary(summary)
+
+    if args.save_baseline:
+        args.save_baseline.write_text(json.dumps(summary, indent=2), encoding="utf-8")
+        print(f"\nBaseline saved to {args.save_baseline}")
+
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+        if compare(summary, baseline, args.max_regression):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
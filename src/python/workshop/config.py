@@ -18,3 +18,114 @@ class Config:
     # Set the temperature and top_p low to get more deterministic results.
     TEMPERATURE = 0.1
     TOP_P = 0.1
+    # Cache results of repeated SQL queries. The cache is cleared if the database file changes.
+    QUERY_CACHE_MAX_ENTRIES = 128
+    QUERY_CACHE_TTL_SECONDS = 300
+    # Read-only SQLite connections. Each runs queries on its own thread, so independent queries run in parallel.
+    SQLITE_POOL_SIZE = 4
+    SQLITE_POOL_HEALTH_CHECK_SECONDS = 30
+    # Persist the schema snapshot next to the database so warm starts skip the schema queries.
+    SCHEMA_SNAPSHOT_CACHE = True
+    # Upper bounds on what a single query can return to the model, whatever LIMIT the model used.
+    # At roughly 4 bytes per token the byte budget is a quarter of MAX_PROMPT_TOKENS.
+    MAX_QUERY_ROWS = 100
+    MAX_QUERY_RESULT_BYTES = MAX_PROMPT_TOKENS
+    QUERY_FETCH_CHUNK_ROWS = 256
+    # How query results are written for the model: "split_json" (pandas orient="split"), "csv", or "columnar_json"
+    # with each repeated string listed once per column. The agent's instructions describe the encoding, so each
+    # encoding gets its own agent. RESULT_FLOAT_DECIMALS rounds floats in any encoding; None keeps full precision.
+    RESULT_ENCODING = "split_json"
+    RESULT_FLOAT_DECIMALS = None
+    # Guard against runaway LLM-generated SQL. Queries still running after the timeout are interrupted.
+    # The plan guard estimates rows visited from EXPLAIN QUERY PLAN: "reject", "warn" or "off".
+    QUERY_TIMEOUT_SECONDS = 5
+    QUERY_PROGRESS_HANDLER_STEPS = 10000
+    QUERY_PLAN_GUARD = "reject"
+    QUERY_PLAN_MAX_ESTIMATED_ROWS = 50_000_000
+    # Sales data split across SQLite files, such as one per year or per region: a comma-separated list of files or
+    # glob patterns relative to the shared folder, such as "database/shards/sales-*.db". Every shard needs the same
+    # sales_data table, and the model sees one logical database. With SHARD_FANOUT, aggregate queries run on every
+    # shard at once in up to SHARD_WORKERS processes and their partial results are merged. At most 10 shards.
+    SALES_SHARDS = os.getenv("SALES_SHARDS", "")
+    SHARD_FANOUT = True
+    SHARD_WORKERS = os.cpu_count() or 1
+    # export_sales_query streams a whole query result to a file under shared/files, a chunk of rows at a time, with
+    # none of the row and byte caps on results for the model. Exports get a longer statement timeout.
+    EXPORT_CHUNK_ROWS = 16384
+    EXPORT_PREVIEW_ROWS = 5
+    EXPORT_TIMEOUT_SECONDS = 120
+    # Use the local Agents service emulator instead of Foundry, for offline and load testing.
+    # AGENTS_EMULATOR_SCRIPT optionally points at a JSON script of replies, see agents_emulator.load_script.
+    AGENTS_EMULATOR = os.getenv("AGENTS_EMULATOR", "false").lower() == "true"
+    AGENTS_EMULATOR_SCRIPT = os.getenv("AGENTS_EMULATOR_SCRIPT")
+    AGENTS_EMULATOR_REQUEST_LATENCY_SECONDS = 0.05
+    AGENTS_EMULATOR_FIRST_TOKEN_SECONDS = 0.5
+    AGENTS_EMULATOR_TOKENS_PER_SECOND = 50
+    # Append every SQL query the model runs to this JSON Lines file, for replay with benchmarks/replay_workload.py.
+    WORKLOAD_LOG = os.getenv("WORKLOAD_LOG")
+    # Multi-session server (server.py). Sessions stream through their own token renderer, so when a client falls
+    # behind only that session's run stream waits.
+    SERVER_HOST = "127.0.0.1"
+    SERVER_PORT = 8080
+    SERVER_MAX_SESSIONS = 256
+    # Sessions with no message for this long are ended and their threads deleted.
+    SERVER_SESSION_IDLE_SECONDS = 30 * 60
+    # Streamed tokens are coalesced and written when this many characters are buffered or the window has passed.
+    TOKEN_RENDER_WINDOW_SECONDS = 0.05
+    TOKEN_RENDER_MAX_CHARS = 512
+    # Files the agent generates, such as charts, download in the background with at most this many at once.
+    FILE_DOWNLOAD_CONCURRENCY = 4
+    # Uploaded files and vector stores are recorded here, under the shared folder, by content hash. Unchanged files
+    # are not uploaded again and a vector store with the same files is reused; cleanup keeps the recorded files.
+    UPLOAD_MANIFEST_FILE = "files/upload_manifest.json"
+    FILE_UPLOAD_CONCURRENCY = 4
+    # Reuse the agent created earlier with the same instructions, model, temperature and tools rather than creating
+    # one on every start. Registered agents beyond the most recently used few, or idle too long, are deleted.
+    AGENT_REUSE = True
+    AGENT_REGISTRY_FILE = "files/agent_registry.json"
+    AGENT_REGISTRY_KEEP = 4
+    AGENT_REGISTRY_MAX_IDLE_DAYS = 7
+    # Empty agent threads kept ready so new sessions start without waiting to create one. Returned threads are
+    # deleted in concurrent batches, when this many are pending or after the interval.
+    THREAD_POOL_SIZE = 4
+    THREAD_POOL_DELETE_BATCH_SIZE = 16
+    THREAD_POOL_DELETE_INTERVAL_SECONDS = 5
+    # The schema in the instructions lists a column's distinct values in full up to this many. Beyond that it gives
+    # the count and the most common values, and the model looks up the rest with the lookup_distinct_values tool.
+    SCHEMA_ENUM_MAX_VALUES = 100
+    SCHEMA_TOP_VALUES = 20
+    LOOKUP_DISTINCT_MAX_VALUES = 50
+    # Token usage, time to first token and run time of every run, optionally appended to this JSON Lines file.
+    RUN_TELEMETRY_LOG = os.getenv("RUN_TELEMETRY_LOG")
+    # Adaptive truncation sends only a thread's last messages once runs go over these targets, resizing the window
+    # from each run's usage. A target of 0 is ignored; with both at 0, the default, every run is sent the whole
+    # thread. A run's prompt tokens are summed over all its model calls, so a turn with tool calls counts several
+    # times; set the token target well above a single call's prompt.
+    TRUNCATION_TARGET_PROMPT_TOKENS = 0
+    TRUNCATION_TARGET_RUN_SECONDS = 0
+    TRUNCATION_MIN_MESSAGES = 4
+    # Trace spans across post_message, runs, run steps, tools, SQL and file transfers: "off", "console", or "jsonl"
+    # to append them to TRACE_FILE.
+    TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "off").lower()
+    TRACE_FILE = os.getenv("TRACE_FILE", "traces.jsonl")
+    # Function calls the model makes in one run step run concurrently, at most this many at once across all runs,
+    # each stopped after the timeout. Set TOOL_DISPATCHER to False to use the client's auto function calls instead.
+    TOOL_DISPATCHER = True
+    TOOL_CALL_CONCURRENCY = SQLITE_POOL_SIZE
+    TOOL_CALL_TIMEOUT_SECONDS = QUERY_TIMEOUT_SECONDS * 2
+    # Functions allowed to run longer than TOOL_CALL_TIMEOUT_SECONDS, by name.
+    TOOL_CALL_TIMEOUT_OVERRIDES = {"export_sales_query": EXPORT_TIMEOUT_SECONDS + 10}
+    # Replay the earlier answer when the same agent is asked the same question again, ignoring case, punctuation and
+    # filler words, while the database file is unchanged. Answers with generated files are not cached. A question
+    # that depends on earlier turns, such as "and for Europe?", may be replayed out of context, so it is off by
+    # default. Below 1.0, ANSWER_CACHE_SIMILARITY also replays answers to nearly identical questions (character
+    # trigram similarity), which can be different questions: "winter sports" and "water sports" score 0.84.
+    ANSWER_CACHE = False
+    ANSWER_CACHE_MAX_ENTRIES = 256
+    ANSWER_CACHE_TTL_SECONDS = 3600
+    ANSWER_CACHE_SIMILARITY = 1.0
+    # aggregate_sales can total and count sales_data from a columnar copy in NumPy arrays, loaded in the background
+    # on connect and again whenever the database file changes, running SQL until it is ready. "off", the default,
+    # always runs SQL; "memory" keeps the copy in memory; "mmap" also saves the columns next to the database and
+    # memory-maps them on later starts. benchmarks/benchmark_columnar.py shows what it saves on a given table.
+    COLUMNAR_ENGINE = "off"
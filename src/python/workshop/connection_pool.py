@@ -0,0 +1,181 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional, Sequence
+
+import aiosqlite
+
+logger = logging.getLogger(__name__)
+
+
+class QueryDeadline:
+    """Per-connection deadline checked by SQLite's progress handler from the connection's worker thread."""
+
+    __slots__ = ("expires_at",)
+
+    def __init__(self) -> None:
+        self.expires_at: Optional[float] = None
+
+    def exceeded(self) -> int:
+        """Progress handler callback. A non-zero return makes SQLite interrupt the running statement."""
+        return 1 if self.expires_at is not None and time.monotonic() > self.expires_at else 0
+
+
+class ConnectionPool:
+    """A fixed-size pool of read-only aiosqlite connections.
+
+    aiosqlite runs every query for a connection on that connection's worker thread, so a single connection
+    serializes all callers. Each pooled connection has its own worker thread, letting independent queries run
+    in parallel.
+    """
+
+    def __init__(
+        self,
+        db_uri: str,
+        size: int = 4,
+        health_check_seconds: float = 30.0,
+        progress_steps: int = 10000,
+        setup_statements: Sequence[str] = (),
+    ) -> None:
+        self.db_uri = db_uri
+        self.size = size
+        self.health_check_seconds = health_check_seconds
+        self.progress_steps = progress_steps
+        # Run on every new connection, such as ATTACH and CREATE TEMP VIEW for sharded data.
+        self.setup_statements = list(setup_statements)
+        self._idle: Optional[asyncio.Queue[tuple[aiosqlite.Connection, float]]] = None
+        self._connections: dict[aiosqlite.Connection, QueryDeadline] = {}
+        self._recovering: set[asyncio.Task] = set()
+
+    @property
+    def is_open(self) -> bool:
+        """Return True if the pool has been opened and not closed."""
+        return self._idle is not None
+
+    async def _new_connection(self) -> aiosqlite.Connection:
+        conn = await aiosqlite.connect(self.db_uri, uri=True)
+        try:
+            for statement in self.setup_statements:
+                await conn.execute(statement)
+        except aiosqlite.Error:
+            await conn.close()
+            raise
+        deadline = QueryDeadline()
+        # Checked every progress_steps virtual machine instructions, so the overhead is negligible.
+        await conn.set_progress_handler(deadline.exceeded, self.progress_steps)
+        self._connections[conn] = deadline
+        return conn
+
+    async def open(self) -> None:
+        """Open all connections in the pool."""
+        if self._idle is not None:
+            return
+        idle: asyncio.Queue[tuple[aiosqlite.Connection, float]] = asyncio.Queue()
+        try:
+            for conn in await asyncio.gather(*(self._new_connection() for _ in range(self.size))):
+                idle.put_nowait((conn, time.monotonic()))
+        except aiosqlite.Error:
+            await self._close_all()
+            raise
+        self._idle = idle
+        logger.debug("Opened connection pool with %d connections.", self.size)
+
+    async def _close_all(self) -> None:
+        connections, self._connections = self._connections, {}
+        await asyncio.gather(*(conn.close() for conn in connections), return_exceptions=True)
+
+    async def close(self) -> None:
+        """Close every connection in the pool."""
+        self._idle = None
+        for task in self._recovering:
+            task.cancel()
+        await self._close_all()
+        logger.debug("Connection pool closed.")
+
+    async def _is_healthy(self, conn: aiosqlite.Connection) -> bool:
+        try:
+            async with conn.execute("SELECT 1;") as cursor:
+                await cursor.fetchone()
+            return True
+        except (aiosqlite.Error, ValueError):
+            return False
+
+    async def _replace(self, conn: aiosqlite.Connection) -> aiosqlite.Connection:
+        logger.warning("Replacing unhealthy database connection.")
+        self._connections.pop(conn, None)
+        try:
+            await conn.close()
+        except (aiosqlite.Error, ValueError):
+            pass
+        return await self._new_connection()
+
+    @asynccontextmanager
+    async def acquire(self, timeout_seconds: Optional[float] = None) -> AsyncIterator[aiosqlite.Connection]:
+        """Borrow a connection from the pool, waiting until one is free.
+
+        With timeout_seconds set, any statement still running that long after the connection was handed out is
+        interrupted and fails with sqlite3.OperationalError("interrupted").
+        """
+        if self._idle is None:
+            raise RuntimeError("Connection pool is not open. Call open() first.")
+        idle = self._idle
+        conn, last_used = await idle.get()
+        try:
+            # Only connections that have sat idle for a while are health checked, to keep acquire cheap.
+            if time.monotonic() - last_used > self.health_check_seconds and not await self._is_healthy(conn):
+                conn = await self._replace(conn)
+        except BaseException:
+            # Return the connection marked as stale so the next borrower checks it again.
+            idle.put_nowait((conn, 0.0))
+            raise
+
+        deadline = self._connections.get(conn)
+        if deadline is not None and timeout_seconds is not None:
+            deadline.expires_at = time.monotonic() + timeout_seconds
+        try:
+            yield conn
+        except asyncio.CancelledError:
+            # A borrower cancelled mid-query, for example by a tool call timeout, leaves the statement running on
+            # the worker thread. Stop it and only hand the connection out again once the worker is free.
+            if deadline is not None:
+                deadline.expires_at = 0.0
+            await conn.interrupt()
+            task = asyncio.create_task(self._recover(conn, idle))
+            self._recovering.add(task)
+            task.add_done_callback(self._recovering.discard)
+            raise
+        except Exception:
+            # The statement has already failed or been interrupted by the deadline, so the worker is free.
+            self._release(conn, idle, deadline)
+            raise
+        self._release(conn, idle, deadline)
+
+    def _release(
+        self,
+        conn: aiosqlite.Connection,
+        idle: asyncio.Queue[tuple[aiosqlite.Connection, float]],
+        deadline: Optional[QueryDeadline],
+    ) -> None:
+        if deadline is not None:
+            deadline.expires_at = None
+        if conn in self._connections:
+            idle.put_nowait((conn, time.monotonic()))
+
+    async def _recover(
+        self, conn: aiosqlite.Connection, idle: asyncio.Queue[tuple[aiosqlite.Connection, float]]
+    ) -> None:
+        # The health check queues behind whatever statement the borrower left on the worker thread.
+        healthy = await self._is_healthy(conn)
+        deadline = self._connections.get(conn)
+        if deadline is not None:
+            deadline.expires_at = None
+        if conn not in self._connections or self._idle is not idle:
+            return
+        if not healthy:
+            try:
+                conn = await self._replace(conn)
+            except aiosqlite.Error:
+                logger.exception("Unable to replace a database connection; the pool is one connection short.")
+                return
+        idle.put_nowait((conn, time.monotonic()))
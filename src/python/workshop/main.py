@@ -1,5 +1,8 @@
 import asyncio
 import logging
+import time
+from dataclasses import asdict
+from pathlib import Path
 
 from azure.ai.agents.aio import AgentsClient
 from azure.ai.agents.models import (
@@ -9,14 +12,26 @@ from azure.ai.agents.models import (
     AsyncToolSet,
     CodeInterpreterTool,
     FileSearchTool,
+    FunctionToolDefinition,
+    RunStatus,
+    TruncationObject,
 )
 from azure.identity.aio import DefaultAzureCredential
 
 
+from agent_registry import AgentRegistry, agent_fingerprint
+from agents_emulator import EmulatedAgentsClient, load_script
+from answer_cache import AnswerCache
 from config import Config
+from result_encoder import describe_encoding
+from run_telemetry import MESSAGES_PER_TURN, AdaptiveTruncation, RunRecord, RunTelemetry
 from sales_data import SalesData
+from sales_shards import is_spawned_process
 from stream_event_handler import StreamEventHandler
 from terminal_colors import TerminalColors as tc
+from thread_pool import ThreadPool
+from tool_dispatcher import ToolDispatcher
+from tracing import tracer
 from utilities import Utilities
 
 logging.basicConfig(level=logging.ERROR)
@@ -28,18 +43,65 @@ INSTRUCTIONS_FILE = None
 toolset = AsyncToolSet()
 utilities = Utilities()
 sales_data = SalesData(utilities)
-
-
-agents_client = AgentsClient(
-    credential=DefaultAzureCredential(),
-    endpoint=Config.PROJECT_ENDPOINT,
+agent_registry = AgentRegistry(utilities.shared_files_path / Config.AGENT_REGISTRY_FILE, Config.PROJECT_ENDPOINT)
+run_telemetry = RunTelemetry(Path(Config.RUN_TELEMETRY_LOG) if Config.RUN_TELEMETRY_LOG else None)
+truncation_policy = AdaptiveTruncation(
+    run_telemetry,
+    target_prompt_tokens=Config.TRUNCATION_TARGET_PROMPT_TOKENS,
+    target_run_seconds=Config.TRUNCATION_TARGET_RUN_SECONDS,
+    min_messages=Config.TRUNCATION_MIN_MESSAGES,
+)
+answer_cache = (
+    AnswerCache(
+        sales_data.db_paths,
+        max_entries=Config.ANSWER_CACHE_MAX_ENTRIES,
+        ttl_seconds=Config.ANSWER_CACHE_TTL_SECONDS,
+        similarity_threshold=Config.ANSWER_CACHE_SIMILARITY,
+    )
+    if Config.ANSWER_CACHE
+    else None
 )
+# Definition fingerprints of the agents in use, by agent ID, to key the answer cache.
+agent_fingerprints: dict[str, str] = {}
+# Housekeeping that runs after startup, such as deleting stale agents. Awaited in cleanup.
+background_tasks: set[asyncio.Task] = set()
+
+
+# Shard worker processes run this module again when main.py or server.py started them. They only run shard
+# queries, so they skip the service client and its credential.
+if is_spawned_process():
+    agents_client = None
+elif Config.AGENTS_EMULATOR:
+    agents_client = EmulatedAgentsClient(
+        script=load_script(Path(Config.AGENTS_EMULATOR_SCRIPT)) if Config.AGENTS_EMULATOR_SCRIPT else None,
+        request_latency_seconds=Config.AGENTS_EMULATOR_REQUEST_LATENCY_SECONDS,
+        first_token_latency_seconds=Config.AGENTS_EMULATOR_FIRST_TOKEN_SECONDS,
+        tokens_per_second=Config.AGENTS_EMULATOR_TOKENS_PER_SECOND,
+    )
+else:
+    agents_client = AgentsClient(
+        credential=DefaultAzureCredential(),
+        endpoint=Config.PROJECT_ENDPOINT,
+    )
+
+thread_pool = ThreadPool(agents_client)
 
 functions = AsyncFunctionTool(
     {
         sales_data.async_fetch_sales_data_using_sqlite_query,
+        sales_data.lookup_distinct_values,
+        sales_data.aggregate_sales,
+        sales_data.export_sales_query,
     }
 )
+tool_dispatcher = ToolDispatcher(functions) if Config.TOOL_DISPATCHER else None
+# Appended to the instructions when the agent has the export function. The shared instructions files are also used
+# by the C# labs, which do not.
+EXPORT_INSTRUCTIONS = (
+    "Download Requests: if the user asks to download data, call `export_sales_query` to save the full result as a "
+    "`.csv` file (or `.parquet` if requested), then give the user the file path and row count. Show only the returned "
+    "preview rows as a Markdown table, rather than presenting the whole result."
+)
 
 # INSTRUCTIONS_FILE = "instructions/function_calling.txt"
 # INSTRUCTIONS_FILE = "instructions/file_search.txt"
@@ -74,6 +136,60 @@ async def add_agent_tools():
     return font_file_info
 
 
+async def collect_stale_agents(agent: Agent) -> None:
+    deleted = await agent_registry.collect_garbage(
+        agents_client,
+        keep=Config.AGENT_REGISTRY_KEEP,
+        max_idle_days=Config.AGENT_REGISTRY_MAX_IDLE_DAYS,
+        in_use=frozenset({agent.id}),
+    )
+    if deleted:
+        utilities.log_msg_purple(f"Deleted {len(deleted)} stale agent(s).")
+
+
+def start_collecting_stale_agents(agent: Agent) -> None:
+    """Delete registered agents that are no longer needed, without holding up startup."""
+    task = asyncio.create_task(collect_stale_agents(agent))
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+
+
+async def get_or_create_agent(instructions: str) -> Agent:
+    """Reuse the registered agent with the same definition, otherwise create and register a new one."""
+    fingerprint = agent_fingerprint(
+        model=Config.API_DEPLOYMENT_NAME,
+        name=Config.AGENT_NAME,
+        instructions=instructions,
+        temperature=Config.TEMPERATURE,
+        toolset=toolset,
+    )
+    if Config.AGENT_REUSE:
+        agent = await agent_registry.get_agent(agents_client, fingerprint)
+        if agent:
+            print(f"Reusing agent, ID: {agent.id}")
+            agent_fingerprints[agent.id] = fingerprint
+            # Agents registered by other definitions may have gone stale since the last start.
+            start_collecting_stale_agents(agent)
+            return agent
+
+    print("Creating agent...")
+    agent = await agents_client.create_agent(
+        model=Config.API_DEPLOYMENT_NAME,
+        name=Config.AGENT_NAME,
+        instructions=instructions,
+        toolset=toolset,
+        temperature=Config.TEMPERATURE,
+    )
+    print(f"Created agent, ID: {agent.id}")
+    agent_fingerprints[agent.id] = fingerprint
+
+    if Config.AGENT_REUSE:
+        await agent_registry.register(fingerprint, agent)
+        # The new agent may supersede older ones.
+        start_collecting_stale_agents(agent)
+    return agent
+
+
 async def initialize() -> tuple[Agent | None, AgentThread | None]:
     """Initialize the agent with the sales data schema and instructions."""
 
@@ -95,26 +211,40 @@ async def initialize() -> tuple[Agent | None, AgentThread | None]:
         instructions = instructions.replace(
             "{database_schema_string}", database_schema_string)
 
+        # Tell the model how query results are encoded, unless they are the default split JSON
+        encoding_description = describe_encoding(Config.RESULT_ENCODING, Config.RESULT_FLOAT_DECIMALS)
+        if encoding_description:
+            instructions = f"{instructions.rstrip()}\n\n{encoding_description}\n"
+
+        function_names = {
+            definition.function.name
+            for definition in toolset.definitions
+            if isinstance(definition, FunctionToolDefinition)
+        }
+        if sales_data.export_sales_query.__name__ in function_names:
+            instructions = f"{instructions.rstrip()}\n\n{EXPORT_INSTRUCTIONS}\n"
+
         if font_file_info:
             # Replace the placeholder with the font file ID
             instructions = instructions.replace(
                 "{font_file_id}", font_file_info.id)
 
-        print("Creating agent...")
-        agent = await agents_client.create_agent(
-            model=Config.API_DEPLOYMENT_NAME,
-            name=Config.AGENT_NAME,
-            instructions=instructions,
-            toolset=toolset,
-            temperature=Config.TEMPERATURE,
+        instruction_tokens = utilities.estimate_tokens(instructions)
+        print(
+            f"Instructions: about {instruction_tokens:,} tokens, "
+            f"{instruction_tokens / Config.MAX_PROMPT_TOKENS:.0%} of MAX_PROMPT_TOKENS."
         )
-        print(f"Created agent, ID: {agent.id}")
 
-        agents_client.enable_auto_function_calls(tools=toolset)
-        print("Enabled auto function calls.")
+        agent = await get_or_create_agent(instructions)
+
+        if tool_dispatcher:
+            print(f"Function calls run on the tool dispatcher, up to {tool_dispatcher.max_concurrency} at once.")
+        else:
+            agents_client.enable_auto_function_calls(tools=toolset)
+            print("Enabled auto function calls.")
 
         print("Creating thread...")
-        thread = await agents_client.threads.create()
+        thread = await thread_pool.acquire()
         print(f"Created thread, ID: {thread.id}")
 
         return agent, thread
@@ -125,41 +255,136 @@ async def initialize() -> tuple[Agent | None, AgentThread | None]:
         return None, None
 
 
-async def cleanup(agent: Agent, thread: AgentThread) -> None:
-    """Cleanup the resources."""
+async def cleanup(agent: Agent, thread: AgentThread | None = None) -> None:
+    """Cleanup the resources. Registered agents and files in the upload manifest are kept for the next start."""
+    if background_tasks:
+        await asyncio.gather(*background_tasks, return_exceptions=True)
+    kept_file_ids = utilities.upload_manifest.file_ids()
     existing_files = await agents_client.files.list()
     for f in existing_files.data:
-        await agents_client.files.delete(f.id)
-    await agents_client.threads.delete(thread.id)
-    await agents_client.delete_agent(agent.id)
+        if f.id not in kept_file_ids:
+            await agents_client.files.delete(f.id)
+    if thread:
+        thread_pool.release(thread)
+    await thread_pool.close()
+    if not Config.AGENT_REUSE:
+        await agents_client.delete_agent(agent.id)
     await sales_data.close()
 
 
-async def post_message(thread_id: str, content: str, agent: Agent, thread: AgentThread) -> None:
-    """Post a message to the Foundry Agent Service."""
-    try:
-        await agents_client.messages.create(
-            thread_id=thread_id,
-            role="user",
-            content=content,
-        )
-
-        async with await agents_client.runs.stream(
-            thread_id=thread.id,
-            agent_id=agent.id,
-            event_handler=StreamEventHandler(
-                functions=functions, agent_client=agents_client, utilities=utilities),
-            max_completion_tokens=Config.MAX_COMPLETION_TOKENS,
-            max_prompt_tokens=Config.MAX_PROMPT_TOKENS,
-            temperature=Config.TEMPERATURE,
-            top_p=Config.TOP_P,
-            # instructions=agent.instructions,
-        ) as stream:
-            await stream.until_done()
+def record_run(
+    event_handler: StreamEventHandler,
+    thread_id: str,
+    thread_messages: int,
+    truncation_strategy: TruncationObject | None,
+    start: float,
+) -> RunRecord:
+    """Record the usage and timings of the run started at ``start``, and print them."""
+    run_seconds = time.perf_counter() - start
+    run = event_handler.run
+    usage = run.usage if run else None
+    record = RunRecord(
+        thread_id=thread_id,
+        run_id=run.id if run else None,
+        status=getattr(run.status, "value", run.status) if run else None,
+        prompt_tokens=usage.prompt_tokens if usage else None,
+        completion_tokens=usage.completion_tokens if usage else None,
+        first_token_seconds=event_handler.first_token_at - start if event_handler.first_token_at else None,
+        run_seconds=run_seconds,
+        thread_messages=thread_messages,
+        last_messages=truncation_strategy.last_messages if truncation_strategy else None,
+    )
+    run_telemetry.record(record)
+
+    summary = f"Run: {record.run_seconds:.2f} s"
+    if record.first_token_seconds is not None:
+        summary += f", first token {record.first_token_seconds:.2f} s"
+    if usage:
+        summary += f", {record.prompt_tokens:,} prompt and {record.completion_tokens:,} completion tokens"
+    if record.last_messages:
+        summary += f", last {record.last_messages} of {thread_messages} messages sent"
+    utilities.log_msg_purple(f"\n{summary}")
+    return record
+
+
+async def replay_cached_answer(thread_id: str, content: str, agent: Agent, event_handler: StreamEventHandler) -> bool:
+    """Stream the cached answer to the prompt, if there is one, and add the exchange to the thread."""
+    hit = answer_cache.get(content, agent_fingerprints.get(agent.id, agent.id)) if answer_cache else None
+    if hit is None:
+        return False
+
+    await event_handler.replay(hit.answer.deltas)
+    stats = answer_cache.stats()
+    utilities.log_msg_purple(
+        f"\nAnswer cache hit, similarity {hit.similarity:.2f}: about {hit.answer.run_seconds:.2f} s saved "
+        f"({stats['hits']} hits, {stats['misses']} misses, {stats['hit_rate']:.0%} hit rate, "
+        f"{stats['seconds_saved']:.1f} s saved in total)"
+    )
+    # Keep the thread complete, so later runs see the question and its answer.
+    await agents_client.messages.create(thread_id=thread_id, role="user", content=content)
+    await agents_client.messages.create(thread_id=thread_id, role="assistant", content=hit.answer.text)
+    run_telemetry.add_messages(thread_id, MESSAGES_PER_TURN)
+    return True
+
+
+async def post_message(
+    thread_id: str,
+    content: str,
+    agent: Agent,
+    thread: AgentThread,
+    event_handler: StreamEventHandler | None = None,
+) -> None:
+    """Post a message to the Foundry Agent Service. Streamed tokens are printed unless another handler is given.
+
+    The run's token usage and timings are recorded, and the thread is truncated to keep runs near their targets.
+    A question answered before is replayed from the answer cache without a run.
+    """
+    with tracer.span("post_message", thread_id=thread.id, agent_id=agent.id) as span:
+        try:
+            event_handler = event_handler or StreamEventHandler(
+                functions=functions, agent_client=agents_client, utilities=utilities, dispatcher=tool_dispatcher
+            )
+            if await replay_cached_answer(thread_id, content, agent, event_handler):
+                span.set_attribute("answer_cache", "hit")
+                return
+
+            await agents_client.messages.create(
+                thread_id=thread_id,
+                role="user",
+                content=content,
+            )
 
-    except Exception as e:
-        utilities.log_msg_purple(
-            f"An error occurred posting the message: {e!s}")
+            thread_messages = run_telemetry.thread_messages(thread.id)
+            truncation_strategy = truncation_policy.truncation_strategy(thread.id, thread_messages)
+            start = time.perf_counter()
+
+            with tracer.span("run") as run_span:
+                async with await agents_client.runs.stream(
+                    thread_id=thread.id,
+                    agent_id=agent.id,
+                    event_handler=event_handler,
+                    max_completion_tokens=Config.MAX_COMPLETION_TOKENS,
+                    max_prompt_tokens=Config.MAX_PROMPT_TOKENS,
+                    temperature=Config.TEMPERATURE,
+                    top_p=Config.TOP_P,
+                    truncation_strategy=truncation_strategy,
+                    # instructions=agent.instructions,
+                ) as stream:
+                    await stream.until_done()
+
+                record = record_run(event_handler, thread.id, thread_messages, truncation_strategy, start)
+                if run_span.recording:
+                    run_span.set_attributes(**asdict(record))
+
+            if answer_cache and record.status == RunStatus.COMPLETED and not event_handler.has_files:
+                answer_cache.put(
+                    content, agent_fingerprints.get(agent.id, agent.id), event_handler.reply_deltas, record.run_seconds
+                )
+
+        except Exception as e:
+            span.record_error(e)
+            utilities.log_msg_purple(
+                f"An error occurred posting the message: {e!s}")
 
 
 async def main() -> None:
@@ -187,6 +412,8 @@ async def main() -> None:
 
             await post_message(agent=agent, thread_id=thread.id, content=prompt, thread=thread)
 
+        await utilities.wait_for_downloads()
+
         if cmd == "save":
             print("The agent has not been deleted, so you can continue experimenting with it in the Azure AI Foundry.")
             print(
@@ -194,7 +421,11 @@ async def main() -> None:
             )
         else:
             await cleanup(agent, thread)
-            print("The agent resources have been cleaned up.")
+            if Config.AGENT_REUSE:
+                print(f"The agent {agent.id} has been kept for reuse on the next start.")
+                print("The other agent resources have been cleaned up.")
+            else:
+                print("The agent resources have been cleaned up.")
 
 
 if __name__ == "__main__":
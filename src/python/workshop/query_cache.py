@@ -0,0 +1,110 @@
+import re
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Sequence
+
+# String literals, quoted identifiers and comments, with a line comment's newline, are kept verbatim; everything
+# else is folded.
+QUOTED_PATTERN = re.compile(r"('(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|--[^\n]*(?:\n|$)|/\*.*?(?:\*/|$))", re.DOTALL)
+WHITESPACE_PATTERN = re.compile(r"\s+")
+# Spacing is not folded around - * and /, where it separates operators from comments: "1 - -1" is not "1 --1".
+PUNCTUATION_PATTERN = re.compile(r"\s*([(),=<>!+%|;])\s*")
+
+
+class DatabaseStamp:
+    """The mtime and size of every database file, to tell when cached results may be out of date."""
+
+    def __init__(self, db_path: Path | Sequence[Path]) -> None:
+        # Sharded data is watched on every shard file.
+        self.db_paths = [db_path] if isinstance(db_path, Path) else list(db_path)
+        self._stamp: Optional[tuple[tuple[int, int], ...]] = None
+
+    def _current(self) -> Optional[tuple[tuple[int, int], ...]]:
+        try:
+            stats = [path.stat() for path in self.db_paths]
+        except OSError:
+            return None
+        return tuple((stat.st_mtime_ns, stat.st_size) for stat in stats)
+
+    def changed(self) -> bool:
+        """Return True if a database file has changed since the last call, or on the first call."""
+        stamp = self._current()
+        if stamp == self._stamp:
+            return False
+        self._stamp = stamp
+        return True
+
+
+class QueryCache:
+    """Bounded LRU cache with TTL for SQL query results.
+
+    Entries are keyed on a normalized form of the SQL so that queries differing only in whitespace, keyword case
+    or formatting share an entry. The whole cache is dropped whenever the database file's mtime or size changes.
+    """
+
+    def __init__(self, db_path: Path | Sequence[Path], max_entries: int = 128, ttl_seconds: float = 300.0) -> None:
+        self.db_stamp = DatabaseStamp(db_path)
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, tuple[float, str]] = OrderedDict()
+
+    @staticmethod
+    def normalize(sqlite_query: str) -> str:
+        """Fold whitespace, case and punctuation spacing outside of quoted literals."""
+        parts = QUOTED_PATTERN.split(sqlite_query.strip().rstrip(";"))
+        normalized = []
+        for index, part in enumerate(parts):
+            if index % 2:
+                normalized.append(part)
+                continue
+            part = WHITESPACE_PATTERN.sub(" ", part.lower())
+            normalized.append(PUNCTUATION_PATTERN.sub(r"\1", part))
+        return "".join(normalized).strip()
+
+    def _check_db_stamp(self) -> None:
+        """Invalidate all entries if a database file has changed since they were cached."""
+        if self.db_stamp.changed():
+            self._entries.clear()
+
+    def get(self, sqlite_query: str) -> Optional[str]:
+        """Return the cached result for the query, or None on a miss."""
+        self._check_db_stamp()
+        key = self.normalize(sqlite_query)
+        entry = self._entries.get(key)
+        if entry is None or time.monotonic() - entry[0] > self.ttl_seconds:
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, sqlite_query: str, result: str) -> None:
+        """Cache a query result, evicting the least recently used entry when full."""
+        if self.max_entries <= 0:
+            return
+        self._check_db_stamp()
+        key = self.normalize(sqlite_query)
+        self._entries[key] = (time.monotonic(), result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Drop all cached entries."""
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        """Return the hit/miss counters and current size."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self._entries),
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
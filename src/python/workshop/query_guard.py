@@ -0,0 +1,149 @@
+import math
+import re
+from collections import defaultdict
+from dataclasses import dataclass, field
+
+import aiosqlite
+
+# Tables named after FROM/JOIN (or a comma in a FROM list), with an optional alias.
+TABLE_REFERENCE_PATTERN = re.compile(
+    r"(?:\bFROM\b|\bJOIN\b|,)\s+([A-Za-z_][\w]*)(?:\s+(?:AS\s+)?(?!(?:WHERE|JOIN|ON|GROUP|ORDER|LIMIT|INNER|LEFT|"
+    r"RIGHT|CROSS|NATURAL|FULL|OUTER|USING|UNION|EXCEPT|INTERSECT|HAVING|WINDOW)\b)([A-Za-z_][\w]*))?",
+    re.IGNORECASE,
+)
+# Tables in attached databases, such as shards, are reported as schema.table.
+PLAN_TABLE_PATTERN = re.compile(r"^(?:SCAN|SEARCH) ((?:\w+\.)?\w+)")
+LOOP_PREFIXES = ("SCAN", "SEARCH")
+CORRELATED_PREFIXES = ("CORRELATED",)
+MATERIALIZED_PREFIXES = ("MATERIALIZE ", "CO-ROUTINE ")
+# Parts of a UNION, INTERSECT or EXCEPT, such as the views over shards, whose rows add up.
+COMPOUND_PREFIXES = ("COMPOUND QUERY", "LEFT-MOST SUBQUERY", "UNION", "INTERSECT", "EXCEPT")
+# Grouped subqueries produce far fewer rows than they read.
+GROUPING_MARKER = "TEMP B-TREE FOR GROUP BY"
+
+
+@dataclass
+class PlanCheck:
+    """The outcome of checking a query plan against the cost threshold."""
+
+    estimated_rows: float
+    plan: list[str] = field(default_factory=list)
+    exceeded: bool = False
+
+
+class QueryPlanGuard:
+    """Estimate the cost of a query from EXPLAIN QUERY PLAN before running it.
+
+    The estimate is the number of rows SQLite would visit: full scans cost the table's row count, index searches a
+    fraction of it, and nested loops and correlated subqueries multiply. Cartesian self-joins and correlated scans
+    over sales_data stand out by orders of magnitude.
+    """
+
+    def __init__(self, max_estimated_rows: float) -> None:
+        self.max_estimated_rows = max_estimated_rows
+        self.table_rows: dict[str, int] = {}
+        self.sizes_loaded = False
+
+    async def load_table_sizes(self, conn: aiosqlite.Connection) -> None:
+        """Record an approximate row count per table. MAX(rowid) is an index lookup, not a scan.
+
+        Tables in attached databases are recorded as schema.table, and also summed by table name, which sizes views
+        that combine the same table from every shard.
+        """
+        async with conn.execute("PRAGMA database_list;") as cursor:
+            schemas = [row[1] async for row in cursor if row[1] != "temp"]
+        table_rows: dict[str, int] = defaultdict(int)
+        for schema in schemas:
+            async with conn.execute(f"SELECT name FROM \"{schema}\".sqlite_master WHERE type='table';") as cursor:
+                table_names = [row[0] async for row in cursor]
+            for table_name in table_names:
+                try:
+                    async with conn.execute(f'SELECT MAX(rowid) FROM "{schema}"."{table_name}";') as cursor:
+                        row = await cursor.fetchone()
+                except aiosqlite.Error:
+                    continue
+                rows = int(row[0] or 0) if row else 0
+                table_rows[table_name.lower()] += rows
+                if schema != "main":
+                    table_rows[f"{schema}.{table_name}".lower()] = rows
+        self.table_rows = dict(table_rows)
+        self.sizes_loaded = True
+
+    def _aliases(self, sqlite_query: str) -> dict[str, str]:
+        aliases = {}
+        for table_name, alias in TABLE_REFERENCE_PATTERN.findall(sqlite_query):
+            aliases[table_name.lower()] = table_name.lower()
+            if alias:
+                aliases[alias.lower()] = table_name.lower()
+        return aliases
+
+    def _loop_rows(self, detail: str, aliases: dict[str, str], derived_rows: dict[str, float]) -> float:
+        """Estimate the rows visited by one SCAN or SEARCH step."""
+        if detail.startswith("SCAN CONSTANT ROW"):
+            return 1
+        match = PLAN_TABLE_PATTERN.match(detail)
+        name = match.group(1).lower() if match else ""
+        name = name if name in derived_rows else aliases.get(name, name)
+        if name in derived_rows:
+            rows = derived_rows[name]
+        else:
+            # Unknown names are subqueries SQLite did not report separately, so assume the largest table.
+            rows = self.table_rows.get(name, max(self.table_rows.values(), default=1000))
+        rows = max(rows, 1)
+        if detail.startswith("SCAN"):
+            return rows
+        if "(rowid=?)" in detail:
+            return 1
+        if ">" in detail or "<" in detail:
+            return max(rows / 3, 1)
+        return max(rows / 10, math.log2(rows + 1))
+
+    def estimate(self, plan_rows: list[tuple], sqlite_query: str) -> float:
+        """Estimate the rows visited for a plan given as EXPLAIN QUERY PLAN rows."""
+        aliases = self._aliases(sqlite_query)
+        children = defaultdict(list)
+        for node_id, parent_id, _, detail in plan_rows:
+            children[parent_id].append((node_id, detail))
+        # Estimated output rows of materialized CTEs and subqueries, by name.
+        derived_rows: dict[str, float] = {}
+
+        def group_cost(parent_id: int) -> tuple[float, float]:
+            """Return the cost of a plan group and the rows produced by its loops or compound parts."""
+            loop_rows = 1.0
+            has_loops = False
+            nested_cost = 0.0
+            correlated_cost = 0.0
+            compound_rows = 0.0
+            for node_id, detail in children.get(parent_id, []):
+                if detail.startswith(LOOP_PREFIXES):
+                    has_loops = True
+                    loop_rows *= self._loop_rows(detail, aliases, derived_rows)
+                    nested_cost += group_cost(node_id)[0]
+                elif detail.startswith(CORRELATED_PREFIXES):
+                    correlated_cost += group_cost(node_id)[0]
+                else:
+                    cost, rows = group_cost(node_id)
+                    nested_cost += cost
+                    if detail.startswith(COMPOUND_PREFIXES):
+                        compound_rows += rows
+                    if detail.startswith(MATERIALIZED_PREFIXES):
+                        grouped = any(GROUPING_MARKER in d for _, d in children.get(node_id, []))
+                        derived_rows[detail.split(" ", 1)[1].lower()] = rows / 100 if grouped else rows
+            looped = loop_rows if has_loops else 0.0
+            # Correlated subqueries run once per row of the enclosing loops.
+            return looped + nested_cost + correlated_cost * max(looped, 1), looped if has_loops else compound_rows
+
+        return group_cost(0)[0]
+
+    async def check(self, conn: aiosqlite.Connection, sqlite_query: str) -> PlanCheck:
+        """Explain the query and compare its estimated cost with the threshold."""
+        if not self.sizes_loaded:
+            await self.load_table_sizes(conn)
+        async with conn.execute(f"EXPLAIN QUERY PLAN {sqlite_query}") as cursor:
+            plan_rows = list(await cursor.fetchall())
+        estimated_rows = self.estimate(plan_rows, sqlite_query)
+        return PlanCheck(
+            estimated_rows=estimated_rows,
+            plan=[row[3] for row in plan_rows],
+            exceeded=estimated_rows > self.max_estimated_rows,
+        )
@@ -0,0 +1,364 @@
+"""
+Encode SQLite query results for the model without building a pandas DataFrame.
+
+The default split JSON is byte-for-byte identical to
+``pd.DataFrame(rows, columns=columns).to_json(index=False, orient="split")``: column types are inferred the way pandas
+infers them from Python objects, floats are formatted like pandas' ujson encoder with its default
+``double_precision=10``, and strings are escaped the same way (ASCII only, ``/`` escaped).
+
+Two compact encodings spend fewer prompt tokens on the same rows: CSV, and columnar JSON that lists each repeated
+string once per column and refers to it by index. Both write whole floats without ``.0``, and every encoding can round
+floats to a number of decimals.
+"""
+
+import csv
+import io
+import json
+import math
+import re
+from typing import Any, Iterable, Iterator, Optional, Sequence
+
+DOUBLE_PRECISION = 10
+POW10 = 10.0**DOUBLE_PRECISION
+# ujson switches to printf("%.10g") outside of this range.
+EXPONENT_MAX = 1e16 - 1
+EXPONENT_MIN = 1e-15
+
+NEEDS_ESCAPE_PATTERN = re.compile(r'["\\/\x00-\x1f\x7f-\U0010ffff]')
+# json.dumps escapes DEL, ujson writes it through unchanged.
+ESCAPED_DEL_PATTERN = re.compile(r"(?<!\\)((?:\\\\)*)\\u007f")
+
+# Result encodings, selected by Config.RESULT_ENCODING.
+SPLIT_JSON = "split_json"
+CSV = "csv"
+COLUMNAR_JSON = "columnar_json"
+ENCODINGS = (SPLIT_JSON, CSV, COLUMNAR_JSON)
+# Columnar JSON only dictionary-encodes a string column when a value repeats at least this often on average.
+MIN_ROWS_PER_DICTIONARY_VALUE = 2
+
+# Column kinds, matching the dtype pandas would infer for the column.
+INT = "int"
+FLOAT = "float"
+BOOL = "bool"
+OBJECT = "object"
+
+
+def encode_float(value: float) -> str:
+    """Format a float the way pandas' ujson encoder does."""
+    if math.isnan(value) or math.isinf(value):
+        return "null"
+    if value == 0.0:
+        return "0.0"
+
+    magnitude = -value if value < 0 else value
+    # Fast path: below 1e5 the shortest repr with at most 10 decimals is exactly what ujson's rounding produces.
+    if magnitude < 1e5:
+        text = repr(value)
+        if "e" not in text and len(text) - text.index(".") - 1 <= DOUBLE_PRECISION:
+            return text
+
+    if magnitude > EXPONENT_MAX or magnitude < EXPONENT_MIN:
+        return "%.*g" % (DOUBLE_PRECISION, value)
+
+    whole = int(magnitude)
+    scaled = (magnitude - whole) * POW10
+    frac = int(scaled)
+    diff = scaled - frac
+    if diff > 0.5 or (diff == 0.5 and (frac == 0 or frac & 1)):
+        frac += 1
+    if frac >= POW10:
+        frac = 0
+        whole += 1
+
+    sign = "-" if value < 0 else ""
+    if not frac:
+        return f"{sign}{whole}.0"
+    return f"{sign}{whole}.{str(frac).zfill(DOUBLE_PRECISION).rstrip('0')}"
+
+
+def round_float(value: float, decimals: Optional[int]) -> float:
+    """Round to ``decimals`` places, or leave the value as it is for None."""
+    if decimals is None or math.isnan(value) or math.isinf(value):
+        return value
+    return round(value, decimals)
+
+
+def encode_compact_float(value: float, decimals: Optional[int] = None) -> str:
+    """Format a float like encode_float, rounded to ``decimals`` and with whole numbers written without ``.0``."""
+    value = round_float(value, decimals)
+    if value.is_integer() and -EXPONENT_MAX <= value <= EXPONENT_MAX:
+        return str(int(value))
+    return encode_float(value)
+
+
+def encode_string(value: str) -> str:
+    """Quote and escape a string the way pandas' ujson encoder does."""
+    if not NEEDS_ESCAPE_PATTERN.search(value):
+        return f'"{value}"'
+    encoded = json.dumps(value).replace("/", "\\/")
+    return ESCAPED_DEL_PATTERN.sub("\\1\x7f", encoded) if "u007f" in encoded else encoded
+
+
+def encode_value(value: Any) -> str:
+    """Encode a single value of an object column."""
+    if value is None:
+        return "null"
+    if isinstance(value, str):
+        return encode_string(value)
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, int):
+        return str(value)
+    if isinstance(value, float):
+        return encode_float(value)
+    if isinstance(value, bytes):
+        return encode_string(value.decode("utf-8", errors="replace"))
+    return encode_string(str(value))
+
+
+def infer_column_kinds(rows: Sequence[Sequence[Any]], column_count: int) -> list[str]:
+    """Infer the pandas dtype of each column from the row values."""
+    kinds = []
+    for index in range(column_count):
+        has_none = has_int = has_float = has_bool = has_other = False
+        for row in rows:
+            value = row[index]
+            if value is None:
+                has_none = True
+            elif isinstance(value, bool):
+                has_bool = True
+            elif isinstance(value, int):
+                has_int = True
+            elif isinstance(value, float):
+                has_float = True
+            else:
+                has_other = True
+                break
+
+        if has_other or (has_bool and (has_none or has_int or has_float)):
+            kinds.append(OBJECT)
+        elif has_bool:
+            kinds.append(BOOL)
+        elif has_float or (has_int and has_none):
+            kinds.append(FLOAT)
+        elif has_int:
+            kinds.append(INT)
+        else:
+            kinds.append(OBJECT)
+    return kinds
+
+
+def encode_row(
+    row: Sequence[Any], kinds: Sequence[str], string_cache: dict[str, str], decimals: Optional[int] = None
+) -> str:
+    """Encode one row as a JSON array. ``string_cache`` memoizes repeated strings across rows."""
+    values = []
+    for value, kind in zip(row, kinds):
+        if value is None:
+            values.append("null")
+        elif kind == INT:
+            values.append(str(value))
+        elif kind == FLOAT:
+            values.append(encode_float(round_float(float(value), decimals)))
+        elif kind == BOOL:
+            values.append("true" if value else "false")
+        elif isinstance(value, str):
+            encoded = string_cache.get(value)
+            if encoded is None:
+                encoded = string_cache[value] = encode_string(value)
+            values.append(encoded)
+        else:
+            values.append(encode_value(value))
+    return f"[{','.join(values)}]"
+
+
+def _split_json_head(columns: Sequence[str]) -> str:
+    return f'{{"columns":[{",".join(encode_value(column) for column in columns)}],"data":['
+
+
+def iter_split_json(columns: Sequence[str], rows: Sequence[Sequence[Any]]) -> Iterator[str]:
+    """Yield the ``orient="split"`` JSON document for the rows piece by piece."""
+    kinds = infer_column_kinds(rows, len(columns))
+    string_cache: dict[str, str] = {}
+    yield _split_json_head(columns)
+    for index, row in enumerate(rows):
+        yield f",{encode_row(row, kinds, string_cache)}" if index else encode_row(row, kinds, string_cache)
+    yield "]}"
+
+
+def encode_split_json(columns: Sequence[str], rows: Iterable[Sequence[Any]]) -> str:
+    """Return the rows encoded as pandas ``orient="split"`` JSON."""
+    return "".join(iter_split_json(columns, rows if isinstance(rows, Sequence) else list(rows)))
+
+
+def encode_split_json_within(
+    columns: Sequence[str], rows: Sequence[Sequence[Any]], max_bytes: int, decimals: Optional[int] = None
+) -> tuple[str, int]:
+    """Encode as many leading rows as fit in ``max_bytes``. Returns the JSON and the number of rows encoded."""
+    kinds = infer_column_kinds(rows, len(columns))
+    string_cache: dict[str, str] = {}
+    parts = [_split_json_head(columns)]
+    # The output is pure ASCII, so characters and bytes are the same length.
+    size = len(parts[0]) + len("]}")
+    for index, row in enumerate(rows):
+        encoded = encode_row(row, kinds, string_cache, decimals)
+        encoded = f",{encoded}" if index else encoded
+        size += len(encoded)
+        if size > max_bytes:
+            parts.append("]}")
+            return "".join(parts), index
+        parts.append(encoded)
+    parts.append("]}")
+    return "".join(parts), len(rows)
+
+
+def _csv_field(value: Any, decimals: Optional[int]) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, float):
+        return "" if math.isnan(value) or math.isinf(value) else encode_compact_float(value, decimals)
+    if isinstance(value, bytes):
+        value = value.decode("utf-8", errors="replace")
+    return str(value)
+
+
+def encode_csv_within(
+    columns: Sequence[str], rows: Sequence[Sequence[Any]], max_bytes: int, decimals: Optional[int] = None
+) -> tuple[str, int]:
+    """Encode a header line and as many leading rows as fit in ``max_bytes`` as CSV.
+
+    NULL is an empty field. Returns the CSV and the number of rows encoded.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(columns)
+    size = len(buffer.getvalue().encode("utf-8"))
+    rows_encoded = 0
+    for row in rows:
+        start = buffer.tell()
+        writer.writerow([_csv_field(value, decimals) for value in row])
+        line = buffer.getvalue()[start:]
+        size += len(line) if line.isascii() else len(line.encode("utf-8"))
+        if size > max_bytes:
+            buffer.truncate(start)
+            break
+        rows_encoded += 1
+    # Drop the last line break, so a truncation note or nothing follows the last row.
+    return buffer.getvalue()[:-1], rows_encoded
+
+
+def _is_dictionary_column(rows: Sequence[Sequence[Any]], index: int) -> bool:
+    distinct = set()
+    for row in rows:
+        value = row[index]
+        if value is not None and not isinstance(value, str):
+            return False
+        distinct.add(value)
+    return len(distinct) * MIN_ROWS_PER_DICTIONARY_VALUE <= len(rows)
+
+
+def encode_columnar_json_within(
+    columns: Sequence[str], rows: Sequence[Sequence[Any]], max_bytes: int, decimals: Optional[int] = None
+) -> tuple[str, int]:
+    """Encode as many leading rows as fit in ``max_bytes`` as columnar JSON.
+
+    ``{"columns":[...],"row_count":n,"data":{"column":[values],"text column":{"values":[...],"codes":[...]}}}``:
+    each column is an array of its values, in row order. String columns with repeated values list each distinct
+    value once, and give its index in ``values`` for every row. Returns the JSON and the number of rows encoded.
+    """
+    kinds = infer_column_kinds(rows, len(columns))
+    dictionary_columns = [_is_dictionary_column(rows, index) for index in range(len(columns))]
+    cells: list[list[str]] = [[] for _ in columns]
+    dictionaries: list[dict[Any, int]] = [{} for _ in columns]
+    dictionary_values: list[list[str]] = [[] for _ in columns]
+
+    names = [encode_value(column) for column in columns]
+    fields = [
+        f'{name}:{{"values":[],"codes":[]}}' if dictionary else f"{name}:[]"
+        for name, dictionary in zip(names, dictionary_columns)
+    ]
+    # Every value adds its text and, counted generously, a separating comma.
+    size = len(f'{{"columns":[{",".join(names)}],"row_count":{len(rows)},"data":{{{",".join(fields)}}}}}')
+    rows_encoded = 0
+    for row in rows:
+        row_size = 0
+        new_values = []
+        for index, (value, kind) in enumerate(zip(row, kinds)):
+            if dictionary_columns[index]:
+                code = dictionaries[index].get(value)
+                if code is None:
+                    code = len(dictionaries[index])
+                    encoded_value = encode_value(value)
+                    new_values.append((index, value, encoded_value))
+                    row_size += len(encoded_value) + 1
+                encoded = str(code)
+            elif value is None:
+                encoded = "null"
+            elif kind == INT:
+                encoded = str(value)
+            elif kind == FLOAT or isinstance(value, float):
+                value = float(value)
+                encoded = "null" if math.isnan(value) or math.isinf(value) else encode_compact_float(value, decimals)
+            else:
+                encoded = encode_value(value)
+            row_size += len(encoded) + 1
+            cells[index].append(encoded)
+        size += row_size
+        if size > max_bytes:
+            for column_cells in cells:
+                column_cells.pop()
+            break
+        for index, value, encoded_value in new_values:
+            dictionaries[index][value] = len(dictionary_values[index])
+            dictionary_values[index].append(encoded_value)
+        rows_encoded += 1
+
+    fields = [
+        (
+            f'{name}:{{"values":[{",".join(dictionary_values[index])}],"codes":[{",".join(cells[index])}]}}'
+            if dictionary_columns[index]
+            else f'{name}:[{",".join(cells[index])}]'
+        )
+        for index, name in enumerate(names)
+    ]
+    return f'{{"columns":[{",".join(names)}],"row_count":{rows_encoded},"data":{{{",".join(fields)}}}}}', rows_encoded
+
+
+def encode_result_within(
+    columns: Sequence[str],
+    rows: Sequence[Sequence[Any]],
+    max_bytes: int,
+    encoding: str = SPLIT_JSON,
+    decimals: Optional[int] = None,
+) -> tuple[str, int]:
+    """Encode as many leading rows as fit in ``max_bytes`` in one of ENCODINGS, with floats rounded to ``decimals``.
+
+    Returns the encoded result and the number of rows encoded.
+    """
+    if encoding == SPLIT_JSON:
+        return encode_split_json_within(columns, rows, max_bytes, decimals)
+    if encoding == CSV:
+        return encode_csv_within(columns, rows, max_bytes, decimals)
+    if encoding == COLUMNAR_JSON:
+        return encode_columnar_json_within(columns, rows, max_bytes, decimals)
+    raise ValueError(f"Unknown result encoding {encoding!r}, expected one of {', '.join(ENCODINGS)}")
+
+
+def describe_encoding(encoding: str, decimals: Optional[int] = None) -> str:
+    """Tell the model how query results are encoded, or return "" for the default split JSON at full precision."""
+    descriptions = {
+        SPLIT_JSON: "",
+        CSV: "Query results are CSV: a header line of column names, then one line per row. An empty field is NULL.",
+        COLUMNAR_JSON: (
+            'Query results are columnar JSON: "data" holds an array of values per column, in row order. A column '
+            'given as {"values": [...], "codes": [...]} stores each row\'s value as its index in "values".'
+        ),
+    }
+    if encoding not in descriptions:
+        raise ValueError(f"Unknown result encoding {encoding!r}, expected one of {', '.join(ENCODINGS)}")
+    description = descriptions[encoding]
+    if decimals is not None:
+        description = f"{description} Decimal numbers are rounded to {decimals} decimal places.".strip()
+    return description
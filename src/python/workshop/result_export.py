@@ -0,0 +1,103 @@
+"""
+Write query results straight to CSV or Parquet files, one chunk of rows at a time.
+
+The writers block, so SalesData calls them in a worker thread for each chunk it fetches from the cursor. Only the
+current chunk is held in memory, however many rows the query returns. Parquet needs pyarrow, which is optional.
+"""
+
+import csv
+from pathlib import Path
+from typing import Any, Optional, Sequence
+
+from result_encoder import BOOL, FLOAT, INT, infer_column_kinds
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+CSV_FORMAT = "csv"
+PARQUET_FORMAT = "parquet"
+EXPORT_FORMATS = (CSV_FORMAT, PARQUET_FORMAT)
+
+
+def export_format_error(export_format: str) -> Optional[str]:
+    """Return why results cannot be exported in this format, or None if they can."""
+    if export_format not in EXPORT_FORMATS:
+        return f"Unknown export format {export_format!r}. Use one of {', '.join(EXPORT_FORMATS)}."
+    if export_format == PARQUET_FORMAT and pa is None:
+        return "Parquet export is not available because pyarrow is not installed. Use csv instead."
+    return None
+
+
+class CsvExportWriter:
+    """Writes a header line, then rows as they arrive. NULL is an empty field."""
+
+    def __init__(self, path: Path, columns: Sequence[str]) -> None:
+        self.file = path.open("w", encoding="utf-8", newline="")
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(columns)
+
+    def write(self, rows: Sequence[Sequence[Any]]) -> None:
+        self.writer.writerows(rows)
+
+    def close(self) -> None:
+        self.file.close()
+
+
+class ParquetExportWriter:
+    """Writes each chunk of rows as a Parquet row group.
+
+    SQLite values carry no declared type, so column types are inferred from the first chunk the way pandas would infer
+    them: integers, floats, booleans, and text for anything else.
+    """
+
+    ARROW_TYPES = {INT: "int64", FLOAT: "float64", BOOL: "bool_"}
+
+    def __init__(self, path: Path, columns: Sequence[str]) -> None:
+        self.path = path
+        self.columns = list(columns)
+        self.kinds: Optional[list[str]] = None
+        self.schema: Any = None
+        self.writer: Any = None
+
+    def _open(self, rows: Sequence[Sequence[Any]]) -> None:
+        self.kinds = infer_column_kinds(rows, len(self.columns))
+        self.schema = pa.schema(
+            [
+                (column, getattr(pa, self.ARROW_TYPES.get(kind, "string"))())
+                for column, kind in zip(self.columns, self.kinds)
+            ]
+        )
+        self.writer = pq.ParquetWriter(self.path, self.schema)
+
+    def write(self, rows: Sequence[Sequence[Any]]) -> None:
+        if not rows:
+            return
+        if self.writer is None:
+            self._open(rows)
+        arrays = []
+        for index, (field, kind) in enumerate(zip(self.schema, self.kinds)):
+            values = [row[index] for row in rows]
+            if kind not in self.ARROW_TYPES:
+                values = [None if value is None else str(value) for value in values]
+            try:
+                arrays.append(pa.array(values, type=field.type))
+            except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError) as e:
+                raise ValueError(f"Column {field.name!r} mixes value types, which Parquet cannot store: {e}") from e
+        self.writer.write_table(pa.Table.from_arrays(arrays, schema=self.schema))
+
+    def close(self) -> None:
+        if self.writer is None:
+            # No rows: an empty file with every column as text.
+            self._open([])
+        self.writer.close()
+
+
+def open_export_writer(path: Path, export_format: str, columns: Sequence[str]) -> CsvExportWriter | ParquetExportWriter:
+    """Open a writer for the format. Call export_format_error first."""
+    if export_format == PARQUET_FORMAT:
+        return ParquetExportWriter(path, columns)
+    return CsvExportWriter(path, columns)
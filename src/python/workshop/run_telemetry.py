@@ -0,0 +1,130 @@
+import json
+import time
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Optional
+
+from azure.ai.agents.models import TruncationObject
+
+# Runs kept in memory per thread, for the truncation policy.
+RUNS_KEPT_PER_THREAD = 16
+# A user message and the agent's reply.
+MESSAGES_PER_TURN = 2
+
+
+def _utc_timestamp() -> str:
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+
+
+@dataclass
+class RunRecord:
+    """Token usage and timings of one run, with the messages the thread held and how many the run was sent."""
+
+    thread_id: str
+    run_id: Optional[str]
+    status: Optional[str]
+    prompt_tokens: Optional[int]
+    completion_tokens: Optional[int]
+    first_token_seconds: Optional[float]
+    run_seconds: float
+    thread_messages: int
+    last_messages: Optional[int] = None
+    timestamp: str = field(default_factory=_utc_timestamp)
+
+
+class RunTelemetry:
+    """Recent runs per thread, optionally appended to a JSON Lines log."""
+
+    def __init__(self, path: Optional[Path] = None) -> None:
+        self.path = path
+        self._runs: dict[str, deque[RunRecord]] = {}
+        # Messages added to each thread since its last run without a run of their own, such as replayed answers.
+        self._messages_added: dict[str, int] = {}
+
+    def record(self, record: RunRecord) -> None:
+        self._runs.setdefault(record.thread_id, deque(maxlen=RUNS_KEPT_PER_THREAD)).append(record)
+        self._messages_added.pop(record.thread_id, None)
+        if self.path is None:
+            return
+        try:
+            with self.path.open("a", encoding="utf-8") as file:
+                file.write(json.dumps(asdict(record)) + "\n")
+        except OSError as e:
+            # Telemetry must never break the conversation.
+            print(f"Unable to write to the run telemetry log {self.path}: {e}")
+
+    def runs(self, thread_id: str) -> list[RunRecord]:
+        return list(self._runs.get(thread_id, ()))
+
+    def forget(self, thread_id: str) -> None:
+        self._runs.pop(thread_id, None)
+        self._messages_added.pop(thread_id, None)
+
+    def add_messages(self, thread_id: str, count: int) -> None:
+        """Count messages added to a thread without a run, such as a question and its replayed answer."""
+        self._messages_added[thread_id] = self._messages_added.get(thread_id, 0) + count
+
+    def thread_messages(self, thread_id: str) -> int:
+        """Estimate the messages in a thread once the next user message is added, from the runs recorded so far."""
+        runs = self._runs.get(thread_id)
+        # The last run's messages and its reply, then any messages added since.
+        messages = runs[-1].thread_messages + 1 if runs else 0
+        return messages + self._messages_added.get(thread_id, 0) + 1
+
+
+class AdaptiveTruncation:
+    """Choose how many of a thread's last messages each run is sent, to keep runs near a prompt and time target.
+
+    After a run over target, the window shrinks in proportion to how far over it was, down to ``min_messages``.
+    After a run well under target, it grows by one turn, until the whole thread fits again. Either target can be
+    0 to ignore it.
+    """
+
+    # Grow the window again once a run uses less than this share of the target.
+    GROW_BELOW = 0.6
+
+    def __init__(
+        self,
+        telemetry: RunTelemetry,
+        target_prompt_tokens: int,
+        target_run_seconds: float,
+        min_messages: int,
+    ) -> None:
+        self.telemetry = telemetry
+        self.target_prompt_tokens = target_prompt_tokens
+        self.target_run_seconds = target_run_seconds
+        self.min_messages = min_messages
+
+    def _pressure(self, run: RunRecord) -> float:
+        """How far the run was from the targets: 1.0 is on target, 2.0 twice over."""
+        pressure = 0.0
+        if self.target_prompt_tokens and run.prompt_tokens:
+            pressure = max(pressure, run.prompt_tokens / self.target_prompt_tokens)
+        if self.target_run_seconds:
+            pressure = max(pressure, run.run_seconds / self.target_run_seconds)
+        return pressure
+
+    def window(self, thread_id: str, thread_messages: int) -> Optional[int]:
+        """Return how many of the last messages to send, or None to send the whole thread."""
+        runs = self.telemetry.runs(thread_id)
+        if not runs or not (self.target_prompt_tokens or self.target_run_seconds):
+            return None
+
+        last = runs[-1]
+        pressure = self._pressure(last)
+        if pressure > 1:
+            window = max(self.min_messages, int((last.last_messages or last.thread_messages) / pressure))
+        elif last.last_messages is None:
+            return None
+        elif pressure < self.GROW_BELOW:
+            window = last.last_messages + MESSAGES_PER_TURN
+        else:
+            window = last.last_messages
+        return window if window < thread_messages else None
+
+    def truncation_strategy(self, thread_id: str, thread_messages: int) -> Optional[TruncationObject]:
+        window = self.window(thread_id, thread_messages)
+        if window is None:
+            return None
+        return TruncationObject(type="last_messages", last_messages=window)
@@ -0,0 +1,204 @@
+"""
+A columnar copy of sales_data in NumPy arrays, for group-by totals and counts without running SQL.
+
+Grouping columns are dictionary-encoded: each holds an int32 code per row and the column's distinct values in sorted
+order, so grouping by several columns combines their codes into one integer key and totals every group in a single
+``np.bincount`` pass. Measures are float64 arrays with NULL read as 0, which leaves SUM unchanged.
+
+The arrays can be saved next to the database and memory-mapped on later starts, which skips reading the table again.
+"""
+
+import json
+import logging
+import sqlite3
+import string
+from contextlib import closing
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Bump when the layout of the saved columns changes.
+COLUMNS_FORMAT = 1
+GROUP_COLUMNS = ("region", "main_category", "product_type", "year", "month")
+MEASURES = ("revenue", "shipping_cost", "number_of_orders")
+# Measures summed as whole numbers rather than currency.
+INTEGER_MEASURES = ("number_of_orders",)
+COUNT_METRIC = "count"
+# Result columns of metrics whose rollup column is not total_<metric>.
+METRIC_COLUMNS = {COUNT_METRIC: "sale_count", "number_of_orders": "total_orders"}
+# Folds text like SQLite's NOCASE collation.
+ASCII_LOWERCASE = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+LOAD_CHUNK_ROWS = 65536
+# Above this many possible groups, key combinations are numbered with np.unique instead of one bincount slot each.
+MAX_DENSE_GROUPS = 1 << 24
+
+
+def metric_column(metric: str) -> str:
+    """The result column for a metric, named like the rollup tables' columns."""
+    return METRIC_COLUMNS.get(metric, f"total_{metric}")
+
+
+@dataclass
+class DictionaryColumn:
+    """A column stored as a code per row into its sorted distinct values."""
+
+    codes: np.ndarray
+    values: list
+
+    def __post_init__(self) -> None:
+        self._codes_by_value = {self._fold(value): code for code, value in enumerate(self.values)}
+
+    @staticmethod
+    def _fold(value: Any) -> Any:
+        # Text matches like SQLite's COLLATE NOCASE, which the SQL path uses: only ASCII letters are folded and
+        # whitespace counts. Numbers given as text, such as "2024", match the numbers.
+        if isinstance(value, str):
+            digits = value.removeprefix("-")
+            return int(value) if digits.isascii() and digits.isdigit() else value.translate(ASCII_LOWERCASE)
+        return value
+
+    def code_of(self, value: Any) -> Optional[int]:
+        return self._codes_by_value.get(self._fold(value))
+
+
+class SalesColumns:
+    """Dictionary-encoded grouping columns and measure arrays of every sales_data row."""
+
+    def __init__(self, columns: dict[str, DictionaryColumn], measures: dict[str, np.ndarray]) -> None:
+        self.columns = columns
+        self.measures = measures
+
+    @property
+    def row_count(self) -> int:
+        return len(next(iter(self.measures.values())))
+
+    @classmethod
+    def load(cls, db_path: Path) -> "SalesColumns":
+        """Read sales_data into columns. This blocks, so run it in a worker thread."""
+        with closing(sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)) as conn:
+            # One read transaction, so the row count and the rows come from the same version of the table.
+            conn.execute("BEGIN")
+            row_count = conn.execute("SELECT COUNT(*) FROM sales_data").fetchone()[0]
+            values = {
+                column: [row[0] for row in conn.execute(f"SELECT DISTINCT {column} FROM sales_data ORDER BY {column}")]
+                for column in GROUP_COLUMNS
+            }
+            lookups = {column: {value: code for code, value in enumerate(values[column])} for column in GROUP_COLUMNS}
+            codes = {column: np.empty(row_count, dtype=np.int32) for column in GROUP_COLUMNS}
+            measures = {measure: np.empty(row_count, dtype=np.float64) for measure in MEASURES}
+
+            selected = [*GROUP_COLUMNS, *(f"IFNULL({measure}, 0)" for measure in MEASURES)]
+            cursor = conn.execute(f"SELECT {', '.join(selected)} FROM sales_data")
+            offset = 0
+            while rows := cursor.fetchmany(LOAD_CHUNK_ROWS):
+                end = offset + len(rows)
+                fields = list(zip(*rows))
+                for index, column in enumerate(GROUP_COLUMNS):
+                    lookup = lookups[column]
+                    codes[column][offset:end] = [lookup[value] for value in fields[index]]
+                for index, measure in enumerate(MEASURES, start=len(GROUP_COLUMNS)):
+                    measures[measure][offset:end] = fields[index]
+                offset = end
+            conn.rollback()
+
+        columns = {column: DictionaryColumn(codes[column], values[column]) for column in GROUP_COLUMNS}
+        return cls(columns, measures)
+
+    def save(self, directory: Path, identity: dict) -> None:
+        """Write the columns to .npy files with a manifest of the database identity and each column's values."""
+        directory.mkdir(parents=True, exist_ok=True)
+        for name, array in [*((c, col.codes) for c, col in self.columns.items()), *self.measures.items()]:
+            np.save(directory / f"{name}.npy", np.ascontiguousarray(array))
+        manifest = {
+            "format": COLUMNS_FORMAT,
+            "identity": identity,
+            "values": {column: col.values for column, col in self.columns.items()},
+        }
+        temp_path = directory / "manifest.json.tmp"
+        temp_path.write_text(json.dumps(manifest), encoding="utf-8")
+        # The manifest is written last, so a partial save is never loaded.
+        temp_path.replace(directory / "manifest.json")
+
+    @classmethod
+    def map(cls, directory: Path, identity: dict) -> Optional["SalesColumns"]:
+        """Memory-map columns saved from this exact database file, or return None."""
+        try:
+            manifest = json.loads((directory / "manifest.json").read_text(encoding="utf-8"))
+            if manifest.get("format") != COLUMNS_FORMAT or manifest.get("identity") != identity:
+                return None
+            columns = {
+                column: DictionaryColumn(np.load(directory / f"{column}.npy", mmap_mode="r"), values)
+                for column, values in manifest["values"].items()
+            }
+            measures = {measure: np.load(directory / f"{measure}.npy", mmap_mode="r") for measure in MEASURES}
+        except (OSError, ValueError, KeyError):
+            return None
+        return cls(columns, measures)
+
+    def _filter_mask(self, filters: dict[str, Any]) -> Optional[np.ndarray]:
+        mask = None
+        for column, wanted in filters.items():
+            wanted = wanted if isinstance(wanted, list) else [wanted]
+            dictionary = self.columns[column]
+            codes = [code for code in (dictionary.code_of(value) for value in wanted) if code is not None]
+            if not codes:
+                return np.zeros(self.row_count, dtype=bool)
+            column_mask = dictionary.codes == codes[0] if len(codes) == 1 else np.isin(dictionary.codes, codes)
+            mask = column_mask if mask is None else mask & column_mask
+        return mask
+
+    def aggregate(
+        self, metric: str, group_by: Sequence[str], filters: dict[str, Any], top_n: int
+    ) -> tuple[list[str], list[list[Any]], int]:
+        """Total the metric per group, largest first.
+
+        Returns the result columns, at most ``top_n`` rows (every row for 0), and the number of groups in total.
+        Arguments must already be validated.
+        """
+        mask = self._filter_mask(filters)
+        weights = None if metric == COUNT_METRIC else self.measures[metric]
+        if mask is not None:
+            weights = None if weights is None else weights[mask]
+
+        radixes = [len(self.columns[column].values) for column in group_by]
+        key = np.zeros(self.row_count if mask is None else int(mask.sum()), dtype=np.int64)
+        for column, radix in zip(group_by, radixes):
+            codes = self.columns[column].codes
+            key = key * radix + (codes if mask is None else codes[mask])
+
+        group_count = int(np.prod(radixes, dtype=np.int64))
+        if group_count <= MAX_DENSE_GROUPS:
+            rows_per_group = np.bincount(key, minlength=group_count)
+            totals = rows_per_group if weights is None else np.bincount(key, weights=weights, minlength=group_count)
+            group_keys = np.flatnonzero(rows_per_group)
+            totals = totals[group_keys]
+        else:
+            group_keys, inverse = np.unique(key, return_inverse=True)
+            totals = np.bincount(inverse, weights=weights)
+
+        if not group_by and not len(group_keys):
+            # Like SQL, a grand total over no rows is still one row: a count of 0, or a NULL total.
+            return [metric_column(metric)], [[0 if metric == COUNT_METRIC else None]], 1
+
+        order = np.argsort(-totals, kind="stable")
+        if top_n:
+            order = order[:top_n]
+
+        # Split each selected key back into its columns' codes, last column first.
+        remaining = group_keys[order]
+        decoded = []
+        for column, radix in zip(reversed(group_by), reversed(radixes)):
+            decoded.append([self.columns[column].values[code] for code in (remaining % radix).tolist()])
+            remaining = remaining // radix
+        decoded.reverse()
+
+        if metric == COUNT_METRIC or metric in INTEGER_MEASURES:
+            values = [int(total) for total in totals[order].tolist()]
+        else:
+            values = np.round(totals[order], 2).tolist()
+        rows = [list(row) for row in zip(*decoded, values)]
+        return [*group_by, metric_column(metric)], rows, len(group_keys)
@@ -1,121 +1,469 @@
+import asyncio
+import hashlib
 import json
 import logging
-from typing import Optional
+import multiprocessing
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional, Sequence
 
 import aiosqlite
-import pandas as pd
 
+from config import Config
+from connection_pool import ConnectionPool
+from query_cache import QueryCache
+from query_guard import QueryPlanGuard
+from result_encoder import CSV, encode_result_within
+from result_export import CSV_FORMAT, export_format_error, open_export_writer
+from sales_columns import COUNT_METRIC, GROUP_COLUMNS, INTEGER_MEASURES, MEASURES, SalesColumns, metric_column
+from sales_shards import (
+    SHARD_SCHEMA_PREFIX,
+    ShardQueryPlan,
+    ShardSet,
+    decompose_aggregate,
+    init_shard_worker,
+    merge_partials,
+    resolve_shard_paths,
+    run_shard_query,
+)
 from terminal_colors import TerminalColors as tc
-from utilities import Utilities
+from tracing import traced, tracer
+from utilities import PARTIAL_DOWNLOAD_SUFFIX, Utilities
+from workload_log import (
+    OUTCOME_CACHED,
+    OUTCOME_EMPTY,
+    OUTCOME_ERROR,
+    OUTCOME_OK,
+    OUTCOME_PLAN_REJECTED,
+    OUTCOME_TIMEOUT,
+    OUTCOME_TRUNCATED,
+    WorkloadLog,
+    WorkloadRecord,
+)
 
 DATA_BASE = "database/contoso-sales.db"
+# Bump when the shape of the persisted schema snapshot changes.
+SCHEMA_SNAPSHOT_FORMAT = 4
+# The schema snapshot of sharded data is saved next to the first shard under this name.
+SHARDS_SNAPSHOT_NAME = "sales-shards.schema.json"
+# sales_data columns whose values are described in the schema, with their labels.
+DESCRIBED_COLUMNS = {
+    "region": "Regions",
+    "product_type": "Product Types",
+    "main_category": "Product Categories",
+    "year": "Reporting Years",
+}
+# Pre-aggregated tables created by data-generator/build_database.py.
+ROLLUP_TABLE_PREFIX = "sales_rollup_"
+# Aggregate columns in rollup tables; every other column is a grouping dimension.
+ROLLUP_MEASURE_PREFIXES = ("total_", "sale_count")
+# What aggregate_sales returns when no rows match its filters, whether it runs SQL or the columnar engine.
+NO_MATCHING_SALES = "No sales_data rows match the filters. Try different filter values."
 
 logging.basicConfig(level=logging.ERROR)
 logger = logging.getLogger(__name__)
 
 
+class QueryPlanRejected(Exception):
+    """Raised when the plan guard refuses to run a query, with the error for the model."""
+
+    def __init__(self, error: str) -> None:
+        super().__init__(error)
+        self.error = error
+
+
+@dataclass
+class QueryResult:
+    """The JSON returned to the model for a query, with the rows it holds and how the query ended."""
+
+    json: str
+    rows: Optional[int]
+    outcome: str
+
+
 class SalesData:
-    def __init__(self: "SalesData", utilities: Utilities) -> None:
-        self.conn: Optional[aiosqlite.Connection] = None
+    def __init__(
+        self: "SalesData",
+        utilities: Utilities,
+        db_path: Optional[Path] = None,
+        shard_paths: Optional[Sequence[Path]] = None,
+    ) -> None:
         self.utilities = utilities
+        # Shard files, from Config.SALES_SHARDS unless given. With shards there is no single database file.
+        if shard_paths is None:
+            shard_paths = resolve_shard_paths(Config.SALES_SHARDS, utilities.shared_files_path)
+        self.shard_paths = list(shard_paths)
+        self.db_path = db_path or (self.shard_paths[0] if self.shard_paths else utilities.shared_files_path / DATA_BASE)
+        self.shards: Optional[ShardSet] = None
+        self._shard_workers: Optional[ProcessPoolExecutor] = None
+        self.pool: Optional[ConnectionPool] = None
+        self.query_cache = QueryCache(
+            self.db_paths,
+            max_entries=Config.QUERY_CACHE_MAX_ENTRIES,
+            ttl_seconds=Config.QUERY_CACHE_TTL_SECONDS,
+        )
+        self.query_guard = QueryPlanGuard(max_estimated_rows=Config.QUERY_PLAN_MAX_ESTIMATED_ROWS)
+        self.workload_log = WorkloadLog(Path(Config.WORKLOAD_LOG)) if Config.WORKLOAD_LOG else None
+        self._sales_columns: Optional[set] = None
+        # The columnar copy of sales_data for aggregate_sales, the database identity it was loaded from, and the
+        # load in progress.
+        self.columnar: Optional[SalesColumns] = None
+        self._columnar_identity: Optional[dict] = None
+        self._columnar_task: Optional[asyncio.Task] = None
+
+    @property
+    def db_paths(self: "SalesData") -> list[Path]:
+        """Return every database file the data is read from: the shards, or the single database."""
+        return self.shard_paths or [self.db_path]
 
     async def connect(self: "SalesData") -> None:
-        db_uri = f"file:{self.utilities.shared_files_path}/{DATA_BASE}?mode=ro"
+        db_uri = f"file:{self.db_path}?mode=ro"
+        setup_statements: list[str] = []
+        if self.shard_paths:
+            try:
+                self.shards = await asyncio.to_thread(ShardSet.open, self.shard_paths)
+            except (sqlite3.Error, ValueError) as e:
+                logger.error("Unable to open the sales data shards: %s", e)
+                return
+            # Each connection's own in-memory database holds the views over the attached shards.
+            db_uri = "file::memory:"
+            rollups = {
+                table: [column for column in columns if not column.startswith(ROLLUP_MEASURE_PREFIXES)]
+                for table, columns in self.shards.tables.items()
+                if table.startswith(ROLLUP_TABLE_PREFIX)
+            }
+            setup_statements = self.shards.setup_statements(rollups)
 
+        pool = ConnectionPool(
+            db_uri,
+            size=Config.SQLITE_POOL_SIZE,
+            health_check_seconds=Config.SQLITE_POOL_HEALTH_CHECK_SECONDS,
+            progress_steps=Config.QUERY_PROGRESS_HANDLER_STEPS,
+            setup_statements=setup_statements,
+        )
         try:
-            self.conn = await aiosqlite.connect(db_uri, uri=True)
-            logger.debug("Database connection opened.")
+            await pool.open()
+            self.pool = pool
+            logger.debug("Database connection pool opened.")
         except aiosqlite.Error as e:
             logger.exception("An error occurred", exc_info=e)
-            self.conn = None
+            self.pool = None
+            return
+        # Start loading the columnar copy in the background; aggregate_sales runs SQL until it is ready.
+        self.get_columnar()
 
     async def close(self: "SalesData") -> None:
-        if self.conn:
-            await self.conn.close()
-            logger.debug("Database connection closed.")
+        if self._columnar_task:
+            self._columnar_task.cancel()
+        self._columnar_task = None
+        self._columnar_identity = None
+        self.columnar = None
+        if self._shard_workers:
+            self._shard_workers.shutdown(wait=False, cancel_futures=True)
+            self._shard_workers = None
+        if self.pool:
+            await self.pool.close()
+            self.pool = None
+            logger.debug("Database connection pool closed.")
 
-    def _ensure_connection(self: "SalesData") -> None:
-        """Ensure that the database connection is established."""
-        if self.conn is None:
+    def _ensure_connection(self: "SalesData") -> ConnectionPool:
+        """Ensure that the database connection pool is open and return it."""
+        if self.pool is None:
             raise RuntimeError("Database connection is not established. Call connect() first.")
+        return self.pool
+
+    def _schema_prefix(self: "SalesData") -> str:
+        """Return the schema prefix that tables are described from.
+
+        For sharded data this is the first shard, which lists the tables in the same order as a single database and
+        keeps the declared column types that the regrouped rollup views lose.
+        """
+        return f"{SHARD_SCHEMA_PREFIX}0." if self.shards else ""
 
     async def _get_table_names(self: "SalesData") -> list:
-        """Return a list of table names."""
-        self._ensure_connection()
-        assert self.conn is not None
-        table_names = []
-        async with self.conn.execute("SELECT name FROM sqlite_master WHERE type='table';") as tables:
-            return [table[0] async for table in tables if table[0] != "sqlite_sequence"]
+        """Return a list of table names, which for sharded data are the views over the shards."""
+        pool = self._ensure_connection()
+        query = f"SELECT name FROM {self._schema_prefix()}sqlite_master WHERE type='table';"
+        async with pool.acquire() as conn, conn.execute(query) as tables:
+            # Skip SQLite's internal tables, such as sqlite_sequence and the sqlite_stat* tables from ANALYZE.
+            names = [table[0] async for table in tables if not table[0].startswith("sqlite_")]
+        return [name for name in names if name in self.shards.tables] if self.shards else names
 
     async def _get_column_info(self: "SalesData", table_name: str) -> list:
         """Return a list of tuples containing column names and their types."""
-        self._ensure_connection()
-        assert self.conn is not None
-        column_info = []
-        async with self.conn.execute(f"PRAGMA table_info('{table_name}');") as columns:
+        pool = self._ensure_connection()
+        query = f"PRAGMA {self._schema_prefix()}table_info('{table_name}');"
+        async with pool.acquire() as conn, conn.execute(query) as columns:
             # col[1] is the column name, col[2] is the column type
             return [f"{col[1]}: {col[2]}" async for col in columns]
 
-    async def _get_regions(self: "SalesData") -> list:
-        """Return a list of unique regions in the database."""
-        self._ensure_connection()
-        assert self.conn is not None
-        async with self.conn.execute("SELECT DISTINCT region FROM sales_data;") as regions:
-            result = await regions.fetchall()
-        return [region[0] for region in result]
+    async def _get_column_summary(self: "SalesData", column: str) -> dict:
+        """Return how many distinct values a sales_data column has, with all of them or only the most common."""
+        pool = self._ensure_connection()
+        async with pool.acquire() as conn:
+            async with conn.execute(f"SELECT COUNT(DISTINCT {column}) FROM sales_data;") as cursor:
+                distinct_count = (await cursor.fetchone())[0]
+            if distinct_count <= Config.SCHEMA_ENUM_MAX_VALUES:
+                query = f"SELECT DISTINCT {column} FROM sales_data WHERE {column} IS NOT NULL ORDER BY {column};"
+            else:
+                query = (
+                    f"SELECT {column} FROM sales_data WHERE {column} IS NOT NULL "
+                    f"GROUP BY {column} ORDER BY COUNT(*) DESC, {column} LIMIT {Config.SCHEMA_TOP_VALUES};"
+                )
+            async with conn.execute(query) as cursor:
+                values = [str(row[0]) async for row in cursor]
+        return {"distinct_count": distinct_count, "values": values}
 
-    async def _get_product_types(self: "SalesData") -> list:
-        """Return a list of unique product types in the database."""
-        self._ensure_connection()
-        assert self.conn is not None
-        async with self.conn.execute("SELECT DISTINCT product_type FROM sales_data;") as product_types:
-            result = await product_types.fetchall()
-        return [product_type[0] for product_type in result]
+    def _schema_snapshot_path(self: "SalesData") -> Path:
+        """Return the path of the sidecar file that caches the schema snapshot."""
+        if self.shard_paths:
+            return self.shard_paths[0].with_name(SHARDS_SNAPSHOT_NAME)
+        return self.db_path.with_name(f"{self.db_path.name}.schema.json")
 
-    async def _get_product_categories(self: "SalesData") -> list:
-        """Return a list of unique product categories in the database."""
-        self._ensure_connection()
-        assert self.conn is not None
-        async with self.conn.execute("SELECT DISTINCT main_category FROM sales_data;") as product_categories:
-            result = await product_categories.fetchall()
-        return [product_category[0] for product_category in result]
+    def _database_identity(self: "SalesData") -> dict:
+        """Return the identity of the database files used to key the schema snapshot."""
+        files = []
+        for path in self.db_paths:
+            stat = path.stat()
+            files.append({"path": str(path.resolve()), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns})
+        return {
+            "format": SCHEMA_SNAPSHOT_FORMAT,
+            "enum_max_values": Config.SCHEMA_ENUM_MAX_VALUES,
+            "top_values": Config.SCHEMA_TOP_VALUES,
+            "files": files,
+        }
 
-    async def _get_reporting_years(self: "SalesData") -> list:
-        """Return a list of unique reporting years in the database."""
-        self._ensure_connection()
-        assert self.conn is not None
-        async with self.conn.execute("SELECT DISTINCT year FROM sales_data ORDER BY year;") as reporting_years:
-            result = await reporting_years.fetchall()
-        return [str(reporting_year[0]) for reporting_year in result]
+    def _load_schema_snapshot(self: "SalesData", identity: dict) -> Optional[dict]:
+        """Return the persisted schema snapshot if it was taken from this exact database file."""
+        try:
+            with self._schema_snapshot_path().open("r", encoding="utf-8") as file:
+                cached = json.load(file)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(cached, dict) or cached.get("identity") != identity:
+            return None
+        return cached.get("snapshot")
+
+    def _save_schema_snapshot(self: "SalesData", identity: dict, snapshot: dict) -> None:
+        """Persist the schema snapshot next to the database, replacing any previous one atomically."""
+        snapshot_path = self._schema_snapshot_path()
+        temp_path = snapshot_path.with_name(f"{snapshot_path.name}.tmp")
+        try:
+            with temp_path.open("w", encoding="utf-8") as file:
+                json.dump({"identity": identity, "snapshot": snapshot}, file)
+            temp_path.replace(snapshot_path)
+        except OSError as e:
+            logger.debug("Unable to persist the schema snapshot: %s", e)
+
+    async def _build_schema_snapshot(self: "SalesData") -> dict:
+        """Query the schema and the common query fields, running the queries concurrently."""
+        table_names = await self._get_table_names()
+        column_infos, column_summaries = await asyncio.gather(
+            asyncio.gather(*(self._get_column_info(table_name) for table_name in table_names)),
+            asyncio.gather(*(self._get_column_summary(column) for column in DESCRIBED_COLUMNS)),
+        )
+        return {
+            "tables": [
+                {"table_name": table_name, "column_names": column_names}
+                for table_name, column_names in zip(table_names, column_infos)
+            ],
+            "columns": dict(zip(DESCRIBED_COLUMNS, column_summaries)),
+        }
+
+    @staticmethod
+    def _describe_column(label: str, column: str, summary: dict) -> str:
+        """List a column's values in full, or summarize them when there are too many to list."""
+        if len(summary["values"]) >= summary["distinct_count"]:
+            return f"{label}: {', '.join(summary['values'])}"
+        return (
+            f"{label} ({column}): {summary['distinct_count']:,} distinct values, "
+            f"the most common are {', '.join(summary['values'])}. "
+            "Call lookup_distinct_values to find others."
+        )
+
+    @staticmethod
+    def _describe_rollups(tables: list) -> str:
+        """Describe the rollup tables so the model queries them instead of scanning sales_data."""
+        rollups = []
+        for table in tables:
+            if not table["table_name"].startswith(ROLLUP_TABLE_PREFIX):
+                continue
+            column_names = [column.split(":")[0] for column in table["column_names"]]
+            dimensions = [name for name in column_names if not name.startswith(ROLLUP_MEASURE_PREFIXES)]
+            rollups.append(f"{table['table_name']} (grouped by {', '.join(dimensions)})")
+        if not rollups:
+            return ""
+        return (
+            f"\nRollup Tables: {'; '.join(rollups)}. These hold pre-aggregated sales_data totals. "
+            "Prefer them over sales_data when a question only groups or filters by their columns. "
+            "Revenue is total_revenue and the number of sales rows is sale_count."
+        )
+
+    def _columnar_path(self: "SalesData") -> Path:
+        """Return the directory the columnar copy is saved in when Config.COLUMNAR_ENGINE is "mmap"."""
+        return self.db_path.with_name(f"{self.db_path.name}.columns")
+
+    def _load_columnar(self: "SalesData", identity: dict) -> SalesColumns:
+        """Memory-map the saved columnar copy, or read the table into columns. Blocks, so runs in a worker thread."""
+        if Config.COLUMNAR_ENGINE == "mmap":
+            columnar = SalesColumns.map(self._columnar_path(), identity)
+            if columnar is not None:
+                return columnar
+        columnar = SalesColumns.load(self.db_path)
+        if Config.COLUMNAR_ENGINE == "mmap":
+            try:
+                columnar.save(self._columnar_path(), identity)
+            except OSError as e:
+                logger.debug("Unable to save the columnar copy of sales_data: %s", e)
+        return columnar
+
+    def get_columnar(self: "SalesData") -> Optional[SalesColumns]:
+        """Return the columnar copy of sales_data if it is loaded from the current database file.
+
+        Starts loading it when there is none for the current file, and returns None until the load completes.
+        """
+        # Sharded data is aggregated on the shards instead, see run_query.
+        if Config.COLUMNAR_ENGINE == "off" or self.shard_paths:
+            return None
+        try:
+            stat = self.db_path.stat()
+        except OSError:
+            return None
+        identity = {"path": str(self.db_path.resolve()), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        if identity != self._columnar_identity:
+            if self._columnar_task:
+                self._columnar_task.cancel()
+            self.columnar = None
+            self._columnar_identity = identity
+            self._columnar_task = asyncio.create_task(asyncio.to_thread(self._load_columnar, identity))
+
+        task = self._columnar_task
+        if self.columnar is None and task is not None and task.done():
+            self._columnar_task = None
+            if not task.cancelled() and task.exception() is None:
+                self.columnar = task.result()
+                logger.debug("Loaded %d sales_data rows into columns.", self.columnar.row_count)
+            elif not task.cancelled():
+                # Not retried until the database file changes; aggregate_sales keeps running SQL.
+                logger.warning("Unable to load sales_data into columns: %s", task.exception())
+        return self.columnar
+
+    async def load_columnar(self: "SalesData") -> Optional[SalesColumns]:
+        """Wait for the columnar copy of sales_data to load, and return it."""
+        self.get_columnar()
+        if self._columnar_task:
+            await asyncio.wait([self._columnar_task])
+        return self.get_columnar()
 
     async def get_database_info(self: "SalesData") -> str:
         """Return a string containing the database schema information and common query fields."""
         self._ensure_connection()
-        table_dicts = []
-        for table_name in await self._get_table_names():
-            columns_names = await self._get_column_info(table_name)
-            table_dicts.append(
-                {"table_name": table_name, "column_names": columns_names})
+
+        identity = self._database_identity()
+        snapshot = self._load_schema_snapshot(identity) if Config.SCHEMA_SNAPSHOT_CACHE else None
+        if snapshot is None:
+            snapshot = await self._build_schema_snapshot()
+            if Config.SCHEMA_SNAPSHOT_CACHE:
+                self._save_schema_snapshot(identity, snapshot)
+        else:
+            logger.debug("Loaded the schema snapshot from %s.", self._schema_snapshot_path())
 
         database_info = "\n".join(
             [
                 f"Table {table['table_name']} Schema: Columns: {', '.join(table['column_names'])}"
-                for table in table_dicts
+                for table in snapshot["tables"]
             ]
         )
-        regions = await self._get_regions()
-        product_types = await self._get_product_types()
-        product_categories = await self._get_product_categories()
-        reporting_years = await self._get_reporting_years()
-
-        database_info += f"\nRegions: {', '.join(regions)}"
-        database_info += f"\nProduct Types: {', '.join(product_types)}"
-        database_info += f"\nProduct Categories: {', '.join(product_categories)}"
-        database_info += f"\nReporting Years: {', '.join(reporting_years)}"
+        for column, label in DESCRIBED_COLUMNS.items():
+            database_info += f"\n{self._describe_column(label, column, snapshot['columns'][column])}"
+        database_info += self._describe_rollups(snapshot["tables"])
         database_info += "\n\n"
 
         return database_info
 
+    async def _fetch_rows_within_budget(self: "SalesData", cursor: aiosqlite.Cursor) -> tuple[list, int, bool]:
+        """Read rows in chunks up to Config.MAX_QUERY_ROWS.
+
+        Returns the rows kept, the number of rows omitted and whether that number is exact. Counting stops early if
+        the query deadline is reached after the kept rows have been read.
+        """
+        rows: list = []
+        rows_omitted = 0
+        while True:
+            try:
+                chunk = await cursor.fetchmany(Config.QUERY_FETCH_CHUNK_ROWS)
+            except aiosqlite.OperationalError as e:
+                if rows_omitted and str(e) == "interrupted":
+                    return rows, rows_omitted, False
+                raise
+            if not chunk:
+                return rows, rows_omitted, True
+            room = Config.MAX_QUERY_ROWS - len(rows)
+            if room > 0:
+                rows.extend(chunk[:room])
+            # Rows past the cap are only counted, never kept in memory.
+            rows_omitted += max(len(chunk) - max(room, 0), 0)
+
+    @staticmethod
+    def _add_truncation_marker(result: str, rows_returned: int, rows_omitted: int, exact: bool = True) -> str:
+        """Append a note to the encoded result telling the model the result was truncated."""
+        omitted = f"{rows_omitted}" if exact else f"at least {rows_omitted}"
+        marker = {
+            "rows_returned": rows_returned,
+            "rows_omitted": rows_omitted,
+            "rows_omitted_exact": exact,
+            "message": (
+                f"The result was truncated to {rows_returned} rows and {omitted} rows were omitted. "
+                "Aggregate the data or add a LIMIT to the query to get a complete result."
+            ),
+        }
+        if Config.RESULT_ENCODING == CSV:
+            return f"{result}\n# {marker['message']}"
+        return f'{result[:-1]},"truncated":{json.dumps(marker)}}}'
+
+    async def _check_query_plan(self: "SalesData", conn: aiosqlite.Connection, sqlite_query: str) -> Optional[str]:
+        """Run EXPLAIN QUERY PLAN and return an error for the model if the plan is too expensive to run."""
+        if Config.QUERY_PLAN_GUARD == "off":
+            return None
+
+        plan_check = await self.query_guard.check(conn, sqlite_query)
+        if not plan_check.exceeded:
+            return None
+
+        if Config.QUERY_PLAN_GUARD == "warn":
+            print(f"{tc.YELLOW}Expensive query plan, about {plan_check.estimated_rows:,.0f} rows visited{tc.RESET}\n")
+            return None
+
+        return json.dumps(
+            {
+                "SQLite query failed with error": "The query was not run because its plan is too expensive.",
+                "error_type": "query_plan_rejected",
+                "estimated_rows_visited": round(plan_check.estimated_rows),
+                "max_estimated_rows": Config.QUERY_PLAN_MAX_ESTIMATED_ROWS,
+                "query_plan": plan_check.plan,
+                "suggestion": "Avoid self-joins and correlated subqueries. Use GROUP BY aggregates instead.",
+                "query": sqlite_query,
+            }
+        )
+
+    @staticmethod
+    def _timeout_error(sqlite_query: str) -> str:
+        """Return the error for the model when a query ran past Config.QUERY_TIMEOUT_SECONDS."""
+        return json.dumps(
+            {
+                "SQLite query failed with error": f"Stopped after {Config.QUERY_TIMEOUT_SECONDS} seconds.",
+                "error_type": "query_timeout",
+                "timeout_seconds": Config.QUERY_TIMEOUT_SECONDS,
+                "suggestion": "Simplify the query: filter earlier, aggregate with GROUP BY and avoid joins.",
+                "query": sqlite_query,
+            }
+        )
+
+    @traced("tool")
     async def async_fetch_sales_data_using_sqlite_query(self: "SalesData", sqlite_query: str) -> str:
         """
         This function is used to answer user questions about Contoso sales data by executing SQLite queries against the database.
@@ -129,19 +477,375 @@ class SalesData:
             f"\n{tc.BLUE}Function Call Tools: async_fetch_sales_data_using_sqlite_query{tc.RESET}\n")
         print(f"{tc.BLUE}Executing query: {sqlite_query}{tc.RESET}\n")
 
+        start = time.perf_counter()
+        with tracer.span("sql", query=sqlite_query) as span:
+            query_result = await self.run_query(sqlite_query)
+            span.set_attributes(
+                rows=query_result.rows, result_bytes=len(query_result.json), outcome=query_result.outcome
+            )
+        if self.workload_log:
+            self.workload_log.record(
+                WorkloadRecord(
+                    query=sqlite_query,
+                    latency_ms=round((time.perf_counter() - start) * 1000, 3),
+                    rows=query_result.rows,
+                    result_bytes=len(query_result.json),
+                    outcome=query_result.outcome,
+                )
+            )
+        return query_result.json
+
+    @traced("tool")
+    async def lookup_distinct_values(self: "SalesData", column: str, prefix: str = "") -> str:
+        """
+        This function is used to find the values of a sales_data column that the schema does not list in full, such as product types.
+
+        :param column: The sales_data column to look up, for example product_type.
+        :param prefix: Only return values with a word starting with this text, case-insensitive. Leave empty for the most common values.
+        :return: Return the matching values, most common first, in JSON serializable format.
+        :rtype: str
+        """
+
+        print(f"\n{tc.BLUE}Function Call Tools: lookup_distinct_values({column!r}, {prefix!r}){tc.RESET}\n")
+
+        try:
+            pool = self._ensure_connection()
+            if self._sales_columns is None:
+                self._sales_columns = {info.split(":")[0] for info in await self._get_column_info("sales_data")}
+            if column not in self._sales_columns:
+                return json.dumps({"error": f"Unknown column {column!r}.", "columns": sorted(self._sales_columns)})
+
+            # Match the prefix literally, so % and _ in it are not wildcards.
+            pattern = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+            query = (
+                f"SELECT {column} FROM sales_data WHERE {column} LIKE ? ESCAPE '\\' OR {column} LIKE ? ESCAPE '\\' "
+                f"GROUP BY {column} ORDER BY COUNT(*) DESC, {column} LIMIT ?;"
+            )
+            parameters = (pattern, f"% {pattern}", Config.LOOKUP_DISTINCT_MAX_VALUES + 1)
+            async with pool.acquire(timeout_seconds=Config.QUERY_TIMEOUT_SECONDS) as conn:
+                async with conn.execute(query, parameters) as cursor:
+                    values = [str(row[0]) async for row in cursor]
+        except aiosqlite.OperationalError as e:
+            if str(e) == "interrupted":
+                return json.dumps({"error": f"Stopped after {Config.QUERY_TIMEOUT_SECONDS} seconds."})
+            return json.dumps({"error": str(e)})
+        except Exception as e:
+            return json.dumps({"error": str(e)})
+
+        result = {"column": column, "prefix": prefix, "values": values[: Config.LOOKUP_DISTINCT_MAX_VALUES]}
+        if len(values) > Config.LOOKUP_DISTINCT_MAX_VALUES:
+            shown = Config.LOOKUP_DISTINCT_MAX_VALUES
+            result["message"] = f"Only the {shown} most common matches are shown. Use a longer prefix."
+        elif not values:
+            result["message"] = f"No {column} values have a word starting with {prefix!r}."
+        return json.dumps(result)
+
+    @staticmethod
+    def _aggregate_error(metric: str, group_by: list, filters: dict, top_n: int) -> Optional[str]:
+        """Return why the aggregate_sales arguments are invalid, or None if they are valid."""
+        if metric not in (*MEASURES, COUNT_METRIC):
+            return f"Unknown metric {metric!r}. Use one of {', '.join((*MEASURES, COUNT_METRIC))}."
+        for column in [*group_by, *filters]:
+            if column not in GROUP_COLUMNS:
+                return f"Cannot group or filter by {column!r}. Use one of {', '.join(GROUP_COLUMNS)}."
+        if len(set(group_by)) != len(group_by):
+            return "Each column can only be in group_by once."
+        for column, wanted in filters.items():
+            values = wanted if isinstance(wanted, list) else [wanted]
+            if not values or not all(isinstance(v, (str, int, float)) and not isinstance(v, bool) for v in values):
+                return f"The {column} filter must be a value or a list of values."
+        if not isinstance(top_n, int) or top_n < 0:
+            return "top_n must be 0 or a positive whole number."
+        return None
+
+    @staticmethod
+    def _aggregate_query(metric: str, group_by: list, filters: dict, top_n: int) -> str:
+        """Return the SQLite query equivalent to an aggregate_sales call."""
+
+        def literal(value: str | int | float) -> str:
+            return repr(value) if isinstance(value, (int, float)) else "'" + value.replace("'", "''") + "'"
+
+        if metric == COUNT_METRIC:
+            total = "COUNT(*)"
+        elif metric in INTEGER_MEASURES:
+            total = f"SUM({metric})"
+        else:
+            total = f"ROUND(SUM({metric}), 2)"
+        query = f"SELECT {', '.join([*group_by, f'{total} AS {metric_column(metric)}'])} FROM sales_data"
+        conditions = []
+        for column, wanted in filters.items():
+            values = wanted if isinstance(wanted, list) else [wanted]
+            conditions.append(f"{column} COLLATE NOCASE IN ({', '.join(literal(value) for value in values)})")
+        if conditions:
+            query += f" WHERE {' AND '.join(conditions)}"
+        if group_by:
+            query += f" GROUP BY {', '.join(group_by)}"
+        query += f" ORDER BY {', '.join([metric_column(metric) + ' DESC', *group_by])}"
+        if top_n:
+            query += f" LIMIT {top_n}"
+        return query
+
+    @traced("tool")
+    async def aggregate_sales(
+        self: "SalesData",
+        metric: str,
+        group_by: Optional[list[str]] = None,
+        filters: Optional[dict] = None,
+        top_n: int = 10,
+    ) -> str:
+        """
+        This function is used to total a sales_data measure or count sales rows, grouped by columns and filtered by values, without writing SQL. Prefer it to a SQLite query for totals, counts and rankings.
+
+        :param metric: The measure to total: revenue, shipping_cost or number_of_orders, or count for the number of sales rows.
+        :param group_by: The columns to group by, any of region, main_category, product_type, year and month. Leave empty for a grand total.
+        :param filters: Only include rows whose column has this value, or one of a list of values, for example {"region": "EUROPE", "year": [2023, 2024]}.
+        :param top_n: Return only this many groups, largest first. Use 0 for every group.
+        :return: Return the totals, largest first, in JSON serializable format.
+        :rtype: str
+        """
+
+        print(
+            f"\n{tc.BLUE}Function Call Tools: aggregate_sales({metric!r}, {group_by!r}, {filters!r}, {top_n!r})"
+            f"{tc.RESET}\n"
+        )
+
+        group_by = group_by or []
+        filters = filters or {}
+        error = self._aggregate_error(metric, group_by, filters, top_n)
+        if error:
+            return json.dumps({"error": error})
+
+        columnar = self.get_columnar()
+        if columnar is None:
+            query = self._aggregate_query(metric, group_by, filters, top_n)
+            print(f"{tc.BLUE}Executing query: {query}{tc.RESET}\n")
+            with tracer.span("sql", query=query) as span:
+                query_result = await self.run_query(query)
+                span.set_attributes(rows=query_result.rows, outcome=query_result.outcome)
+            return json.dumps(NO_MATCHING_SALES) if query_result.outcome == OUTCOME_EMPTY else query_result.json
+
+        limit = min(top_n, Config.MAX_QUERY_ROWS) if top_n else Config.MAX_QUERY_ROWS
+        with tracer.span("columnar", metric=metric, group_by=group_by, rows=columnar.row_count) as span:
+            columns, rows, group_count = await asyncio.to_thread(columnar.aggregate, metric, group_by, filters, limit)
+            span.set_attribute("groups", group_count)
+        if not rows:
+            return json.dumps(NO_MATCHING_SALES)
+
+        result, rows_encoded = encode_result_within(
+            columns, rows, Config.MAX_QUERY_RESULT_BYTES, Config.RESULT_ENCODING, Config.RESULT_FLOAT_DECIMALS
+        )
+        rows_omitted = (min(top_n, group_count) if top_n else group_count) - rows_encoded
+        if rows_omitted:
+            result = self._add_truncation_marker(result, rows_encoded, rows_omitted)
+        return result
+
+    async def _export_rows(
+        self: "SalesData", sqlite_query: str, export_format: str, temp_path: Path
+    ) -> tuple[list[str], int, list]:
+        """Stream the query result to temp_path. Returns the columns, the number of rows and the first few rows."""
+        pool = self._ensure_connection()
+        async with pool.acquire(timeout_seconds=Config.EXPORT_TIMEOUT_SECONDS) as conn:
+            plan_error = await self._check_query_plan(conn, sqlite_query)
+            if plan_error:
+                raise QueryPlanRejected(plan_error)
+
+            async with conn.execute(sqlite_query) as cursor:
+                columns = [description[0] for description in cursor.description]
+                writer = await asyncio.to_thread(open_export_writer, temp_path, export_format, columns)
+                row_count = 0
+                preview: list = []
+                try:
+                    while chunk := await cursor.fetchmany(Config.EXPORT_CHUNK_ROWS):
+                        row_count += len(chunk)
+                        preview.extend(chunk[: Config.EXPORT_PREVIEW_ROWS - len(preview)])
+                        await asyncio.to_thread(writer.write, chunk)
+                finally:
+                    await asyncio.to_thread(writer.close)
+        return columns, row_count, preview
+
+    @traced("tool")
+    async def export_sales_query(self: "SalesData", sqlite_query: str, format: str = CSV_FORMAT) -> str:
+        """
+        This function is used to save the full result of a SQLite query to a file the user can download, when the user asks to download or export data. The rows are written straight to the file, with no row limit, and are not returned.
+
+        :param sqlite_query: A well-formed SQLite query selecting the data to export. Do not add a LIMIT unless the user asks for one.
+        :param format: The file format, csv or parquet.
+        :return: Return the file path, row count, columns and the first few rows in JSON serializable format.
+        :rtype: str
+        """
+
+        print(f"\n{tc.BLUE}Function Call Tools: export_sales_query({format!r}){tc.RESET}\n")
+        print(f"{tc.BLUE}Exporting query: {sqlite_query}{tc.RESET}\n")
+
+        format_error = export_format_error(format)
+        if format_error:
+            return json.dumps({"error": format_error})
+
+        folder_path = self.utilities.shared_files_path / "files"
+        query_hash = hashlib.sha256(sqlite_query.encode("utf-8")).hexdigest()[:8]
+        file_path = folder_path / f"sales_export_{time.strftime('%Y%m%d_%H%M%S')}_{query_hash}.{format}"
+        # Written under a temporary name and renamed when complete, like downloaded files.
+        temp_path = folder_path / f".{file_path.name}{PARTIAL_DOWNLOAD_SUFFIX}"
+
+        with tracer.span("export", query=sqlite_query, format=format) as span:
+            try:
+                await asyncio.to_thread(folder_path.mkdir, parents=True, exist_ok=True)
+                columns, row_count, preview = await self._export_rows(sqlite_query, format, temp_path)
+                await asyncio.to_thread(temp_path.replace, file_path)
+            except QueryPlanRejected as e:
+                return e.error
+            except aiosqlite.OperationalError as e:
+                if str(e) == "interrupted":
+                    error = f"Stopped after {Config.EXPORT_TIMEOUT_SECONDS} seconds."
+                else:
+                    error = str(e)
+                return json.dumps({"SQLite query failed with error": error, "query": sqlite_query})
+            except Exception as e:
+                return json.dumps({"Export failed with error": str(e), "query": sqlite_query})
+            finally:
+                await asyncio.to_thread(temp_path.unlink, missing_ok=True)
+
+            size = (await asyncio.to_thread(file_path.stat)).st_size
+            span.set_attributes(rows=row_count, bytes=size, path=str(file_path))
+
+        self.utilities.log_msg_green(f"Exported {row_count:,} rows to {file_path}")
+        return json.dumps(
+            {
+                "path": str(file_path),
+                "format": format,
+                "rows": row_count,
+                "bytes": size,
+                "columns": columns,
+                "preview": [list(row) for row in preview],
+            },
+            default=str,
+        )
+
+    def _ensure_shard_workers(self: "SalesData") -> ProcessPoolExecutor:
+        if self._shard_workers is None:
+            # Spawned rather than forked: forking a process with running aiosqlite threads can deadlock the child.
+            # Each worker re-runs the module-level code of the script that started it, so scripts keep their setup
+            # under an `if __name__ == "__main__":` guard or skip it when sales_shards.is_spawned_process() is True.
+            self._shard_workers = ProcessPoolExecutor(
+                max_workers=min(Config.SHARD_WORKERS, len(self.shard_paths)),
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=init_shard_worker,
+            )
+        return self._shard_workers
+
+    async def _run_on_shards(self: "SalesData", plan: ShardQueryPlan) -> Optional[tuple[list, list, int]]:
+        """Run the plan's partial query on every shard at once and merge the partial rows.
+
+        Returns the columns, at most Config.MAX_QUERY_ROWS rows and the number of rows omitted, or None if the query
+        must run through the views instead. Raises sqlite3.OperationalError("interrupted") on timeout.
+        """
+        loop = asyncio.get_running_loop()
+        with tracer.span("shards", shards=len(self.shard_paths), query=plan.shard_query) as span:
+            try:
+                workers = self._ensure_shard_workers()
+                partials = await asyncio.gather(
+                    *(
+                        loop.run_in_executor(
+                            workers,
+                            run_shard_query,
+                            str(path),
+                            plan.shard_query,
+                            Config.QUERY_TIMEOUT_SECONDS,
+                            Config.QUERY_PROGRESS_HANDLER_STEPS,
+                        )
+                        for path in self.shard_paths
+                    )
+                )
+                columns, rows = await asyncio.to_thread(merge_partials, plan, partials)
+            except sqlite3.OperationalError as e:
+                if str(e) == "interrupted":
+                    raise
+                logger.debug("Running %r on the shards failed, using the views: %s", plan.shard_query, e)
+                return None
+            except sqlite3.Error as e:
+                logger.debug("Running %r on the shards failed, using the views: %s", plan.shard_query, e)
+                return None
+            except BrokenProcessPool:
+                logger.warning("A shard worker process died, restarting the shard workers.")
+                self._shard_workers = None
+                return None
+            except Exception as e:
+                # Anything else, such as worker processes that cannot start, leaves the query to the views too.
+                logger.warning("Running %r on the shards failed, using the views: %s", plan.shard_query, e)
+                if self._shard_workers:
+                    self._shard_workers.shutdown(wait=False, cancel_futures=True)
+                    self._shard_workers = None
+                return None
+            span.set_attributes(partial_rows=sum(len(partial) for partial in partials), rows=len(rows))
+        return columns, rows[: Config.MAX_QUERY_ROWS], max(len(rows) - Config.MAX_QUERY_ROWS, 0)
+
+    async def _fetch_query(
+        self: "SalesData", conn: aiosqlite.Connection, sqlite_query: str
+    ) -> tuple[list, list, int, bool]:
+        async with conn.execute(sqlite_query) as cursor:
+            columns = [description[0] for description in cursor.description]
+            rows, rows_omitted, omitted_exact = await self._fetch_rows_within_budget(cursor)
+        return columns, rows, rows_omitted, omitted_exact
+
+    async def run_query(self: "SalesData", sqlite_query: str) -> QueryResult:
+        """Run a query for the model and return the JSON result with the rows returned and the outcome."""
+        cached_result = self.query_cache.get(sqlite_query)
+        if cached_result is not None:
+            stats = self.query_cache.stats()
+            print(f"{tc.BLUE}Query cache hit ({stats['hits']} hits, {stats['misses']} misses){tc.RESET}\n")
+            return QueryResult(cached_result, None, OUTCOME_CACHED)
+
         try:
-            self._ensure_connection()
-            assert self.conn is not None
-            # Perform the query asynchronously
-            async with self.conn.execute(sqlite_query) as cursor:
-                rows = await cursor.fetchall()
-                columns = [description[0]
-                           for description in cursor.description]
-
-            if not rows:  # No need to create DataFrame if there are no rows
-                return json.dumps("The query returned no results. Try a different question.")
-            data = pd.DataFrame(rows, columns=columns)
-            return data.to_json(index=False, orient="split")
+            pool = self._ensure_connection()
+            # Aggregates over sharded data run on every shard in parallel when they can be decomposed.
+            shard_plan = decompose_aggregate(sqlite_query) if self.shards and Config.SHARD_FANOUT else None
+            # Perform the query asynchronously on a pooled connection
+            async with pool.acquire(timeout_seconds=Config.QUERY_TIMEOUT_SECONDS) as conn:
+                plan_error = await self._check_query_plan(conn, sqlite_query)
+                if plan_error:
+                    return QueryResult(plan_error, 0, OUTCOME_PLAN_REJECTED)
+                if not shard_plan:
+                    columns, rows, rows_omitted, omitted_exact = await self._fetch_query(conn, sqlite_query)
+
+            if shard_plan:
+                # The fan-out runs in the worker processes, so the pooled connection is only borrowed again if the
+                # query has to run through the views.
+                shard_result = await self._run_on_shards(shard_plan)
+                if shard_result:
+                    columns, rows, rows_omitted = shard_result
+                    omitted_exact = True
+                else:
+                    async with pool.acquire(timeout_seconds=Config.QUERY_TIMEOUT_SECONDS) as conn:
+                        columns, rows, rows_omitted, omitted_exact = await self._fetch_query(conn, sqlite_query)
+
+            if not rows:
+                query_result = QueryResult(
+                    json.dumps("The query returned no results. Try a different question."), 0, OUTCOME_EMPTY
+                )
+            else:
+                # By default the same output as pandas' to_json(orient="split"), without copying the rows into a
+                # DataFrame.
+                result, rows_encoded = encode_result_within(
+                    columns, rows, Config.MAX_QUERY_RESULT_BYTES, Config.RESULT_ENCODING, Config.RESULT_FLOAT_DECIMALS
+                )
+                rows_omitted += len(rows) - rows_encoded
+                if rows_omitted:
+                    result = self._add_truncation_marker(result, rows_encoded, rows_omitted, omitted_exact)
+                query_result = QueryResult(result, rows_encoded, OUTCOME_TRUNCATED if rows_omitted else OUTCOME_OK)
+
+            # The database is opened read-only, so results stay valid until the file itself changes.
+            self.query_cache.put(sqlite_query, query_result.json)
+            return query_result
+
+        except aiosqlite.OperationalError as e:
+            # The progress handler interrupts statements that run past the query deadline.
+            if str(e) == "interrupted":
+                return QueryResult(self._timeout_error(sqlite_query), 0, OUTCOME_TIMEOUT)
+            return QueryResult(
+                json.dumps({"SQLite query failed with error": str(e), "query": sqlite_query}), 0, OUTCOME_ERROR
+            )
 
         except Exception as e:
-            return json.dumps({"SQLite query failed with error": str(e), "query": sqlite_query})
+            return QueryResult(
+                json.dumps({"SQLite query failed with error": str(e), "query": sqlite_query}), 0, OUTCOME_ERROR
+            )
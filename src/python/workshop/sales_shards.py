@@ -0,0 +1,348 @@
+"""
+Query sales data split across several SQLite files, such as one per year or per region, as a single database.
+
+Every shard holds the same tables. Each pooled connection attaches the shards read-only and defines TEMP views with
+the unsharded table names: sales_data is the UNION ALL of every shard's rows, and each rollup table sums the shards'
+rollups again, since one group can have rows in several shards.
+
+Aggregate queries over sales_data alone are decomposed: every shard computes partial aggregates over its own rows, in
+parallel in worker processes, and a merge query over the partial rows computes the result. SUM, TOTAL, MIN and MAX
+merge by applying the same aggregate to the partials, COUNT by summing them, and AVG from a partial total and count.
+Queries the decomposer does not recognize run through the views instead.
+"""
+
+import re
+import signal
+import sqlite3
+import sys
+import time
+from contextlib import closing
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional, Sequence
+
+from query_cache import QUOTED_PATTERN, QueryCache
+
+SHARD_SCHEMA_PREFIX = "shard_"
+# SQLite's default compile-time limit on attached databases.
+MAX_SHARDS = 10
+PARTIALS_TABLE = "partials"
+
+CLAUSE_PATTERN = re.compile(r"\b(select|from|where|group\s+by|having|order\s+by|limit)\b", re.IGNORECASE)
+CLAUSE_ORDER = ["select", "from", "where", "group by", "having", "order by", "limit"]
+# Anything that makes a query more than one aggregate over sales_data rows, which the decomposer leaves to the views.
+UNSUPPORTED_PATTERN = re.compile(
+    r"\b(join|union|intersect|except|over|window|with|distinct|sales_rollup_\w*)\b", re.IGNORECASE
+)
+AGGREGATE_PATTERN = re.compile(r"\b(sum|total|count|min|max|avg)\s*\(", re.IGNORECASE)
+COLUMN_PATTERN = re.compile(r"(?:\w+\.)?(\w+)")
+ALIAS_PATTERN = re.compile(r"^(.*?)\s+as\s+(\"(?:[^\"]|\"\")+\"|\w+)\s*$", re.IGNORECASE | re.DOTALL)
+DIRECTION_PATTERN = re.compile(r"\s+(asc|desc)(\s+nulls\s+(first|last))?\s*$", re.IGNORECASE)
+
+
+def resolve_shard_paths(spec: str, base: Path) -> list[Path]:
+    """Expand a comma-separated list of shard files and glob patterns, relative to base unless absolute."""
+    paths: list[Path] = []
+    for pattern in (part.strip() for part in spec.split(",")):
+        if not pattern:
+            continue
+        path = Path(pattern) if Path(pattern).is_absolute() else base / pattern
+        matches = sorted(path.parent.glob(path.name)) if any(char in pattern for char in "*?[") else [path]
+        paths.extend(match for match in matches if match not in paths)
+    return paths
+
+
+def _quote_identifier(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+@dataclass
+class ShardSet:
+    """Shard files and the tables every one of them has, with the columns of each."""
+
+    paths: list[Path]
+    tables: dict[str, list[str]]
+
+    @classmethod
+    def open(cls, paths: Sequence[Path]) -> "ShardSet":
+        """Read the tables of every shard. This blocks, so run it in a worker thread."""
+        if not paths:
+            raise ValueError("No shard files were given.")
+        if len(paths) > MAX_SHARDS:
+            raise ValueError(f"{len(paths)} shards is more than SQLite can attach, the limit is {MAX_SHARDS}.")
+
+        common: Optional[dict[str, list[str]]] = None
+        for path in paths:
+            with closing(sqlite3.connect(f"file:{path}?mode=ro", uri=True)) as conn:
+                names = [
+                    row[0]
+                    for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table' ORDER BY name")
+                    if not row[0].startswith("sqlite_")
+                ]
+                tables = {
+                    name: [row[1] for row in conn.execute(f"PRAGMA table_info({_quote_identifier(name)})")]
+                    for name in names
+                }
+            if common is None:
+                common = tables
+                continue
+            for name in [name for name in common if tables.get(name) != common[name]]:
+                del common[name]
+
+        if not common or "sales_data" not in common:
+            raise ValueError("The shards do not all have a sales_data table with the same columns.")
+        return cls(list(paths), common)
+
+    def identity(self) -> list[dict]:
+        """The path, size and modification time of every shard, which change whenever a shard is rewritten."""
+        files = []
+        for path in self.paths:
+            stat = path.stat()
+            files.append({"path": str(path.resolve()), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns})
+        return files
+
+    def setup_statements(self, regrouped: dict[str, list[str]]) -> list[str]:
+        """Statements that attach the shards and create a view for each table.
+
+        Tables in ``regrouped`` are summed again, grouped by the listed columns; every other table's rows are
+        concatenated.
+        """
+        statements = []
+        for index, path in enumerate(self.paths):
+            uri = f"file:{path}?mode=ro".replace("'", "''")
+            statements.append(f"ATTACH DATABASE '{uri}' AS {SHARD_SCHEMA_PREFIX}{index}")
+
+        for table, columns in self.tables.items():
+            union = " UNION ALL ".join(
+                f"SELECT * FROM {SHARD_SCHEMA_PREFIX}{index}.{_quote_identifier(table)}"
+                for index in range(len(self.paths))
+            )
+            dimensions = regrouped.get(table)
+            if dimensions is None:
+                select = union
+            else:
+                grouped = ", ".join(_quote_identifier(column) for column in dimensions)
+                totals = ", ".join(
+                    f"SUM({_quote_identifier(column)}) AS {_quote_identifier(column)}"
+                    for column in columns
+                    if column not in dimensions
+                )
+                select = f"SELECT {grouped}, {totals} FROM ({union}) GROUP BY {grouped}"
+            statements.append(f"CREATE TEMP VIEW {_quote_identifier(table)} AS {select}")
+        return statements
+
+
+@dataclass
+class ShardQueryPlan:
+    """A query split into the partial query every shard runs and the query that merges the partial rows."""
+
+    shard_query: str
+    partial_columns: list[str]
+    merge_query: str
+
+
+def _mask_literals(sql: str) -> str:
+    """Blank out the contents of quoted strings, identifiers and comments, keeping every other character in place.
+
+    Comments keep their opening -- or /* so they can still be found.
+    """
+
+    def blank(match: re.Match) -> str:
+        text = match.group(0)
+        if text.startswith(("--", "/*")):
+            return f"{text[:2]}{' ' * (len(text) - 2)}"
+        return f"{text[0]}{' ' * (len(text) - 2)}{text[0]}"
+
+    return QUOTED_PATTERN.sub(blank, sql)
+
+
+def _mask_nested(masked: str) -> str:
+    """Blank out everything inside parentheses, so only the top level of the query is left."""
+    depth = 0
+    chars = []
+    for char in masked:
+        if char == ")":
+            depth -= 1
+        chars.append(char if depth == 0 else " ")
+        if char == "(":
+            depth += 1
+    return "".join(chars)
+
+
+def _split_top_level(text: str) -> list[str]:
+    """Split at commas outside of quotes and parentheses."""
+    top_level = _mask_nested(_mask_literals(text))
+    parts, start = [], 0
+    for index, char in enumerate(top_level):
+        if char == ",":
+            parts.append(text[start:index].strip())
+            start = index + 1
+    parts.append(text[start:].strip())
+    return parts
+
+
+class _Decomposer:
+    """Rewrites aggregate expressions into partial aggregates for the shards and merge aggregates over them."""
+
+    def __init__(self, group_terms: list[str]) -> None:
+        self.group_terms = group_terms
+        self.group_keys = [QueryCache.normalize(term) for term in group_terms]
+        self.partials: list[str] = [f"{term} AS g{index}" for index, term in enumerate(group_terms)]
+        self.partial_columns: list[str] = [f"g{index}" for index in range(len(group_terms))]
+        self._merges: dict[str, str] = {}
+
+    def _add_partial(self, expression: str) -> str:
+        column = f"p{len(self.partial_columns)}"
+        self.partials.append(f"{expression} AS {column}")
+        self.partial_columns.append(column)
+        return column
+
+    def _merge_aggregate(self, name: str, arguments: str) -> Optional[str]:
+        if AGGREGATE_PATTERN.search(_mask_literals(arguments)):
+            return None
+        if name in ("min", "max") and len(_split_top_level(arguments)) > 1:
+            # min(a, b) and max(a, b) compare their arguments within a row; they are not aggregates.
+            return None
+        key = f"{name}({QueryCache.normalize(arguments)})"
+        if key not in self._merges:
+            if name == "avg":
+                total = self._add_partial(f"TOTAL({arguments})")
+                count = self._add_partial(f"COUNT({arguments})")
+                self._merges[key] = f"(TOTAL({total}) / NULLIF(SUM({count}), 0))"
+            elif name == "count":
+                self._merges[key] = f"SUM({self._add_partial(f'COUNT({arguments})')})"
+            else:
+                self._merges[key] = f"{name.upper()}({self._add_partial(f'{name.upper()}({arguments})')})"
+        return self._merges[key]
+
+    def group_column(self, expression: str) -> Optional[str]:
+        key = QueryCache.normalize(expression)
+        return f"g{self.group_keys.index(key)}" if key in self.group_keys else None
+
+    def rewrite(self, expression: str) -> Optional[str]:
+        """Replace each aggregate call in the expression with its merge, or return None if one cannot be merged."""
+        masked = _mask_literals(expression)
+        parts, position = [], 0
+        for match in AGGREGATE_PATTERN.finditer(masked):
+            if match.start() < position:
+                return None
+            depth, end = 0, None
+            for index in range(match.end() - 1, len(masked)):
+                depth += {"(": 1, ")": -1}.get(masked[index], 0)
+                if depth == 0:
+                    end = index
+                    break
+            if end is None:
+                return None
+            merged = self._merge_aggregate(match.group(1).lower(), expression[match.end() : end])
+            if merged is None:
+                return None
+            parts += [expression[position : match.start()], merged]
+            position = end + 1
+        return "".join([*parts, expression[position:]])
+
+
+def decompose_aggregate(sqlite_query: str) -> Optional[ShardQueryPlan]:
+    """Split an aggregate query over sales_data into per-shard partials and a merge, or return None if it cannot be."""
+    sql = sqlite_query.strip().rstrip(";").strip()
+    masked = _mask_literals(sql)
+    if len(re.findall(r"\bselect\b", masked, re.IGNORECASE)) != 1 or UNSUPPORTED_PATTERN.search(masked):
+        return None
+    # A line comment would swallow the rest of a rewritten query, which joins the clauses on one line.
+    if "--" in masked or "/*" in masked:
+        return None
+
+    clauses: dict[str, str] = {}
+    matches = list(CLAUSE_PATTERN.finditer(_mask_nested(masked)))
+    for index, match in enumerate(matches):
+        keyword = " ".join(match.group(1).lower().split())
+        end = matches[index + 1].start() if index + 1 < len(matches) else len(sql)
+        if keyword in clauses or (clauses and CLAUSE_ORDER.index(keyword) <= CLAUSE_ORDER.index(list(clauses)[-1])):
+            return None
+        clauses[keyword] = sql[match.end() : end].strip()
+    if not matches or matches[0].start() != 0 or clauses.get("from", "").strip('"').lower() != "sales_data":
+        return None
+
+    # Groups that compare values with another collation could be split differently by the merge.
+    if re.search(r"\bcollate\b", _mask_literals(clauses.get("group by", "") + clauses.get("order by", "")), re.I):
+        return None
+    decomposer = _Decomposer(_split_top_level(clauses["group by"]) if "group by" in clauses else [])
+    merged_items = []
+    for item in _split_top_level(clauses["select"]):
+        alias_match = ALIAS_PATTERN.match(item)
+        expression, alias = (alias_match.group(1), alias_match.group(2)) if alias_match else (item, None)
+        # Name the merged column as SQLite would have named the original one.
+        column_match = COLUMN_PATTERN.fullmatch(item)
+        name = alias or _quote_identifier(column_match.group(1) if column_match else item)
+        if AGGREGATE_PATTERN.search(_mask_literals(expression)):
+            merged = decomposer.rewrite(expression)
+        else:
+            merged = decomposer.group_column(expression)
+        if merged is None:
+            return None
+        merged_items.append(f"{merged} AS {name}")
+    if len(decomposer.partial_columns) == len(decomposer.group_terms):
+        # No aggregates: nothing to gain from splitting the query.
+        return None
+
+    merge_query = f"SELECT {', '.join(merged_items)} FROM {PARTIALS_TABLE}"
+    if decomposer.group_terms:
+        merge_query += f" GROUP BY {', '.join(decomposer.partial_columns[: len(decomposer.group_terms)])}"
+    if "having" in clauses:
+        having = decomposer.rewrite(clauses["having"])
+        if having is None:
+            return None
+        merge_query += f" HAVING {having}"
+    if "order by" in clauses:
+        terms = []
+        for term in _split_top_level(clauses["order by"]):
+            direction = DIRECTION_PATTERN.search(term)
+            expression = term[: direction.start()] if direction else term
+            merged = decomposer.group_column(expression) or decomposer.rewrite(expression)
+            if merged is None:
+                return None
+            terms.append(f"{merged}{direction.group(0) if direction else ''}")
+        merge_query += f" ORDER BY {', '.join(terms)}"
+    if "limit" in clauses:
+        merge_query += f" LIMIT {clauses['limit']}"
+
+    shard_query = f"SELECT {', '.join(decomposer.partials)} FROM sales_data"
+    if "where" in clauses:
+        shard_query += f" WHERE {clauses['where']}"
+    if decomposer.group_terms:
+        shard_query += f" GROUP BY {', '.join(decomposer.group_terms)}"
+    return ShardQueryPlan(shard_query, decomposer.partial_columns, merge_query)
+
+
+def is_spawned_process() -> bool:
+    """Return True in a process started with multiprocessing's spawn method, such as a shard worker.
+
+    A spawned process runs the module-level code of the parent's script again, as __mp_main__, before it runs its
+    task. Scripts check this to skip setup that only the parent needs. It is only True while that code runs; at any
+    other time __mp_main__ is __main__ itself.
+    """
+    return sys.modules.get("__mp_main__", sys.modules["__main__"]) is not sys.modules["__main__"]
+
+
+def init_shard_worker() -> None:
+    """Initialize a shard worker process. Ctrl+C goes to the parent, which shuts the workers down."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def run_shard_query(path: str, sqlite_query: str, timeout_seconds: float, progress_steps: int) -> list[tuple]:
+    """Run a partial query on one shard and return its rows. Runs in a worker process."""
+    expires_at = time.monotonic() + timeout_seconds
+    with closing(sqlite3.connect(f"file:{path}?mode=ro", uri=True)) as conn:
+        conn.set_progress_handler(lambda: time.monotonic() > expires_at, progress_steps)
+        return conn.execute(sqlite_query).fetchall()
+
+
+def merge_partials(plan: ShardQueryPlan, partial_rows: Sequence[Sequence[tuple]]) -> tuple[list[str], list[tuple]]:
+    """Run the merge query over every shard's partial rows. Returns the result columns and rows."""
+    with closing(sqlite3.connect(":memory:")) as conn:
+        conn.execute(f"CREATE TABLE {PARTIALS_TABLE} ({', '.join(plan.partial_columns)})")
+        placeholders = ", ".join("?" for _ in plan.partial_columns)
+        for rows in partial_rows:
+            conn.executemany(f"INSERT INTO {PARTIALS_TABLE} VALUES ({placeholders})", rows)
+        cursor = conn.execute(plan.merge_query)
+        return [description[0] for description in cursor.description], cursor.fetchall()
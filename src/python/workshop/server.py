@@ -0,0 +1,250 @@
+"""
+Serve the Contoso sales agent to many users at once over HTTP and WebSocket.
+
+One process shares one agent, one AgentsClient and one SalesData across every session; each session gets its own
+agent thread, handed out ready-made by a pool of empty threads. Replies stream back to each client through the
+session's own coalescing token renderer, whose writes wait on that client's socket, so a slow client only holds up
+its own run stream.
+
+Endpoints:
+    GET    /ws                        WebSocket session: send a prompt as a text frame, receive JSON frames
+                                      {"type": "delta", "text": ...} and then {"type": "done"}
+    POST   /sessions                  create a session, returns {"session_id": ...}
+    POST   /sessions/{id}/messages    send {"content": ...}, the reply streams back as chunked text/plain
+    DELETE /sessions/{id}             end a session and delete its thread
+    GET    /health                    number of active sessions
+
+Sessions left idle for Config.SERVER_SESSION_IDLE_SECONDS are ended by a background task, closing their WebSocket.
+
+Usage:
+    python server.py --port 8080
+"""
+
+import argparse
+import asyncio
+import contextlib
+import logging
+import time
+import uuid
+
+from aiohttp import WSCloseCode, WSMsgType, web
+from azure.ai.agents.models import Agent, AgentThread
+
+import main
+from config import Config
+from stream_event_handler import StreamEventHandler
+from token_renderer import TokenRenderer, TokenSink, WebSocketSink
+
+logger = logging.getLogger(__name__)
+
+AGENT_KEY = web.AppKey("agent", Agent)
+SESSIONS_KEY = web.AppKey("sessions", dict)
+EXPIRY_TASK_KEY = web.AppKey("expiry_task", asyncio.Task)
+
+
+class Session:
+    """A user's conversation, backed by one agent thread. Messages in a session run one at a time."""
+
+    def __init__(self, thread: AgentThread) -> None:
+        self.session_id = uuid.uuid4().hex
+        self.thread = thread
+        self.used = False
+        self.closed = False
+        self.lock = asyncio.Lock()
+        self.last_active = time.monotonic()
+        self.websocket: web.WebSocketResponse | None = None
+
+    def idle_seconds(self) -> float:
+        """Seconds since the last message finished, or zero while a reply is in progress."""
+        if self.lock.locked():
+            return 0.0
+        return time.monotonic() - self.last_active
+
+
+class ChunkedResponseSink(TokenSink):
+    """Write tokens to a chunked HTTP response, dropping them once the client has disconnected."""
+
+    def __init__(self, response: web.StreamResponse) -> None:
+        self.response = response
+        self.connected = True
+
+    async def write(self, text: str) -> None:
+        if not self.connected:
+            return
+        try:
+            await self.response.write(text.encode("utf-8"))
+        except (ConnectionResetError, RuntimeError):
+            self.connected = False
+
+
+async def stream_reply(app: web.Application, session: Session, content: str, sink: TokenSink) -> None:
+    """Post a message to the session's thread, streaming the reply to the sink.
+
+    The renderer's buffer is bounded and writes wait on the client's socket, so a slow client only pauses this
+    session's run stream.
+    """
+    renderer = TokenRenderer(sink)
+    async with session.lock:
+        # The session may have expired while this message waited for the lock.
+        if session.closed:
+            await sink.write("Session ended, start a new one.")
+            return
+        session.used = True
+        try:
+            await main.post_message(
+                thread_id=session.thread.id,
+                content=content,
+                agent=app[AGENT_KEY],
+                thread=session.thread,
+                event_handler=StreamEventHandler(
+                    functions=main.functions,
+                    agent_client=main.agents_client,
+                    utilities=main.utilities,
+                    renderer=renderer,
+                    dispatcher=main.tool_dispatcher,
+                ),
+            )
+        finally:
+            await renderer.close()
+            session.last_active = time.monotonic()
+
+
+async def open_session(app: web.Application) -> Session:
+    sessions = app[SESSIONS_KEY]
+    if len(sessions) >= Config.SERVER_MAX_SESSIONS:
+        raise web.HTTPServiceUnavailable(text="Too many active sessions, try again later.")
+    session = Session(await main.thread_pool.acquire())
+    sessions[session.session_id] = session
+    return session
+
+
+async def close_session(app: web.Application, session: Session) -> None:
+    if app[SESSIONS_KEY].pop(session.session_id, None) is None:
+        return
+    # Wait for a reply in progress, then hand the thread back to be deleted, or reused if it was never used.
+    async with session.lock:
+        session.closed = True
+        main.thread_pool.release(session.thread, used=session.used)
+    main.run_telemetry.forget(session.thread.id)
+
+
+async def expire_idle_sessions(app: web.Application) -> None:
+    """End sessions idle for longer than Config.SERVER_SESSION_IDLE_SECONDS, checking a few times per period."""
+    while True:
+        await asyncio.sleep(Config.SERVER_SESSION_IDLE_SECONDS / 4)
+        for session in list(app[SESSIONS_KEY].values()):
+            if session.idle_seconds() < Config.SERVER_SESSION_IDLE_SECONDS:
+                continue
+            logger.info("Ending session %s after %.0f idle seconds", session.session_id, session.idle_seconds())
+            if session.websocket is not None:
+                await session.websocket.close(code=WSCloseCode.GOING_AWAY, message=b"Session idle")
+            await close_session(app, session)
+
+
+def get_session(request: web.Request) -> Session:
+    session = request.app[SESSIONS_KEY].get(request.match_info["session_id"])
+    if session is None:
+        raise web.HTTPNotFound(text="Unknown session.")
+    return session
+
+
+async def websocket_session(request: web.Request) -> web.WebSocketResponse:
+    # Open the session before the upgrade, so a full server answers with a plain 503 rather than an open socket.
+    session = await open_session(request.app)
+    ws = web.WebSocketResponse(heartbeat=30)
+    session.websocket = ws
+    sink = WebSocketSink(ws)
+
+    try:
+        await ws.prepare(request)
+        async for msg in ws:
+            if msg.type != WSMsgType.TEXT:
+                continue
+            content = msg.data.strip()
+            if not content:
+                continue
+            await stream_reply(request.app, session, content, sink)
+            if not sink.connected:
+                break
+            await ws.send_json({"type": "done"})
+    finally:
+        await close_session(request.app, session)
+    return ws
+
+
+async def create_session(request: web.Request) -> web.Response:
+    session = await open_session(request.app)
+    return web.json_response({"session_id": session.session_id}, status=201)
+
+
+async def post_session_message(request: web.Request) -> web.StreamResponse:
+    session = get_session(request)
+    try:
+        content = (await request.json())["content"].strip()
+    except (ValueError, KeyError, AttributeError) as e:
+        raise web.HTTPBadRequest(text='Expected a JSON body like {"content": "..."}.') from e
+
+    response = web.StreamResponse(headers={"Content-Type": "text/plain; charset=utf-8"})
+    response.enable_chunked_encoding()
+    await response.prepare(request)
+
+    sink = ChunkedResponseSink(response)
+    await stream_reply(request.app, session, content, sink)
+    if sink.connected:
+        await response.write_eof()
+    return response
+
+
+async def delete_session(request: web.Request) -> web.Response:
+    await close_session(request.app, get_session(request))
+    return web.Response(status=204)
+
+
+async def health(request: web.Request) -> web.Response:
+    return web.json_response({"sessions": len(request.app[SESSIONS_KEY])})
+
+
+async def on_startup(app: web.Application) -> None:
+    agent, thread = await main.initialize()
+    if not agent or not thread:
+        raise RuntimeError("Initialization failed. Ensure you have uncommented the instructions file for the lab.")
+    app[AGENT_KEY] = agent
+    await main.thread_pool.start()
+    # Sessions get their own threads, so the one initialize() made goes back to the pool for the first of them.
+    main.thread_pool.release(thread, used=False)
+    app[EXPIRY_TASK_KEY] = asyncio.create_task(expire_idle_sessions(app))
+    print(f"Serving agent {agent.id}")
+
+
+async def on_cleanup(app: web.Application) -> None:
+    if EXPIRY_TASK_KEY in app:
+        app[EXPIRY_TASK_KEY].cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await app[EXPIRY_TASK_KEY]
+    for session in list(app[SESSIONS_KEY].values()):
+        await close_session(app, session)
+    await main.utilities.wait_for_downloads()
+    if AGENT_KEY in app:
+        await main.cleanup(app[AGENT_KEY])
+    await main.agents_client.close()
+
+
+def create_app() -> web.Application:
+    app = web.Application()
+    app[SESSIONS_KEY] = {}
+    app.router.add_get("/ws", websocket_session)
+    app.router.add_post("/sessions", create_session)
+    app.router.add_post("/sessions/{session_id}/messages", post_session_message)
+    app.router.add_delete("/sessions/{session_id}", delete_session)
+    app.router.add_get("/health", health)
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=Config.SERVER_HOST)
+    parser.add_argument("--port", type=int, default=Config.SERVER_PORT)
+    args = parser.parse_args()
+    web.run_app(create_app(), host=args.host, port=args.port)
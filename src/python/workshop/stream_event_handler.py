@@ -1,38 +1,101 @@
-from typing import Any
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable
 
 from azure.ai.agents.aio import AgentsClient
 from azure.ai.agents.models import (
     AsyncAgentEventHandler,
     AsyncFunctionTool,
+    BaseAsyncAgentEventHandler,
     MessageDeltaChunk,
     MessageStatus,
     RunStatus,
     RunStep,
     RunStepDeltaChunk,
     RunStepStatus,
+    SubmitToolOutputsAction,
     ThreadMessage,
     ThreadRun,
+    ToolOutput,
 )
 
+from token_renderer import TerminalSink, TokenRenderer
+from tool_dispatcher import ToolDispatcher
+from tracing import Span, tracer
 from utilities import Utilities
 
 
 class StreamEventHandler(AsyncAgentEventHandler[str]):
     """Handle LLM streaming events and tokens."""
 
-    def __init__(self, functions: AsyncFunctionTool, agent_client: AgentsClient, utilities: Utilities) -> None:
+    def __init__(
+        self,
+        functions: AsyncFunctionTool,
+        agent_client: AgentsClient,
+        utilities: Utilities,
+        renderer: TokenRenderer | None = None,
+        dispatcher: ToolDispatcher | None = None,
+    ) -> None:
         self.functions = functions
         self.agent_client = agent_client
         self.util = utilities
+        self.renderer = renderer or TokenRenderer(TerminalSink())
+        # Executes the run's function calls in place of the client's auto function calls.
+        self.dispatcher = dispatcher
+        # The latest state of the run, with its usage once complete, and when its first token arrived.
+        self.run: ThreadRun | None = None
+        self.first_token_at: float | None = None
+        # The streamed reply, and whether the run produced files, for the answer cache.
+        self.reply_deltas: list[str] = []
+        self.has_files = False
+        # Spans of run steps in progress, by step ID, while tracing is on.
+        self._step_spans: dict[str, Span] = {}
         super().__init__()
 
+    def initialize(
+        self,
+        response_iterator: AsyncIterator[bytes],
+        submit_tool_outputs: Callable[[ThreadRun, BaseAsyncAgentEventHandler, bool], Awaitable[Any]],
+    ) -> None:
+        """Attach the run's event stream. With a dispatcher, function calls are submitted by this handler instead."""
+        super().initialize(response_iterator, self._submit_tool_outputs if self.dispatcher else submit_tool_outputs)
+
+    async def _submit_tool_outputs(
+        self, run: ThreadRun, event_handler: BaseAsyncAgentEventHandler, submit_with_error: bool
+    ) -> list[ToolOutput]:
+        """Execute the run's function calls with the dispatcher and continue the stream with their outputs.
+
+        Failed calls are submitted as JSON errors for the model to correct, so ``submit_with_error`` is not used.
+        """
+        if not isinstance(run.required_action, SubmitToolOutputsAction):
+            return []
+        tool_outputs = await self.dispatcher.execute(run.required_action.submit_tool_outputs.tool_calls)
+        if tool_outputs:
+            # The rest of the run is chained onto this handler's stream.
+            await self.agent_client.runs.submit_tool_outputs_stream(
+                thread_id=run.thread_id, run_id=run.id, tool_outputs=tool_outputs, event_handler=event_handler
+            )
+        return tool_outputs
+
     async def on_message_delta(self, delta: MessageDeltaChunk) -> None:
         """Handle message delta events. This will be the streamed token"""
-        self.util.log_token_blue(delta.text)
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+        self.reply_deltas.append(delta.text)
+        await self.renderer.add(delta.text)
+
+    async def replay(self, deltas: list[str]) -> None:
+        """Stream a cached reply through the handler as if it had come from a run."""
+        for text in deltas:
+            delta = {"role": "assistant", "content": [{"index": 0, "type": "text", "text": {"value": text}}]}
+            await self.on_message_delta(MessageDeltaChunk({"object": "thread.message.delta", "delta": delta}))
+        await self.on_done()
 
     async def on_thread_message(self, message: ThreadMessage) -> None:
         """Handle thread message events."""
-        pass
+        if message.status == MessageStatus.COMPLETED:
+            await self.renderer.flush()
+            if message.image_contents or message.attachments:
+                self.has_files = True
         # if message.status == MessageStatus.COMPLETED:
         #     print()
         # self.util.log_msg_purple(f"ThreadMessage created. ID: {message.id}, " f"Status: {message.status}")
@@ -41,27 +104,57 @@ class StreamEventHandler(AsyncAgentEventHandler[str]):
 
     async def on_thread_run(self, run: ThreadRun) -> None:
         """Handle thread run events"""
+        self.run = run
 
         if run.status == RunStatus.FAILED:
+            await self.renderer.flush()
             print(f"Run failed. Error: {run.last_error}")
             print(f"Thread ID: {run.thread_id}")
             print(f"Run ID: {run.id}")
 
     async def on_run_step(self, step: RunStep) -> None:
-        pass
+        if tracer.enabled:
+            self._trace_run_step(step)
         # if step.status == RunStepStatus.COMPLETED:
         #     print()
         # self.util.log_msg_purple(f"RunStep type: {step.type}, Status: {step.status}")
 
+    def _trace_run_step(self, step: RunStep) -> None:
+        """Trace each run step in a span, current while the step runs so its function tool calls nest under it."""
+        span = self._step_spans.get(step.id)
+        if span is None:
+            if step.status == RunStepStatus.IN_PROGRESS:
+                step_type = getattr(step.type, "value", step.type)
+                self._step_spans[step.id] = tracer.span("run_step", step_id=step.id, type=step_type).activate()
+            return
+        if step.status == RunStepStatus.IN_PROGRESS:
+            return
+        del self._step_spans[step.id]
+        span.set_attribute("status", getattr(step.status, "value", step.status))
+        if step.usage:
+            span.set_attributes(prompt_tokens=step.usage.prompt_tokens, completion_tokens=step.usage.completion_tokens)
+        if step.status == RunStepStatus.FAILED:
+            span.status = "ERROR"
+            span.set_attribute("error", str(step.last_error))
+        span.end()
+
+    def _end_step_spans(self) -> None:
+        for span in reversed(self._step_spans.values()):
+            span.end()
+        self._step_spans.clear()
+
     async def on_run_step_delta(self, delta: RunStepDeltaChunk) -> None:
         pass
 
     async def on_error(self, data: str) -> None:
+        self._end_step_spans()
+        await self.renderer.flush()
         print(f"An error occurred. Data: {data}")
 
     async def on_done(self) -> None:
         """Handle stream completion."""
-        pass
+        self._end_step_spans()
+        await self.renderer.flush()
         # self.util.log_msg_purple(f"\nStream completed.")
 
     async def on_unhandled_event(self, event_type: str, event_data: Any) -> None:
@@ -0,0 +1,49 @@
+import os
+import sqlite3
+import sys
+from contextlib import closing
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parents[3] / "shared/database/data-generator"))
+# config.py requires the variable, but nothing under test talks to the agent service.
+os.environ.setdefault("PROJECT_ENDPOINT", "http://localhost")
+os.environ.setdefault("MODEL_DEPLOYMENT_NAME", "test")
+
+from build_database import build, create_indexes, create_rollups
+
+SALES_ROWS = 20_000
+
+
+@pytest.fixture(scope="session")
+def sales_db(tmp_path_factory: pytest.TempPathFactory) -> Path:
+    """A generated sales database built like contoso-sales.db, with indexes and rollups."""
+    path = tmp_path_factory.mktemp("database") / "sales.db"
+    build(path, Path("unused.sql"), rows=SALES_ROWS)
+    return path
+
+
+@pytest.fixture(scope="session")
+def sales_shards(sales_db: Path, tmp_path_factory: pytest.TempPathFactory) -> list[Path]:
+    """The rows of sales_db split into one shard per year, each built with its own indexes and rollups."""
+    shard_dir = tmp_path_factory.mktemp("shards")
+    with closing(sqlite3.connect(sales_db)) as conn:
+        schema = conn.execute("SELECT sql FROM sqlite_master WHERE name = 'sales_data'").fetchone()[0]
+        years = [year for (year,) in conn.execute("SELECT DISTINCT year FROM sales_data ORDER BY year")]
+    paths = []
+    for year in years:
+        path = shard_dir / f"sales-{year}.db"
+        with closing(sqlite3.connect(path)) as conn:
+            conn.execute(schema)
+            conn.execute("ATTACH DATABASE ? AS source", (str(sales_db),))
+            conn.execute("INSERT INTO sales_data SELECT * FROM source.sales_data WHERE year = ?", (year,))
+            conn.commit()
+            conn.execute("DETACH DATABASE source")
+            with conn:
+                create_indexes(conn)
+                create_rollups(conn)
+            conn.execute("ANALYZE")
+        paths.append(path)
+    return paths
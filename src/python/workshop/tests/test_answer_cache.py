@@ -0,0 +1,55 @@
+from pathlib import Path
+
+import pytest
+
+from answer_cache import AnswerCache
+
+AGENT = "agent-fingerprint"
+
+
+@pytest.fixture
+def db_path(tmp_path: Path) -> Path:
+    path = tmp_path / "sales.db"
+    path.write_bytes(b"sales")
+    return path
+
+
+def cached(db_path: Path, prompt: str, **options: float) -> AnswerCache:
+    cache = AnswerCache(db_path, **options)
+    cache.put(prompt, AGENT, ["The answer."], run_seconds=2.0)
+    return cache
+
+
+@pytest.mark.parametrize(
+    "prompt", ["What were the sales by region?", "sales by region", "Show me the Sales, by region!"]
+)
+def test_rewordings_of_the_same_question_hit(db_path: Path, prompt: str) -> None:
+    hit = cached(db_path, "What were the sales by region?").get(prompt, AGENT)
+    assert hit is not None
+    assert hit.answer.text == "The answer."
+
+
+@pytest.mark.parametrize(
+    ("first", "second"),
+    [
+        ("Show total revenue by month for winter sports", "Show total revenue by month for water sports"),
+        ("What are the top 5 products?", "What are the top 10 products?"),
+        ("sales by region", "sales by region in 2024"),
+    ],
+)
+def test_different_questions_miss(db_path: Path, first: str, second: str) -> None:
+    assert cached(db_path, first).get(second, AGENT) is None
+
+
+def test_near_matches_are_opt_in_and_need_the_same_numbers(db_path: Path) -> None:
+    cache = cached(db_path, "What are the top-selling products in 2024?", similarity_threshold=0.8)
+    assert cache.get("top selling product in 2024", AGENT) is not None
+    assert cache.get("top selling product in 2023", AGENT) is None
+
+
+def test_answers_belong_to_their_agent_and_database(db_path: Path) -> None:
+    cache = cached(db_path, "sales by region")
+    assert cache.get("sales by region", "another-agent") is None
+
+    db_path.write_bytes(b"sales, rebuilt")
+    assert cache.get("sales by region", AGENT) is None
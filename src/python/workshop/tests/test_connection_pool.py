@@ -0,0 +1,75 @@
+import asyncio
+import sqlite3
+from pathlib import Path
+
+import aiosqlite
+import pytest
+
+from connection_pool import ConnectionPool
+
+
+def pool_for(db: Path) -> ConnectionPool:
+    return ConnectionPool(f"file:{db}?mode=ro", size=1, progress_steps=100)
+
+
+def test_failed_query_returns_connection_at_once(sales_db: Path) -> None:
+    async def scenario() -> None:
+        pool = pool_for(sales_db)
+        await pool.open()
+        try:
+            for _ in range(3):
+                with pytest.raises(aiosqlite.OperationalError):
+                    async with pool.acquire(timeout_seconds=5) as conn:
+                        await conn.execute("SELECT missing FROM sales_data")
+                assert not pool._recovering
+                assert pool._idle.qsize() == 1
+            async with pool.acquire() as conn:
+                assert pool._connections[conn].expires_at is None
+        finally:
+            await pool.close()
+
+    asyncio.run(scenario())
+
+
+def test_deadline_interrupt_returns_connection_at_once(sales_db: Path) -> None:
+    async def scenario() -> None:
+        pool = pool_for(sales_db)
+        await pool.open()
+        try:
+            with pytest.raises(sqlite3.OperationalError, match="interrupted"):
+                async with pool.acquire(timeout_seconds=0.01) as conn:
+                    await conn.execute("SELECT COUNT(*) FROM sales_data a, sales_data b")
+            assert not pool._recovering
+            async with pool.acquire() as conn:
+                async with conn.execute("SELECT 1") as cursor:
+                    assert await cursor.fetchone() == (1,)
+        finally:
+            await pool.close()
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_borrower_recovers_connection(sales_db: Path) -> None:
+    async def borrow(pool: ConnectionPool, started: asyncio.Event) -> None:
+        async with pool.acquire() as conn:
+            started.set()
+            await conn.execute("SELECT COUNT(*) FROM sales_data a, sales_data b")
+
+    async def scenario() -> None:
+        pool = pool_for(sales_db)
+        await pool.open()
+        try:
+            started = asyncio.Event()
+            task = asyncio.create_task(borrow(pool, started))
+            await started.wait()
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+            assert pool._recovering
+            async with pool.acquire() as conn:
+                async with conn.execute("SELECT 1") as cursor:
+                    assert await cursor.fetchone() == (1,)
+        finally:
+            await pool.close()
+
+    asyncio.run(scenario())
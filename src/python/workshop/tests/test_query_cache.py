@@ -0,0 +1,41 @@
+from pathlib import Path
+
+import pytest
+
+from query_cache import QueryCache
+
+
+@pytest.mark.parametrize(
+    ("first", "second"),
+    [
+        ("SELECT region, SUM(revenue) FROM sales_data", "select region , sum( revenue )\nFROM   sales_data;"),
+        ("SELECT * FROM sales_data WHERE year = 2024", "SELECT * FROM sales_data WHERE year=2024"),
+    ],
+)
+def test_formatting_differences_share_a_key(first: str, second: str) -> None:
+    assert QueryCache.normalize(first) == QueryCache.normalize(second)
+
+
+@pytest.mark.parametrize(
+    ("first", "second"),
+    [
+        ("SELECT 1 - -1", "SELECT 1 --1"),
+        ("SELECT 4 / 2", "SELECT 4 /* 2 */"),
+        ("SELECT a -- note\nFROM sales_data", "SELECT a -- note FROM sales_data"),
+        ("SELECT * FROM sales_data WHERE region = 'EUROPE'", "SELECT * FROM sales_data WHERE region = 'europe'"),
+        ("SELECT * FROM sales_data WHERE region = 'A  B'", "SELECT * FROM sales_data WHERE region = 'A B'"),
+    ],
+)
+def test_different_queries_get_different_keys(first: str, second: str) -> None:
+    assert QueryCache.normalize(first) != QueryCache.normalize(second)
+
+
+def test_results_are_dropped_when_the_database_changes(tmp_path: Path) -> None:
+    db_path = tmp_path / "sales.db"
+    db_path.write_bytes(b"v1")
+    cache = QueryCache(db_path)
+    cache.put("SELECT 1", "result")
+    assert cache.get("select 1") == "result"
+
+    db_path.write_bytes(b"version 2")
+    assert cache.get("SELECT 1") is None
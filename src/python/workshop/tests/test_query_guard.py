@@ -0,0 +1,46 @@
+import asyncio
+from pathlib import Path
+
+import aiosqlite
+import pytest
+
+from query_guard import QueryPlanGuard
+
+MAX_ESTIMATED_ROWS = 50_000_000
+
+
+def check(db_path: Path, sqlite_query: str) -> tuple[bool, float]:
+    async def run() -> tuple[bool, float]:
+        guard = QueryPlanGuard(MAX_ESTIMATED_ROWS)
+        async with aiosqlite.connect(f"file:{db_path}?mode=ro", uri=True) as conn:
+            plan_check = await guard.check(conn, sqlite_query)
+        return plan_check.exceeded, plan_check.estimated_rows
+
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize(
+    "sqlite_query",
+    [
+        "SELECT region, SUM(revenue) FROM sales_data GROUP BY region",
+        "SELECT * FROM sales_data WHERE id = 42",
+        "SELECT region, total_revenue FROM sales_rollup_region_year_month_category WHERE year = 2024",
+        "SELECT product_type FROM sales_data WHERE revenue > (SELECT AVG(revenue) FROM sales_data)",
+    ],
+)
+def test_ordinary_queries_are_allowed(sales_db: Path, sqlite_query: str) -> None:
+    exceeded, _ = check(sales_db, sqlite_query)
+    assert not exceeded
+
+
+@pytest.mark.parametrize(
+    "sqlite_query",
+    [
+        "SELECT a.region FROM sales_data a, sales_data b WHERE a.revenue > b.revenue",
+        "SELECT a.region FROM sales_data a JOIN sales_data b ON a.revenue < b.revenue",
+        "SELECT id, (SELECT COUNT(*) FROM sales_data b WHERE b.revenue > a.revenue) FROM sales_data a",
+    ],
+)
+def test_self_joins_and_correlated_scans_are_rejected(sales_db: Path, sqlite_query: str) -> None:
+    exceeded, estimated_rows = check(sales_db, sqlite_query)
+    assert exceeded, estimated_rows
@@ -0,0 +1,81 @@
+import csv
+import io
+import json
+
+import pytest
+
+from result_encoder import (
+    encode_columnar_json_within,
+    encode_csv_within,
+    encode_split_json,
+    encode_split_json_within,
+)
+
+COLUMNS = ["region", "revenue", "orders", "discount", "note"]
+ROWS = [
+    ("EUROPE", 1234.5, 3, 0.1, "tents/poles"),
+    ("ASIA-PACIFIC", 0.1 + 0.2, None, 123456789.123456789, 'quoted "text"'),
+    ("EUROPE", -0.000123456789012, 7, 1e20, "café ☃"),
+    ("NORTH AMERICA", 98765.4321, 12, 5e-17, None),
+    ("EUROPE", 3.0, 1, 2.5, "tab\tand\nnewline"),
+]
+# Few distinct regions, so the columnar encoding lists each region once.
+REPEATED_ROWS = [(region, revenue, orders, 0.5, None) for region, revenue, orders, *_ in ROWS] * 4
+
+
+@pytest.mark.parametrize(
+    "rows",
+    [
+        ROWS,
+        [(1, True, None), (2, False, None)],
+        [(1, 2.0, "a"), (None, 3, "b")],
+        [(1, True, 1.5), (2, None, 2.5)],
+        [],
+    ],
+)
+def test_split_json_matches_pandas(rows: list[tuple]) -> None:
+    pd = pytest.importorskip("pandas")
+    columns = COLUMNS[: len(rows[0])] if rows else COLUMNS
+    expected = pd.DataFrame(rows, columns=columns).to_json(index=False, orient="split")
+    assert encode_split_json(columns, rows) == expected
+
+
+def test_split_json_within_budget_keeps_whole_leading_rows() -> None:
+    full = encode_split_json(COLUMNS, ROWS)
+    encoded, rows_encoded = encode_split_json_within(COLUMNS, ROWS, len(full) - 1)
+    assert len(encoded) <= len(full) - 1
+    assert rows_encoded == len(ROWS) - 1
+    assert json.loads(encoded)["data"] == json.loads(full)["data"][:rows_encoded]
+
+
+def test_csv_round_trips() -> None:
+    encoded, rows_encoded = encode_csv_within(COLUMNS, ROWS, 10_000)
+    assert rows_encoded == len(ROWS)
+    header, *lines = list(csv.reader(io.StringIO(encoded)))
+    assert header == COLUMNS
+    assert [line[0] for line in lines] == [row[0] for row in ROWS]
+    # Floats keep ten decimals, like the split JSON.
+    assert [float(line[1]) for line in lines] == pytest.approx([row[1] for row in ROWS], abs=1e-10)
+    assert lines[1][2] == ""
+    assert lines[4][4] == ROWS[4][4]
+
+
+def test_columnar_json_round_trips() -> None:
+    encoded, rows_encoded = encode_columnar_json_within(COLUMNS, REPEATED_ROWS, 10_000, decimals=2)
+    document = json.loads(encoded)
+    assert rows_encoded == document["row_count"] == len(REPEATED_ROWS)
+    region = document["data"]["region"]
+    assert [region["values"][code] for code in region["codes"]] == [row[0] for row in REPEATED_ROWS]
+    assert document["data"]["revenue"] == [round(row[1], 2) for row in REPEATED_ROWS]
+    assert document["data"]["orders"] == [row[2] for row in REPEATED_ROWS]
+
+
+def test_columnar_json_within_budget_drops_unused_dictionary_values() -> None:
+    rows = REPEATED_ROWS[:6]
+    full, _ = encode_columnar_json_within(COLUMNS, rows, 10_000)
+    encoded, rows_encoded = encode_columnar_json_within(COLUMNS, rows, len(full) - 20)
+    document = json.loads(encoded)
+    assert 0 < rows_encoded < len(rows)
+    region = document["data"]["region"]
+    assert len(region["codes"]) == rows_encoded
+    assert sorted(set(region["codes"])) == list(range(len(region["values"])))
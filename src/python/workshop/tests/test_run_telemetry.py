@@ -0,0 +1,36 @@
+from run_telemetry import MESSAGES_PER_TURN, RunRecord, RunTelemetry
+
+
+def run_record(thread_messages: int) -> RunRecord:
+    return RunRecord(
+        thread_id="thread",
+        run_id="run",
+        status="completed",
+        prompt_tokens=100,
+        completion_tokens=10,
+        first_token_seconds=0.1,
+        run_seconds=1.0,
+        thread_messages=thread_messages,
+    )
+
+
+def test_thread_messages_count_runs_and_messages_added_without_a_run() -> None:
+    telemetry = RunTelemetry()
+    assert telemetry.thread_messages("thread") == 1
+
+    # A replayed answer before the first run.
+    telemetry.add_messages("thread", MESSAGES_PER_TURN)
+    assert telemetry.thread_messages("thread") == 3
+
+    telemetry.record(run_record(3))
+    assert telemetry.thread_messages("thread") == 5
+
+    telemetry.add_messages("thread", MESSAGES_PER_TURN)
+    telemetry.add_messages("thread", MESSAGES_PER_TURN)
+    assert telemetry.thread_messages("thread") == 9
+
+    telemetry.record(run_record(9))
+    assert telemetry.thread_messages("thread") == 11
+
+    telemetry.forget("thread")
+    assert telemetry.thread_messages("thread") == 1
@@ -0,0 +1,58 @@
+import asyncio
+import json
+import sqlite3
+from contextlib import closing
+from pathlib import Path
+
+import pytest
+
+from config import Config
+from sales_columns import metric_column
+from sales_data import SalesData
+from utilities import Utilities
+
+# (metric, group_by, filters, top_n), as aggregate_sales takes them.
+AGGREGATES = [
+    ("revenue", [], {}, 10),
+    ("revenue", ["region"], {}, 10),
+    ("number_of_orders", ["product_type"], {}, 5),
+    ("shipping_cost", ["region", "year"], {}, 0),
+    ("revenue", ["month"], {"region": "europe"}, 0),
+    ("revenue", ["year"], {"region": ["EUROPE", "asia "]}, 0),
+    ("count", [], {"region": " Europe"}, 10),
+    ("count", ["product_type", "month"], {"year": [2023, 2024]}, 5),
+    ("revenue", [], {"region": "ATLANTIS"}, 10),
+    ("count", [], {"region": "ATLANTIS"}, 10),
+    ("number_of_orders", ["region"], {"region": "ATLANTIS"}, 10),
+]
+
+
+def aggregate_all(db_path: Path) -> list[str]:
+    async def run() -> list[str]:
+        sales_data = SalesData(Utilities(), db_path, shard_paths=[])
+        sales_data.query_cache.max_entries = 0
+        await sales_data.connect()
+        try:
+            if Config.COLUMNAR_ENGINE != "off":
+                assert await sales_data.load_columnar() is not None
+            return [await sales_data.aggregate_sales(*arguments) for arguments in AGGREGATES]
+        finally:
+            await sales_data.close()
+
+    return asyncio.run(run())
+
+
+def test_columnar_engine_matches_sql(sales_db: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(Config, "COLUMNAR_ENGINE", "off")
+    sql_results = aggregate_all(sales_db)
+    monkeypatch.setattr(Config, "COLUMNAR_ENGINE", "memory")
+    columnar_results = aggregate_all(sales_db)
+    for arguments, sql_result, columnar_result in zip(AGGREGATES, sql_results, columnar_results):
+        assert json.loads(columnar_result) == json.loads(sql_result), arguments
+
+
+def test_metric_columns_are_named_like_the_rollup_columns(sales_db: Path) -> None:
+    with closing(sqlite3.connect(sales_db)) as conn:
+        rollup_columns = {row[1] for row in conn.execute("PRAGMA table_info(sales_rollup_region_year_month_category)")}
+    for metric in ("revenue", "shipping_cost", "number_of_orders", "count"):
+        assert metric_column(metric) in rollup_columns
@@ -0,0 +1,116 @@
+import asyncio
+import json
+from pathlib import Path
+from typing import Optional
+
+import pytest
+
+from config import Config
+from sales_data import QueryResult, SalesData
+from sales_shards import ShardQueryPlan, decompose_aggregate, merge_partials
+from utilities import Utilities
+from workload_log import OUTCOME_PLAN_REJECTED
+
+AGGREGATE_QUERIES = [
+    "SELECT ROUND(SUM(revenue), 2) AS revenue, COUNT(*) AS sales FROM sales_data",
+    "SELECT region, SUM(revenue) AS revenue FROM sales_data GROUP BY region ORDER BY revenue DESC",
+    "SELECT product_type, AVG(number_of_orders) AS orders FROM sales_data GROUP BY product_type "
+    "ORDER BY orders DESC, product_type LIMIT 10",
+    "SELECT region, month, MAX(revenue) AS top, MIN(discount) FROM sales_data WHERE discount > 5 "
+    "GROUP BY region, month ORDER BY region, month",
+    "SELECT product_type, COUNT(*) AS sales FROM sales_data GROUP BY product_type "
+    "HAVING SUM(revenue) > 1000 ORDER BY sales DESC, product_type LIMIT 5",
+    "SELECT year, ROUND(TOTAL(shipping_cost) / COUNT(*), 4) AS average FROM sales_data GROUP BY year ORDER BY year",
+]
+VIEW_QUERIES = [
+    "SELECT DISTINCT region FROM sales_data ORDER BY region",
+    "SELECT region, ROUND(SUM(total_revenue), 2) AS revenue FROM sales_rollup_region_year_month_category "
+    "GROUP BY region ORDER BY region",
+    "SELECT region, SUM(revenue) AS revenue FROM sales_data -- per region\nGROUP BY region ORDER BY region",
+]
+
+
+def run_queries(queries: list[str], db_path: Optional[Path] = None, shard_paths: Optional[list[Path]] = None) -> list:
+    async def run() -> list[QueryResult]:
+        sales_data = SalesData(Utilities(), db_path, shard_paths=shard_paths or [])
+        sales_data.query_cache.max_entries = 0
+        await sales_data.connect()
+        try:
+            return [await sales_data.run_query(query) for query in queries]
+        finally:
+            await sales_data.close()
+
+    return asyncio.run(run())
+
+
+def rows(results: list[QueryResult]) -> list:
+    return [json.loads(result.json).get("data") for result in results]
+
+
+@pytest.mark.parametrize("fanout", [True, False])
+def test_shards_return_the_same_results_as_one_database(
+    sales_db: Path, sales_shards: list[Path], fanout: bool, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(Config, "SHARD_FANOUT", fanout)
+    merges = []
+    monkeypatch.setattr("sales_data.merge_partials", lambda *args: merges.append(args) or merge_partials(*args))
+    queries = AGGREGATE_QUERIES + VIEW_QUERIES
+    expected = rows(run_queries(queries, db_path=sales_db))
+    assert all(expected)
+    assert rows(run_queries(queries, shard_paths=sales_shards)) == expected
+    # Every aggregate ran on the shards, rather than falling back to the views.
+    assert len(merges) == (len(AGGREGATE_QUERIES) if fanout else 0)
+
+
+@pytest.mark.parametrize("sqlite_query", AGGREGATE_QUERIES)
+def test_aggregates_are_decomposed(sqlite_query: str) -> None:
+    assert decompose_aggregate(sqlite_query) is not None
+
+
+@pytest.mark.parametrize("sqlite_query", VIEW_QUERIES)
+def test_other_queries_are_left_to_the_views(sqlite_query: str) -> None:
+    assert decompose_aggregate(sqlite_query) is None
+
+
+def test_database_info_describes_one_logical_database(sales_db: Path, sales_shards: list[Path]) -> None:
+    async def info(**paths: object) -> str:
+        sales_data = SalesData(Utilities(), **paths)
+        await sales_data.connect()
+        try:
+            return await sales_data.get_database_info()
+        finally:
+            await sales_data.close()
+
+    assert asyncio.run(info(shard_paths=sales_shards)) == asyncio.run(info(db_path=sales_db, shard_paths=[]))
+
+
+def test_plan_guard_rejects_self_joins_over_shards(sales_shards: list[Path]) -> None:
+    (result,) = run_queries(
+        ["SELECT a.region FROM sales_data a, sales_data b WHERE a.revenue > b.revenue"], shard_paths=sales_shards
+    )
+    assert result.outcome == OUTCOME_PLAN_REJECTED
+
+
+def test_shard_worker_failures_fall_back_to_the_views(
+    sales_db: Path, sales_shards: list[Path], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    def fail_to_start(self: SalesData) -> None:
+        raise RuntimeError("An attempt has been made to start a new process before bootstrapping finished.")
+
+    monkeypatch.setattr(SalesData, "_ensure_shard_workers", fail_to_start)
+    expected = rows(run_queries(AGGREGATE_QUERIES[:2], db_path=sales_db))
+    assert rows(run_queries(AGGREGATE_QUERIES[:2], shard_paths=sales_shards)) == expected
+
+
+def test_fan_out_leaves_the_pooled_connections_free(sales_shards: list[Path], monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(Config, "SHARD_FANOUT", True)
+    free_connections = []
+    run_on_shards = SalesData._run_on_shards
+
+    async def record_free_connections(self: SalesData, plan: ShardQueryPlan) -> Optional[tuple]:
+        free_connections.append(self.pool._idle.qsize())
+        return await run_on_shards(self, plan)
+
+    monkeypatch.setattr(SalesData, "_run_on_shards", record_free_connections)
+    run_queries(AGGREGATE_QUERIES[:1], shard_paths=sales_shards)
+    assert free_connections == [Config.SQLITE_POOL_SIZE]
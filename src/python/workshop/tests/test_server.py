@@ -0,0 +1,61 @@
+import asyncio
+
+import aiohttp
+import pytest
+from aiohttp import WSCloseCode, WSMsgType, web
+from aiohttp.test_utils import TestClient, TestServer
+
+import main
+import server
+from agents_emulator import EmulatedAgentsClient
+from config import Config
+from thread_pool import ThreadPool
+
+
+@pytest.fixture
+def app(monkeypatch: pytest.MonkeyPatch) -> web.Application:
+    """The server's routes with sessions backed by the emulator, skipping agent startup."""
+    monkeypatch.setattr(main, "thread_pool", ThreadPool(EmulatedAgentsClient(request_latency_seconds=0)))
+    app = server.create_app()
+    app.on_startup.clear()
+    app.on_cleanup.clear()
+    return app
+
+
+async def connect(app: web.Application, scenario) -> None:
+    async with TestClient(TestServer(app)) as client:
+        await scenario(client)
+
+
+def test_full_server_refuses_websocket_before_upgrade(app: web.Application, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(Config, "SERVER_MAX_SESSIONS", 0)
+
+    async def scenario(client: TestClient) -> None:
+        with pytest.raises(aiohttp.WSServerHandshakeError) as error:
+            await client.ws_connect("/ws")
+        assert error.value.status == 503
+
+    asyncio.run(connect(app, scenario))
+    assert app[server.SESSIONS_KEY] == {}
+
+
+def test_idle_sessions_expire(app: web.Application, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(Config, "SERVER_SESSION_IDLE_SECONDS", 0.2)
+
+    async def scenario(client: TestClient) -> None:
+        expiry = asyncio.create_task(server.expire_idle_sessions(app))
+        try:
+            session_id = (await (await client.post("/sessions")).json())["session_id"]
+            ws = await client.ws_connect("/ws")
+            assert len(app[server.SESSIONS_KEY]) == 2
+
+            msg = await asyncio.wait_for(ws.receive(), timeout=5)
+            assert msg.type == WSMsgType.CLOSE
+            assert msg.data == WSCloseCode.GOING_AWAY
+            await ws.close()
+            assert app[server.SESSIONS_KEY] == {}
+            assert (await client.delete(f"/sessions/{session_id}")).status == 404
+        finally:
+            expiry.cancel()
+
+    asyncio.run(connect(app, scenario))
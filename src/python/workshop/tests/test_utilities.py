@@ -0,0 +1,14 @@
+from pathlib import Path
+
+from utilities import PARTIAL_DOWNLOAD_SUFFIX, Utilities
+
+
+def test_downloaded_files_are_found_by_their_exact_id(tmp_path: Path) -> None:
+    (tmp_path / "chart.assistant-abcd.png").write_bytes(b"png")
+    (tmp_path / f".chart.assistant-abc.png{PARTIAL_DOWNLOAD_SUFFIX}").write_bytes(b"partial")
+    utilities = Utilities()
+    assert utilities._downloaded_file(tmp_path, "assistant-abc") is None
+    assert utilities._downloaded_file(tmp_path, "assistant-abcd") == tmp_path / "chart.assistant-abcd.png"
+
+    (tmp_path / "sales.v2.assistant-abc.csv").write_bytes(b"csv")
+    assert utilities._downloaded_file(tmp_path, "assistant-abc") == tmp_path / "sales.v2.assistant-abc.csv"
@@ -0,0 +1,124 @@
+import asyncio
+import logging
+from collections import deque
+from typing import Optional
+
+from azure.ai.agents.aio import AgentsClient
+from azure.ai.agents.models import AgentThread
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class ThreadPool:
+    """Keep empty agent threads ready so a new session can start without waiting for threads.create.
+
+    Once started, the pool is refilled in the background whenever a thread is handed out. Returned threads that
+    were never used go back into the pool; the rest are deleted lazily, in concurrent batches, once
+    ``delete_batch_size`` have built up or ``delete_interval_seconds`` has passed. Before ``start`` is called,
+    ``acquire`` simply creates a thread.
+    """
+
+    def __init__(
+        self,
+        agents_client: AgentsClient,
+        size: int = Config.THREAD_POOL_SIZE,
+        delete_batch_size: int = Config.THREAD_POOL_DELETE_BATCH_SIZE,
+        delete_interval_seconds: float = Config.THREAD_POOL_DELETE_INTERVAL_SECONDS,
+    ) -> None:
+        self.agents_client = agents_client
+        self.size = size
+        self.delete_batch_size = delete_batch_size
+        self.delete_interval_seconds = delete_interval_seconds
+        self.hits = 0
+        self.misses = 0
+        self._started = False
+        self._ready: deque[AgentThread] = deque()
+        self._refill_task: Optional[asyncio.Task] = None
+        self._pending_deletes: list[str] = []
+        self._delete_timer: Optional[asyncio.TimerHandle] = None
+        self._delete_tasks: set[asyncio.Task] = set()
+
+    @property
+    def ready(self) -> int:
+        return len(self._ready)
+
+    async def start(self, wait: bool = True) -> None:
+        """Start keeping the pool full, optionally waiting until it first is."""
+        self._started = True
+        self._refill()
+        if wait and self._refill_task:
+            await asyncio.shield(self._refill_task)
+
+    def _refill(self) -> None:
+        if self._started and (self._refill_task is None or self._refill_task.done()):
+            self._refill_task = asyncio.create_task(self._fill())
+
+    async def _fill(self) -> None:
+        while self._started and len(self._ready) < self.size:
+            needed = self.size - len(self._ready)
+            results = await asyncio.gather(
+                *(self.agents_client.threads.create() for _ in range(needed)), return_exceptions=True
+            )
+            errors = [result for result in results if isinstance(result, Exception)]
+            self._ready.extend(result for result in results if not isinstance(result, Exception))
+            if errors:
+                # Leave the pool short rather than retrying in a tight loop; the next acquire tries again.
+                logger.error("Unable to create %d pooled thread(s): %s", len(errors), errors[0])
+                return
+
+    async def acquire(self) -> AgentThread:
+        """Hand out a ready thread, or create one if the pool is empty."""
+        if self._ready:
+            self.hits += 1
+            thread = self._ready.popleft()
+            self._refill()
+            return thread
+        self.misses += 1
+        self._refill()
+        return await self.agents_client.threads.create()
+
+    def release(self, thread: AgentThread, used: bool = True) -> None:
+        """Return a thread. Unused threads are pooled again; used ones are deleted in the next batch."""
+        if not used and self._started and len(self._ready) < self.size:
+            self._ready.append(thread)
+            return
+        self._pending_deletes.append(thread.id)
+        if len(self._pending_deletes) >= self.delete_batch_size:
+            self._start_deletes()
+        elif self._delete_timer is None:
+            self._delete_timer = asyncio.get_running_loop().call_later(
+                self.delete_interval_seconds, self._start_deletes
+            )
+
+    def _start_deletes(self) -> None:
+        if self._delete_timer is not None:
+            self._delete_timer.cancel()
+            self._delete_timer = None
+        if not self._pending_deletes:
+            return
+        thread_ids, self._pending_deletes = self._pending_deletes, []
+        task = asyncio.create_task(self._delete_threads(thread_ids))
+        self._delete_tasks.add(task)
+        task.add_done_callback(self._delete_tasks.discard)
+
+    async def _delete_threads(self, thread_ids: list[str]) -> None:
+        results = await asyncio.gather(
+            *(self.agents_client.threads.delete(thread_id) for thread_id in thread_ids), return_exceptions=True
+        )
+        for thread_id, result in zip(thread_ids, results):
+            if isinstance(result, Exception):
+                logger.error("Unable to delete thread %s: %s", thread_id, result)
+
+    async def close(self) -> None:
+        """Stop refilling, then delete the pooled threads along with any returned ones still pending."""
+        self._started = False
+        if self._refill_task is not None:
+            await asyncio.gather(self._refill_task, return_exceptions=True)
+            self._refill_task = None
+        self._pending_deletes.extend(thread.id for thread in self._ready)
+        self._ready.clear()
+        self._start_deletes()
+        if self._delete_tasks:
+            await asyncio.gather(*self._delete_tasks)
@@ -0,0 +1,136 @@
+import asyncio
+import sys
+from pathlib import Path
+from typing import Optional, TextIO
+
+from aiohttp import web
+
+from config import Config
+from terminal_colors import TerminalColors as tc
+
+
+class TokenSink:
+    """Destination for rendered tokens. Writes receive coalesced text, in stream order."""
+
+    async def write(self, text: str) -> None:
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+
+class TerminalSink(TokenSink):
+    """Write tokens to the terminal in colour, with one escape pair and one flush per write."""
+
+    def __init__(self, stream: Optional[TextIO] = None, color: str = tc.BLUE) -> None:
+        self.stream = stream
+        self.color = color
+
+    async def write(self, text: str) -> None:
+        # Resolved on each write so redirected stdout is honoured.
+        stream = self.stream or sys.stdout
+        stream.write(f"{self.color}{text}{tc.RESET}")
+        stream.flush()
+
+
+class FileSink(TokenSink):
+    """Append plain tokens to a text file."""
+
+    def __init__(self, path: Path) -> None:
+        self.file = path.open("a", encoding="utf-8")
+
+    async def write(self, text: str) -> None:
+        self.file.write(text)
+        self.file.flush()
+
+    async def close(self) -> None:
+        self.file.close()
+
+
+class WebSocketSink(TokenSink):
+    """Send tokens as {"type": "delta", "text": ...} frames.
+
+    Sending waits while the socket's write buffer is full, so a slow client pauses the stream feeding it. Once the
+    client has disconnected, writes are dropped so the stream can finish.
+    """
+
+    def __init__(self, ws: web.WebSocketResponse) -> None:
+        self.ws = ws
+        self.connected = True
+
+    async def write(self, text: str) -> None:
+        if not self.connected:
+            return
+        try:
+            await self.ws.send_json({"type": "delta", "text": text})
+        except (ConnectionResetError, RuntimeError):
+            self.connected = False
+
+
+class NullSink(TokenSink):
+    """Discard tokens, for benchmarks and headless runs."""
+
+    async def write(self, text: str) -> None:
+        pass
+
+
+class TokenRenderer:
+    """Coalesce streamed deltas and write them to a sink in batches.
+
+    Buffered text is written once it reaches ``max_chars`` or has waited ``window_seconds``, whichever comes first,
+    and whenever ``flush`` is called. A window of 0 writes every delta as it arrives.
+    """
+
+    def __init__(
+        self,
+        sink: TokenSink,
+        window_seconds: float = Config.TOKEN_RENDER_WINDOW_SECONDS,
+        max_chars: int = Config.TOKEN_RENDER_MAX_CHARS,
+    ) -> None:
+        self.sink = sink
+        self.window_seconds = window_seconds
+        self.max_chars = max_chars
+        self.writes = 0
+        self._parts: list[str] = []
+        self._size = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._timed_flushes: set[asyncio.Task] = set()
+        # Keeps writes in buffer order when a timed flush and a size flush overlap.
+        self._write_lock = asyncio.Lock()
+
+    async def add(self, text: str) -> None:
+        if not text:
+            return
+        self._parts.append(text)
+        self._size += len(text)
+        if self._size >= self.max_chars or self.window_seconds <= 0:
+            await self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.window_seconds, self._flush_on_timer)
+
+    def _flush_on_timer(self) -> None:
+        self._timer = None
+        task = asyncio.ensure_future(self.flush())
+        self._timed_flushes.add(task)
+        task.add_done_callback(self._timed_flushes.discard)
+
+    async def flush(self) -> None:
+        """Write any buffered text now."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._parts:
+            return
+        text = "".join(self._parts)
+        self._parts.clear()
+        self._size = 0
+        async with self._write_lock:
+            self.writes += 1
+            await self.sink.write(text)
+
+    async def close(self) -> None:
+        """Flush, wait for pending timed flushes and close the sink."""
+        await self.flush()
+        if self._timed_flushes:
+            await asyncio.gather(*self._timed_flushes)
+        await self.sink.close()
@@ -0,0 +1,70 @@
+import asyncio
+import json
+import logging
+from typing import Any, Optional
+
+from azure.ai.agents.models import AsyncFunctionTool, RequiredFunctionToolCall, ToolOutput
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class ToolDispatcher:
+    """Run the function calls of a run step concurrently, with a bound on concurrency and a timeout per call.
+
+    A call that fails or times out only affects its own output: it returns a JSON error to the model and the other
+    calls of the step still complete. The bound is shared by every run using the dispatcher, so parallel sessions
+    cannot queue more queries than the connection pool can serve at once.
+    """
+
+    def __init__(
+        self,
+        functions: AsyncFunctionTool,
+        max_concurrency: int = Config.TOOL_CALL_CONCURRENCY,
+        timeout_seconds: float = Config.TOOL_CALL_TIMEOUT_SECONDS,
+        timeout_overrides: Optional[dict[str, float]] = None,
+    ) -> None:
+        self.functions = functions
+        self.max_concurrency = max_concurrency
+        self.timeout_seconds = timeout_seconds
+        self.timeout_overrides = Config.TOOL_CALL_TIMEOUT_OVERRIDES if timeout_overrides is None else timeout_overrides
+        self.calls = 0
+        self.timeouts = 0
+        self._slots = asyncio.Semaphore(max_concurrency)
+
+    def _timeout_for(self, tool_call: RequiredFunctionToolCall) -> float:
+        return self.timeout_overrides.get(tool_call.function.name, self.timeout_seconds)
+
+    def _timeout_error(self, tool_call: RequiredFunctionToolCall) -> str:
+        return json.dumps(
+            {
+                "error": (
+                    f"Function '{tool_call.function.name}' did not finish within "
+                    f"{self._timeout_for(tool_call)} seconds."
+                ),
+                "error_type": "tool_timeout",
+                "suggestion": "Retry with a simpler request, or split it into smaller ones.",
+            }
+        )
+
+    async def _execute(self, tool_call: RequiredFunctionToolCall) -> ToolOutput:
+        async with self._slots:
+            self.calls += 1
+            try:
+                # AsyncFunctionTool.execute already turns exceptions raised by the function into a JSON error.
+                output: Any = await asyncio.wait_for(self.functions.execute(tool_call), self._timeout_for(tool_call))
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                logger.warning(
+                    "Function call %s timed out after %s s.", tool_call.function.name, self._timeout_for(tool_call)
+                )
+                output = self._timeout_error(tool_call)
+            except Exception as e:
+                output = json.dumps({"error": f"Error executing function '{tool_call.function.name}': {e}"})
+        return ToolOutput(tool_call_id=tool_call.id, output=str(output))
+
+    async def execute(self, tool_calls: list[Any]) -> list[ToolOutput]:
+        """Execute the step's function calls and return their outputs in the order of the calls."""
+        function_calls = [tool_call for tool_call in tool_calls if tool_call.type == "function"]
+        return list(await asyncio.gather(*(self._execute(tool_call) for tool_call in function_calls)))
@@ -0,0 +1,234 @@
+"""
+Lightweight tracing in the style of OpenTelemetry spans, exported to a JSON Lines file or the console.
+
+Spans nest through a context variable, so a span started while another is current becomes its child, including across
+awaits and in tasks created inside it. When tracing is off, ``tracer.span`` returns a shared no-op span and costs
+about as much as a function call.
+
+    with tracer.span("sql", query=query) as span:
+        ...
+        span.set_attribute("rows", rows)
+"""
+
+import atexit
+import contextvars
+import functools
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Optional, TextIO, TypeVar
+
+from config import Config
+
+T = TypeVar("T")
+
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    """A timed operation with attributes. Ending it sends it to the tracer's exporter."""
+
+    recording = True
+
+    def __init__(self, tracer: "Tracer", name: str, parent: Optional["Span"], attributes: dict[str, Any]) -> None:
+        self.tracer = tracer
+        self.name = name
+        self.parent = parent
+        self.trace_id = parent.trace_id if parent else os.urandom(16).hex()
+        self.span_id = os.urandom(8).hex()
+        self.attributes = attributes
+        self.status = "OK"
+        self.start_ns = time.time_ns()
+        self._start = time.perf_counter()
+        self._ended = False
+        self._token: Optional[contextvars.Token] = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def set_attributes(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+    def record_error(self, error: BaseException) -> None:
+        self.status = "ERROR"
+        self.attributes["error"] = f"{type(error).__name__}: {error}"
+
+    def activate(self) -> "Span":
+        """Make this the current span, so spans started from here on are its children, until it ends."""
+        _current_span.set(self)
+        return self
+
+    def end(self) -> None:
+        if self._ended:
+            return
+        self._ended = True
+        duration_ms = (time.perf_counter() - self._start) * 1000
+        # Restore the parent if this span is still current. Spans ended from event callbacks may be ended in a
+        # different order from the one they were started in, so the context token is not always usable.
+        if _current_span.get() is self:
+            _current_span.set(self.parent)
+        self.tracer.export(
+            {
+                "name": self.name,
+                "trace_id": self.trace_id,
+                "span_id": self.span_id,
+                "parent_span_id": self.parent.span_id if self.parent else None,
+                "start_time_unix_nano": self.start_ns,
+                "end_time_unix_nano": self.start_ns + int(duration_ms * 1_000_000),
+                "duration_ms": round(duration_ms, 3),
+                "status": self.status,
+                "attributes": self.attributes,
+            }
+        )
+
+    def __enter__(self) -> "Span":
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type: Any, exc: Optional[BaseException], traceback: Any) -> None:
+        if exc is not None:
+            self.record_error(exc)
+        self.end()
+        # Restore whatever was current on entry, even if a child span was left active.
+        try:
+            _current_span.reset(self._token)
+        except ValueError:
+            pass
+
+
+class NoopSpan:
+    """Stands in for every span while tracing is off."""
+
+    recording = False
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def set_attributes(self, **attributes: Any) -> None:
+        pass
+
+    def record_error(self, error: BaseException) -> None:
+        pass
+
+    def activate(self) -> "NoopSpan":
+        return self
+
+    def end(self) -> None:
+        pass
+
+    def __enter__(self) -> "NoopSpan":
+        return self
+
+    def __exit__(self, exc_type: Any, exc: Optional[BaseException], traceback: Any) -> None:
+        pass
+
+
+NOOP_SPAN = NoopSpan()
+
+
+class SpanExporter:
+    def export(self, span: dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    def shutdown(self) -> None:
+        pass
+
+
+class JsonLinesExporter(SpanExporter):
+    """Append one JSON object per span to a file. Lines are buffered and written out on shutdown or exit."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        # Opened on the first span, so processes that never trace, such as shard workers, leave the file alone.
+        self.file: Optional[TextIO] = None
+
+    def export(self, span: dict[str, Any]) -> None:
+        if self.file is None:
+            self.file = self.path.open("a", encoding="utf-8")
+        self.file.write(json.dumps(span, default=str) + "\n")
+
+    def shutdown(self) -> None:
+        if self.file is not None and not self.file.closed:
+            self.file.close()
+
+
+class ConsoleExporter(SpanExporter):
+    """Print a line per span to stderr, indented by nesting depth, so it does not mix with streamed tokens."""
+
+    def __init__(self, stream: Optional[TextIO] = None) -> None:
+        self.stream = stream
+        self._depths: dict[str, int] = {}
+
+    def export(self, span: dict[str, Any]) -> None:
+        stream = self.stream or sys.stderr
+        depth = self._depths.pop(span["span_id"], 0)
+        attributes = " ".join(f"{key}={value!r}" for key, value in span["attributes"].items())
+        status = "" if span["status"] == "OK" else f" {span['status']}"
+        stream.write(f"[trace] {'  ' * depth}{span['name']} {span['duration_ms']:.1f} ms{status} {attributes}\n")
+
+    def span_started(self, span: Span) -> None:
+        depth = 0
+        parent = span.parent
+        while parent is not None:
+            depth += 1
+            parent = parent.parent
+        self._depths[span.span_id] = depth
+
+
+class Tracer:
+    def __init__(self, exporter: Optional[SpanExporter] = None) -> None:
+        self.exporter = exporter
+
+    @property
+    def enabled(self) -> bool:
+        return self.exporter is not None
+
+    def span(self, name: str, **attributes: Any) -> Span | NoopSpan:
+        """Start a span, a child of the current one. Use it as a context manager, or call activate and end."""
+        if self.exporter is None:
+            return NOOP_SPAN
+        span = Span(self, name, _current_span.get(), attributes)
+        if isinstance(self.exporter, ConsoleExporter):
+            self.exporter.span_started(span)
+        return span
+
+    def export(self, span: dict[str, Any]) -> None:
+        if self.exporter is not None:
+            self.exporter.export(span)
+
+    def shutdown(self) -> None:
+        if self.exporter is not None:
+            self.exporter.shutdown()
+
+
+def traced(name: str) -> Callable[[Callable[..., Awaitable[T]]], Callable[..., Awaitable[T]]]:
+    """Trace every call of a coroutine function in a span with a ``function`` attribute.
+
+    The wrapper keeps the function's name, docstring and signature, so it can still be used as a function tool.
+    """
+
+    def decorator(func: Callable[..., Awaitable[T]]) -> Callable[..., Awaitable[T]]:
+        @functools.wraps(func)
+        async def wrapper(*args: Any, **kwargs: Any) -> T:
+            if tracer.exporter is None:
+                return await func(*args, **kwargs)
+            with tracer.span(name, function=func.__name__):
+                return await func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def _configured_exporter() -> Optional[SpanExporter]:
+    if Config.TRACE_EXPORTER == "console":
+        return ConsoleExporter()
+    if Config.TRACE_EXPORTER == "jsonl":
+        return JsonLinesExporter(Path(Config.TRACE_FILE))
+    return None
+
+
+tracer = Tracer(_configured_exporter())
+atexit.register(tracer.shutdown)
@@ -0,0 +1,97 @@
+import asyncio
+import hashlib
+import json
+import logging
+from pathlib import Path
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+HASH_CHUNK_BYTES = 1024 * 1024
+
+
+def sha256_file(file_path: Path) -> str:
+    digest = hashlib.sha256()
+    with file_path.open("rb") as file:
+        while chunk := file.read(HASH_CHUNK_BYTES):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_json(path: Path) -> dict:
+    """Read a JSON file written by save_json, or return an empty dict if it is missing or unreadable."""
+    try:
+        with path.open("r", encoding="utf-8") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_json(path: Path, data: dict) -> None:
+    """Write JSON to a temporary file and replace the path with it, so readers never see a partial file."""
+    temp_path = path.with_name(f"{path.name}.tmp")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with temp_path.open("w", encoding="utf-8") as file:
+        json.dump(data, file, indent=2)
+    temp_path.replace(path)
+
+
+def vector_store_key(name: str, content_hashes: list[str]) -> str:
+    """Key a vector store by its name and the exact set of file contents in it."""
+    return hashlib.sha256(json.dumps([name, sorted(content_hashes)]).encode("utf-8")).hexdigest()
+
+
+class UploadManifest:
+    """Persisted map from file content to what has already been uploaded to a project.
+
+    Files are keyed by the SHA-256 of their content and purpose, vector stores by their name and file contents, so
+    an unchanged file is never uploaded twice and an identical vector store is reused. Entries are kept per project
+    endpoint, since file and vector store IDs only mean something within one project.
+    """
+
+    def __init__(self, path: Path, endpoint: str) -> None:
+        self.path = path
+        self.endpoint = endpoint
+        self._data: Optional[dict] = None
+        self._lock = asyncio.Lock()
+
+    def _project(self) -> dict:
+        if self._data is None:
+            self._data = load_json(self.path)
+        return self._data.setdefault(self.endpoint, {"files": {}, "vector_stores": {}})
+
+    def _save(self) -> None:
+        try:
+            save_json(self.path, self._data)
+        except OSError as e:
+            logger.debug("Unable to save the upload manifest: %s", e)
+
+    def get_file(self, content_hash: str, purpose: str) -> Optional[dict]:
+        return self._project()["files"].get(f"{content_hash}:{purpose}")
+
+    def get_vector_store(self, key: str) -> Optional[dict]:
+        return self._project()["vector_stores"].get(key)
+
+    def file_ids(self) -> set[str]:
+        """IDs of every uploaded file the manifest tracks, which cleanup should keep."""
+        return {entry["file_id"] for entry in self._project()["files"].values()}
+
+    async def put_file(self, content_hash: str, purpose: str, entry: dict) -> None:
+        async with self._lock:
+            self._project()["files"][f"{content_hash}:{purpose}"] = entry
+            await asyncio.to_thread(self._save)
+
+    async def put_vector_store(self, key: str, entry: dict) -> None:
+        async with self._lock:
+            self._project()["vector_stores"][key] = entry
+            await asyncio.to_thread(self._save)
+
+    async def forget_file(self, content_hash: str, purpose: str) -> None:
+        async with self._lock:
+            self._project()["files"].pop(f"{content_hash}:{purpose}", None)
+            await asyncio.to_thread(self._save)
+
+    async def forget_vector_store(self, key: str) -> None:
+        async with self._lock:
+            self._project()["vector_stores"].pop(key, None)
+            await asyncio.to_thread(self._save)
@@ -1,12 +1,31 @@
+import asyncio
 from pathlib import Path
+from typing import Optional
 
 from azure.ai.agents.aio import AgentsClient
-from azure.ai.agents.models import ThreadMessage
+from azure.ai.agents.models import FileInfo, ThreadMessage, VectorStore
+from azure.core.exceptions import ResourceNotFoundError
 
+from config import Config
 from terminal_colors import TerminalColors as tc
+from tracing import tracer
+from upload_manifest import UploadManifest, sha256_file, vector_store_key
+
+PARTIAL_DOWNLOAD_SUFFIX = ".part"
+# Downloaded chunks are gathered into writes of this size, each made off the event loop.
+DOWNLOAD_WRITE_BUFFER_BYTES = 1024 * 1024
+# A rough average for English text and SQL schemas.
+BYTES_PER_TOKEN = 4
 
 
 class Utilities:
+    def __init__(self) -> None:
+        self._download_semaphore: Optional[asyncio.Semaphore] = None
+        # Download tasks by file ID, kept after completion so a file is only fetched once per process.
+        self._downloads: dict[str, asyncio.Task] = {}
+        self._upload_semaphore: Optional[asyncio.Semaphore] = None
+        self._upload_manifest: Optional[UploadManifest] = None
+
     # propert to get the relative path of shared files
     @property
     def shared_files_path(self) -> Path:
@@ -19,6 +38,10 @@ class Utilities:
         with file_path.open("r", encoding="utf-8", errors="ignore") as file:
             return file.read()
 
+    def estimate_tokens(self, text: str) -> int:
+        """Estimate how many model tokens a text takes."""
+        return -(-len(text.encode("utf-8")) // BYTES_PER_TOKEN)
+
     def log_msg_green(self, msg: str) -> None:
         """Print a message in green."""
         print(f"{tc.GREEN}{msg}{tc.RESET}")
@@ -31,9 +54,29 @@ class Utilities:
         """Print a token in blue."""
         print(f"{tc.BLUE}{msg}{tc.RESET}", end="", flush=True)
 
-    async def get_file(self, agents_client: AgentsClient, file_id: str, attachment_name: str) -> None:
-        """Retrieve the file and save it to the local disk."""
-        self.log_msg_green(f"Getting file with ID: {file_id}")
+    def _downloaded_file(self, folder_path: Path, file_id: str) -> Optional[Path]:
+        """Return the local copy of a file downloaded earlier, saved as <name>.<file ID><extension>."""
+        for path in folder_path.glob(f"*.{file_id}.*"):
+            # The ID must match exactly: "assistant-abc" is not a prefix match for "assistant-abcd".
+            if path.stem.rsplit(".", 1)[-1] == file_id and not path.name.endswith(PARTIAL_DOWNLOAD_SUFFIX):
+                return path
+        return None
+
+    async def _download_file(self, agents_client: AgentsClient, file_id: str, attachment_name: str) -> Path:
+        with tracer.span("file.download", file_id=file_id) as span:
+            file_path, size = await self._fetch_file(agents_client, file_id, attachment_name)
+            span.set_attributes(path=str(file_path), bytes=size)
+            return file_path
+
+    async def _fetch_file(self, agents_client: AgentsClient, file_id: str, attachment_name: str) -> tuple[Path, int]:
+        """Download a file unless a copy is already saved, returning its path and the bytes downloaded."""
+        folder_path = Path(self.shared_files_path) / "files"
+        await asyncio.to_thread(folder_path.mkdir, parents=True, exist_ok=True)
+
+        cached_path = await asyncio.to_thread(self._downloaded_file, folder_path, file_id)
+        if cached_path:
+            self.log_msg_green(f"File with ID: {file_id} already saved to {cached_path}")
+            return cached_path, 0
 
         attachment_part = attachment_name.split(":")[-1]
         file_name = Path(attachment_part).stem
@@ -41,61 +84,166 @@ class Utilities:
         if not file_extension:
             file_extension = ".png"
         file_name = f"{file_name}.{file_id}{file_extension}"
-
-        folder_path = Path(self.shared_files_path) / "files"
-        folder_path.mkdir(parents=True, exist_ok=True)
         file_path = folder_path / file_name
-
-        # Save the file using a synchronous context manager
-        with file_path.open("wb") as file:
-            async for chunk in await agents_client.files.get_content(file_id):
-                file.write(chunk)
+        # Written under a temporary name and renamed when complete, so a partial file is never picked up.
+        temp_path = folder_path / f".{file_name}{PARTIAL_DOWNLOAD_SUFFIX}"
+
+        size = 0
+        async with self._download_slots():
+            self.log_msg_green(f"Getting file with ID: {file_id}")
+            file = await asyncio.to_thread(temp_path.open, "wb")
+            try:
+                buffer = bytearray()
+                async for chunk in await agents_client.files.get_content(file_id):
+                    buffer += chunk
+                    size += len(chunk)
+                    if len(buffer) >= DOWNLOAD_WRITE_BUFFER_BYTES:
+                        await asyncio.to_thread(file.write, bytes(buffer))
+                        buffer.clear()
+                if buffer:
+                    await asyncio.to_thread(file.write, bytes(buffer))
+            except BaseException:
+                await asyncio.to_thread(file.close)
+                await asyncio.to_thread(temp_path.unlink, missing_ok=True)
+                raise
+            await asyncio.to_thread(file.close)
+            await asyncio.to_thread(temp_path.replace, file_path)
 
         self.log_msg_green(f"File saved to {file_path}")
+        return file_path, size
+
+    def _download_slots(self) -> asyncio.Semaphore:
+        # Created on first use so it belongs to the running event loop.
+        if self._download_semaphore is None:
+            self._download_semaphore = asyncio.Semaphore(Config.FILE_DOWNLOAD_CONCURRENCY)
+        return self._download_semaphore
+
+    def start_download(self, agents_client: AgentsClient, file_id: str, attachment_name: str) -> asyncio.Task:
+        """Download a file in the background. A file ID is only ever fetched once; later requests share the task."""
+        task = self._downloads.get(file_id)
+        if task is None:
+            task = asyncio.create_task(self._download_file(agents_client, file_id, attachment_name))
+            task.add_done_callback(lambda done: self._download_finished(file_id, done))
+            self._downloads[file_id] = task
+        return task
+
+    def _download_finished(self, file_id: str, task: asyncio.Task) -> None:
+        if task.cancelled() or task.exception() is None:
+            return
+        # Forget failed downloads so the file can be requested again.
+        self._downloads.pop(file_id, None)
+        self.log_msg_purple(f"Unable to download file with ID: {file_id}: {task.exception()}")
+
+    async def get_file(self, agents_client: AgentsClient, file_id: str, attachment_name: str) -> Path:
+        """Retrieve the file and save it to the local disk."""
+        return await self.start_download(agents_client, file_id, attachment_name)
 
-    async def get_files(self, message: ThreadMessage, agent_client: AgentsClient) -> None:
-        """Get the image files from the message and kickoff download."""
+    async def get_files(self, message: ThreadMessage, agent_client: AgentsClient) -> list[asyncio.Task]:
+        """Get the image files from the message and kickoff download.
+
+        Downloads run in the background so token streaming is never held up; use wait_for_downloads to wait for them.
+        """
+        downloads = []
         if message.image_contents:
             for index, image in enumerate(message.image_contents, start=0):
                 attachment_name = (
                     "unknown" if not message.file_path_annotations else message.file_path_annotations[index].text + ".png"
                 )
-                await self.get_file(agent_client, image.image_file.file_id, attachment_name)
+                downloads.append(self.start_download(agent_client, image.image_file.file_id, attachment_name))
         elif message.attachments:
             for index, attachment in enumerate(message.attachments, start=0):
                 attachment_name = (
                     "unknown" if not message.file_path_annotations else message.file_path_annotations[index].text
                 )
                 if attachment.file_id:
-                    await self.get_file(agent_client, attachment.file_id, attachment_name)
+                    downloads.append(self.start_download(agent_client, attachment.file_id, attachment_name))
+        return downloads
+
+    async def wait_for_downloads(self) -> None:
+        """Wait for every background download to finish."""
+        if self._downloads:
+            await asyncio.gather(*self._downloads.values(), return_exceptions=True)
 
-    async def upload_file(self, agents_client: AgentsClient, file_path: Path, purpose: str = "assistants"):
-        """Upload a file to the project."""
-        self.log_msg_purple(f"Uploading file: {file_path}")
-        file_info = await agents_client.files.upload(file_path=str(file_path), purpose=purpose)
-        self.log_msg_purple(f"File uploaded with ID: {file_info.id}")
-        return file_info
+    @property
+    def upload_manifest(self) -> UploadManifest:
+        """The record of files and vector stores already uploaded to this project."""
+        if self._upload_manifest is None:
+            self._upload_manifest = UploadManifest(
+                self.shared_files_path / Config.UPLOAD_MANIFEST_FILE, Config.PROJECT_ENDPOINT
+            )
+        return self._upload_manifest
+
+    def _upload_slots(self) -> asyncio.Semaphore:
+        if self._upload_semaphore is None:
+            self._upload_semaphore = asyncio.Semaphore(Config.FILE_UPLOAD_CONCURRENCY)
+        return self._upload_semaphore
+
+    async def upload_file(
+        self, agents_client: AgentsClient, file_path: Path, purpose: str = "assistants", content_hash: str = ""
+    ) -> FileInfo:
+        """Upload a file to the project, unless a file with the same content was uploaded before and still exists."""
+        with tracer.span("file.upload", file=file_path.name, purpose=purpose) as span:
+            content_hash = content_hash or await asyncio.to_thread(sha256_file, file_path)
+            manifest = self.upload_manifest
+            entry = manifest.get_file(content_hash, purpose)
+            if entry:
+                try:
+                    file_info = await agents_client.files.get(entry["file_id"])
+                    span.set_attributes(file_id=file_info.id, reused=True)
+                    self.log_msg_purple(f"File {file_path.name} unchanged, reusing ID: {file_info.id}")
+                    return file_info
+                except ResourceNotFoundError:
+                    await manifest.forget_file(content_hash, purpose)
+
+            async with self._upload_slots():
+                self.log_msg_purple(f"Uploading file: {file_path}")
+                file_info = await agents_client.files.upload(file_path=str(file_path), purpose=purpose)
+            self.log_msg_purple(f"File uploaded with ID: {file_info.id}")
+            span.set_attributes(file_id=file_info.id, bytes=file_info.bytes, reused=False)
+            await manifest.put_file(
+                content_hash,
+                purpose,
+                {"file_id": file_info.id, "filename": file_path.name, "bytes": file_info.bytes, "purpose": purpose},
+            )
+            return file_info
 
     async def create_vector_store(
         self, agents_client: AgentsClient, files: list[str], vector_store_name: str
-    ):
-        """Upload a file to the project."""
-
-        file_ids = []
-        prefix = self.shared_files_path
-
-        # Upload the files
-        for file in files:
-            file_path = prefix / file
-            file_info = await self.upload_file(agents_client, file_path=file_path, purpose="assistants")
-            file_ids.append(file_info.id)
+    ) -> VectorStore:
+        """Create a vector store of the files, reusing one made earlier from the same name and file contents."""
+        with tracer.span("vector_store", name=vector_store_name, files=len(files)) as span:
+            file_paths = [self.shared_files_path / file for file in files]
+            content_hashes = await asyncio.gather(*(asyncio.to_thread(sha256_file, path) for path in file_paths))
+            key = vector_store_key(vector_store_name, content_hashes)
+            manifest = self.upload_manifest
+
+            entry = manifest.get_vector_store(key)
+            if entry:
+                try:
+                    vector_store = await agents_client.vector_stores.get(entry["vector_store_id"])
+                    span.set_attributes(vector_store_id=vector_store.id, reused=True)
+                    self.log_msg_purple(f"Files unchanged, reusing vector store ID: {vector_store.id}")
+                    return vector_store
+                except ResourceNotFoundError:
+                    await manifest.forget_vector_store(key)
+
+            # Upload the files concurrently
+            file_infos = await asyncio.gather(
+                *(
+                    self.upload_file(agents_client, file_path=path, purpose="assistants", content_hash=content_hash)
+                    for path, content_hash in zip(file_paths, content_hashes)
+                )
+            )
+            file_ids = [file_info.id for file_info in file_infos]
 
-        self.log_msg_purple("Creating the vector store")
+            self.log_msg_purple("Creating the vector store")
 
-        # Create a vector store
-        vector_store = await agents_client.vector_stores.create_and_poll(
-            file_ids=file_ids, name=vector_store_name
-        )
+            # Create a vector store
+            vector_store = await agents_client.vector_stores.create_and_poll(file_ids=file_ids, name=vector_store_name)
+            span.set_attributes(vector_store_id=vector_store.id, reused=False)
+            await manifest.put_vector_store(
+                key, {"vector_store_id": vector_store.id, "name": vector_store_name, "file_ids": file_ids}
+            )
 
-        self.log_msg_purple(f"Vector store created and files added.")
-        return vector_store
+            self.log_msg_purple(f"Vector store created and files added.")
+            return vector_store
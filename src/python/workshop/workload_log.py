@@ -0,0 +1,70 @@
+import json
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Optional
+
+# How a query ended, as recorded in the workload log.
+OUTCOME_OK = "ok"
+OUTCOME_EMPTY = "empty"
+OUTCOME_TRUNCATED = "truncated"
+OUTCOME_CACHED = "cached"
+OUTCOME_PLAN_REJECTED = "plan_rejected"
+OUTCOME_TIMEOUT = "timeout"
+OUTCOME_ERROR = "error"
+
+
+def _utc_timestamp() -> str:
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+
+
+@dataclass
+class WorkloadRecord:
+    """One SQL query the model ran, with how long it took and how much it returned."""
+
+    query: str
+    latency_ms: Optional[float] = None
+    rows: Optional[int] = None
+    result_bytes: Optional[int] = None
+    outcome: Optional[str] = None
+    timestamp: str = field(default_factory=_utc_timestamp)
+
+
+class WorkloadLog:
+    """Append-only JSON Lines log of the SQL workload, replayable with benchmarks/replay_workload.py.
+
+    Each record is written as a single line in append mode, so several processes can share one log.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+
+    def record(self, record: WorkloadRecord) -> None:
+        line = json.dumps(asdict(record)) + "\n"
+        try:
+            with self.path.open("a", encoding="utf-8") as file:
+                file.write(line)
+        except OSError as e:
+            # Capturing the workload must never break the query itself.
+            print(f"Unable to write to the workload log {self.path}: {e}")
+
+
+def read_workload(path: Path) -> list[WorkloadRecord]:
+    """Read a workload log or corpus. Only the query is required on each line; blank lines are skipped."""
+    records = []
+    with path.open("r", encoding="utf-8") as file:
+        for line in file:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            records.append(
+                WorkloadRecord(
+                    query=entry["query"],
+                    latency_ms=entry.get("latency_ms"),
+                    rows=entry.get("rows"),
+                    result_bytes=entry.get("result_bytes"),
+                    outcome=entry.get("outcome"),
+                    timestamp=entry.get("timestamp", ""),
+                )
+            )
+    return records
@@ -0,0 +1,123 @@
+"""
+Build contoso-sales.db, optimized for the queries the agent runs.
+
+The sales rows come from the generated SQL script, or with --rows from the vectorized generator in
+generate_sales_data.py, which scales to load-testing sizes.
+
+On top of the raw sales_data table the build adds:
+- covering indexes on the columns the agent filters and groups by (region, year, month, main_category, product_type)
+- pre-aggregated rollup tables named sales_rollup_*, which SalesData advertises to the model
+- ANALYZE statistics so the query planner picks the indexes
+
+The database is written to a temporary file and renamed into place when complete.
+
+Usage:
+    python build_database.py --sql populate_sales_data.sql --output ../contoso-sales.db
+    python build_database.py --rows 10000000 --seed 42 --output ../contoso-sales.db
+"""
+
+import argparse
+import sqlite3
+import time
+from pathlib import Path
+from typing import Optional
+
+HERE = Path(__file__).resolve().parent
+
+MEASURES = "revenue, shipping_cost, number_of_orders, discount"
+
+INDEXES = {
+    "idx_sales_data_region_year_month": f"region, year, month, main_category, {MEASURES}",
+    "idx_sales_data_year_month": f"year, month, region, main_category, {MEASURES}",
+    "idx_sales_data_category_product_type": f"main_category, product_type, region, year, {MEASURES}",
+    "idx_sales_data_product_type": f"product_type, year, region, {MEASURES}",
+}
+
+DIMENSION_TYPES = {
+    "region": "TEXT",
+    "year": "INTEGER",
+    "month": "INTEGER",
+    "main_category": "TEXT",
+    "product_type": "TEXT",
+}
+
+# Rollup column, type and the aggregate over sales_data that fills it.
+TOTALS = [
+    ("total_revenue", "REAL", "SUM(revenue)"),
+    ("total_shipping_cost", "REAL", "SUM(shipping_cost)"),
+    ("total_discount", "REAL", "SUM(discount)"),
+    ("total_orders", "INTEGER", "SUM(number_of_orders)"),
+    ("sale_count", "INTEGER", "COUNT(*)"),
+]
+
+ROLLUPS = {
+    "sales_rollup_region_year_month_category": ["region", "year", "month", "main_category"],
+    "sales_rollup_product_type_region_year": ["main_category", "product_type", "region", "year"],
+}
+
+
+def load_sales_data(conn: sqlite3.Connection, sql_file: Path) -> None:
+    """Create and populate the sales_data table from the generated SQL script."""
+    conn.executescript(f"BEGIN;\n{sql_file.read_text(encoding='utf-8')}\nCOMMIT;")
+
+
+def create_indexes(conn: sqlite3.Connection) -> None:
+    for name, columns in INDEXES.items():
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON sales_data ({columns});")
+
+
+def create_rollups(conn: sqlite3.Connection) -> None:
+    for name, dimensions in ROLLUPS.items():
+        group_by = ", ".join(dimensions)
+        columns = [f"{dimension} {DIMENSION_TYPES[dimension]}" for dimension in dimensions]
+        columns += [f"{column} {column_type}" for column, column_type, _ in TOTALS]
+        aggregates = ", ".join(aggregate for _, _, aggregate in TOTALS)
+
+        conn.execute(f"DROP TABLE IF EXISTS {name};")
+        conn.execute(f"CREATE TABLE {name} ({', '.join(columns)});")
+        conn.execute(f"INSERT INTO {name} SELECT {group_by}, {aggregates} FROM sales_data GROUP BY {group_by};")
+        conn.execute(f"CREATE INDEX idx_{name} ON {name} ({group_by});")
+
+
+def build(output: Path, sql_file: Path, rows: Optional[int] = None, seed: int = 42, skew: float = 0.0) -> None:
+    start = time.perf_counter()
+    temp_output = output.with_name(f"{output.name}.building")
+    temp_output.unlink(missing_ok=True)
+
+    conn = sqlite3.connect(temp_output)
+    try:
+        conn.execute("PRAGMA journal_mode = OFF;")
+        conn.execute("PRAGMA synchronous = OFF;")
+        if rows is None:
+            load_sales_data(conn, sql_file)
+        else:
+            # Imported here so building from the SQL script does not need NumPy.
+            from generate_sales_data import SalesDataGenerator, write_sqlite
+
+            write_sqlite(conn, SalesDataGenerator(seed=seed, skew=skew), rows)
+        with conn:
+            create_indexes(conn)
+            create_rollups(conn)
+        conn.execute("ANALYZE;")
+        conn.execute("VACUUM;")
+        row_count = conn.execute("SELECT COUNT(*) FROM sales_data;").fetchone()[0]
+    finally:
+        conn.close()
+
+    temp_output.replace(output)
+    print(f"Built {output} with {row_count:,} sales rows in {time.perf_counter() - start:.1f}s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sql", type=Path, default=HERE / "populate_sales_data.sql")
+    parser.add_argument("--rows", type=int, help="generate this many rows instead of loading the SQL script")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--skew", type=float, default=0.0)
+    parser.add_argument("--output", type=Path, default=HERE.parent / "contoso-sales.db")
+    args = parser.parse_args()
+    build(args.output, args.sql, args.rows, args.seed, args.skew)
+
+
+if __name__ == "__main__":
+    main()
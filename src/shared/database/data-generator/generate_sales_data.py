@@ -0,0 +1,232 @@
+"""
+Generate synthetic Contoso sales data at load-testing scale.
+
+Rows are produced in vectorized NumPy batches from the same categories, price ranges, regions and years as
+generate_sql.py, and bulk-loaded into the sales_data table with executemany, one transaction per batch. Only one
+batch is held in memory at a time, so memory use stays flat from thousands to 100M rows. The same batches can also be
+written to CSV or Parquet (Parquet needs pyarrow).
+
+Usage:
+    python generate_sales_data.py --rows 10000000 --seed 42 --output ../contoso-sales.db
+    python generate_sales_data.py --rows 1000000 --skew 1.2 --output sales.db --parquet sales.parquet
+"""
+
+import argparse
+import csv
+import sqlite3
+import time
+from pathlib import Path
+from typing import Iterator, Optional
+
+import numpy as np
+
+from generate_sql import main_categories, regions, years
+
+HERE = Path(__file__).resolve().parent
+
+COLUMNS = [
+    "main_category",
+    "product_type",
+    "revenue",
+    "shipping_cost",
+    "number_of_orders",
+    "year",
+    "month",
+    "discount",
+    "region",
+    "month_date",
+]
+
+CREATE_TABLE = """
+CREATE TABLE IF NOT EXISTS sales_data (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    main_category TEXT,
+    product_type TEXT,
+    revenue REAL,
+    shipping_cost REAL,
+    number_of_orders INTEGER,
+    year INTEGER,
+    month INTEGER,
+    discount INTEGER,
+    region TEXT,
+    month_date TEXT
+);
+"""
+
+INSERT = f"INSERT INTO sales_data ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))});"
+
+
+def skewed_weights(count: int, skew: float) -> np.ndarray:
+    """Zipf-like weights for count choices. A skew of 0 is uniform, larger values favour the first choices."""
+    weights = 1.0 / np.arange(1, count + 1) ** skew
+    return weights / weights.sum()
+
+
+class SalesDataGenerator:
+    """Vectorized generator for sales_data rows, reproducible for a given seed."""
+
+    def __init__(self, seed: int = 42, skew: float = 0.0) -> None:
+        self.rng = np.random.default_rng(seed)
+
+        category_names = list(main_categories)
+        self.category_names = np.array(category_names, dtype=object)
+        self.category_weights = skewed_weights(len(category_names), skew)
+        self.region_names = np.array(regions, dtype=object)
+        self.region_weights = skewed_weights(len(regions), skew)
+        self.years = np.array(years)
+        self.year_weights = skewed_weights(len(years), skew)
+
+        # Flatten the product types of every category so a product is a single index.
+        product_names, price_low, price_high, counts = [], [], [], []
+        for category in category_names:
+            products = main_categories[category]
+            counts.append(len(products))
+            for product, (low, high) in products.items():
+                product_names.append(product)
+                price_low.append(low)
+                price_high.append(high)
+        self.product_names = np.array(product_names, dtype=object)
+        self.price_low = np.array(price_low)
+        self.price_high = np.array(price_high)
+        self.products_per_category = np.array(counts)
+        self.product_offsets = np.concatenate(([0], np.cumsum(counts)[:-1]))
+
+        # month_date strings for every year and month, indexed by year_index * 12 + month - 1.
+        self.month_dates = np.array([f"{year}-{month:02d}" for year in years for month in range(1, 13)], dtype=object)
+
+    def batch(self, size: int) -> dict[str, np.ndarray]:
+        """Return one batch of rows as a column name to array mapping."""
+        rng = self.rng
+        category = rng.choice(len(self.category_names), size=size, p=self.category_weights)
+        # Product types are uniform within their category, as in generate_sql.py.
+        local_product = (rng.random(size) * self.products_per_category[category]).astype(np.int64)
+        product = self.product_offsets[category] + local_product
+
+        number_of_orders = rng.integers(1, 21, size=size)
+        revenue = (rng.integers(self.price_low[product], self.price_high[product] + 1) * number_of_orders).astype(
+            np.float64
+        )
+        shipping_cost = rng.integers(10, 21, size=size) / 100.0 * revenue
+        discount = rng.integers(0, 16, size=size) / 100.0 * revenue
+
+        year_index = rng.choice(len(self.years), size=size, p=self.year_weights)
+        month = rng.integers(1, 13, size=size)
+        region = rng.choice(len(self.region_names), size=size, p=self.region_weights)
+
+        return {
+            "main_category": self.category_names[category],
+            "product_type": self.product_names[product],
+            "revenue": revenue,
+            "shipping_cost": shipping_cost,
+            "number_of_orders": number_of_orders,
+            "year": self.years[year_index],
+            "month": month,
+            "discount": discount,
+            "region": self.region_names[region],
+            "month_date": self.month_dates[year_index * 12 + month - 1],
+        }
+
+    def batches(self, rows: int, batch_size: int) -> Iterator[dict[str, np.ndarray]]:
+        """Yield batches until rows have been generated."""
+        for start in range(0, rows, batch_size):
+            yield self.batch(min(batch_size, rows - start))
+
+
+def batch_rows(batch: dict[str, np.ndarray]) -> Iterator[tuple]:
+    """Convert a batch to row tuples of plain Python values for sqlite3 and csv."""
+    return zip(*(batch[column].tolist() for column in COLUMNS))
+
+
+class ExtraWriters:
+    """Optional CSV and Parquet outputs fed the same batches as SQLite."""
+
+    def __init__(self, csv_path: Optional[Path], parquet_path: Optional[Path]) -> None:
+        self.csv_file = csv_path.open("w", newline="", encoding="utf-8") if csv_path else None
+        self.csv_writer = csv.writer(self.csv_file) if self.csv_file else None
+        if self.csv_writer:
+            self.csv_writer.writerow(COLUMNS)
+
+        self.parquet_path = parquet_path
+        self.parquet_writer = None
+
+    def write(self, batch: dict[str, np.ndarray]) -> None:
+        if self.csv_writer:
+            self.csv_writer.writerows(batch_rows(batch))
+        if self.parquet_path:
+            try:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+            except ImportError as e:
+                raise SystemExit("Writing Parquet needs pyarrow: pip install pyarrow") from e
+            table = pa.table({column: batch[column] for column in COLUMNS})
+            if self.parquet_writer is None:
+                self.parquet_writer = pq.ParquetWriter(self.parquet_path, table.schema)
+            self.parquet_writer.write_table(table)
+
+    def close(self) -> None:
+        if self.csv_file:
+            self.csv_file.close()
+        if self.parquet_writer:
+            self.parquet_writer.close()
+
+
+def write_sqlite(
+    conn: sqlite3.Connection,
+    generator: SalesDataGenerator,
+    rows: int,
+    batch_size: int = 500_000,
+    extra_writers: Optional[ExtraWriters] = None,
+) -> None:
+    """Bulk-load generated rows into sales_data, one transaction per batch."""
+    conn.execute(CREATE_TABLE)
+    written = 0
+    for batch in generator.batches(rows, batch_size):
+        with conn:
+            conn.executemany(INSERT, batch_rows(batch))
+        if extra_writers:
+            extra_writers.write(batch)
+        written += len(batch["revenue"])
+        print(f"\r{written:,} / {rows:,} rows", end="", flush=True)
+    print()
+
+
+def generate(
+    output: Path,
+    rows: int,
+    seed: int = 42,
+    skew: float = 0.0,
+    batch_size: int = 500_000,
+    csv_path: Optional[Path] = None,
+    parquet_path: Optional[Path] = None,
+) -> None:
+    start = time.perf_counter()
+    extra_writers = ExtraWriters(csv_path, parquet_path)
+
+    conn = sqlite3.connect(output)
+    try:
+        conn.execute("PRAGMA journal_mode = OFF;")
+        conn.execute("PRAGMA synchronous = OFF;")
+        write_sqlite(conn, SalesDataGenerator(seed=seed, skew=skew), rows, batch_size, extra_writers)
+    finally:
+        conn.close()
+        extra_writers.close()
+
+    print(f"Generated {rows:,} rows into {output} in {time.perf_counter() - start:.1f}s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1000, help="number of sales rows, up to 100M")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--skew", type=float, default=0.0, help="0 for uniform, e.g. 1.2 for a long-tailed mix")
+    parser.add_argument("--batch-size", type=int, default=500_000)
+    parser.add_argument("--output", type=Path, default=HERE / "sales_data.db")
+    parser.add_argument("--csv", type=Path, help="also write the rows to this CSV file")
+    parser.add_argument("--parquet", type=Path, help="also write the rows to this Parquet file")
+    args = parser.parse_args()
+
+    generate(args.output, args.rows, args.seed, args.skew, args.batch_size, args.csv, args.parquet)
+
+
+if __name__ == "__main__":
+    main()
@@ -124,7 +124,8 @@ def generate_sql_insert():
 
     return "\n".join(insert_statements)
 
-sql_script = f"""  
+def build_sql_script():
+    return f"""  
 -- Create the table  
 CREATE TABLE IF NOT EXISTS sales_data (  
     id INTEGER PRIMARY KEY AUTOINCREMENT,  
@@ -144,8 +145,12 @@ CREATE TABLE IF NOT EXISTS sales_data (
 {generate_sql_insert()}    
 """
 
-# Write the SQL script to a file  
-with open("populate_sales_data.sql", "w") as file:  
-    file.write(sql_script)
 
-print("SQL script has been written to 'populate_sales_data.sql'")
+if __name__ == "__main__":
+    sql_script = build_sql_script()
+
+    # Write the SQL script to a file  
+    with open("populate_sales_data.sql", "w") as file:  
+        file.write(sql_script)
+
+    print("SQL script has been written to 'populate_sales_data.sql'")